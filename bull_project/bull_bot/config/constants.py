@@ -1,12 +1,7 @@
 import os
 import re
-import json
 import logging
-from typing import Optional, Dict
-from aiogram import Bot, Dispatcher
-import gspread
-from google.oauth2.service_account import Credentials
-from aiogram.client.default import DefaultBotProperties
+from typing import Dict
 
 HOTELS_NAME_HINTS = [
     "hotel", "otel", "отель", "гостиница",
@@ -81,19 +76,35 @@ SKIP_BOT = os.getenv("SKIP_BOT", "").lower() in ("1", "true", "yes")
 
 API_TOKEN = os.getenv("API_TOKEN", "").strip()
 
-if SKIP_BOT or not API_TOKEN or API_TOKEN.startswith("your_"):
-    LOGGER.warning("⚠️ Bot init пропущен (SKIP_BOT) или API_TOKEN не задан")
-    bot = None
-    dp = None
-else:
+# Bot создается лениво при первом обращении (get_bot), а не при импорте:
+# импорт констант не должен тянуть aiogram и открывать HTTP-сессию.
+# main.py регистрирует свой экземпляр через set_bot, хендлеры шлют через него.
+_bot = None
+
+
+def set_bot(instance):
+    """Регистрирует экземпляр Bot процесса (main.py после создания)"""
+    global _bot
+    _bot = instance
+
+
+def get_bot():
+    """Общий Bot процесса или None (SKIP_BOT / нет API_TOKEN)"""
+    global _bot
+    if _bot is not None:
+        return _bot
+    if SKIP_BOT or not API_TOKEN or API_TOKEN.startswith("your_"):
+        LOGGER.warning("⚠️ Bot init пропущен (SKIP_BOT) или API_TOKEN не задан")
+        return None
     try:
-        bot = Bot(token=API_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
-        dp = Dispatcher()
+        from aiogram import Bot
+        from aiogram.client.default import DefaultBotProperties
+        _bot = Bot(token=API_TOKEN, default=DefaultBotProperties(parse_mode="HTML"))
         LOGGER.info("✅ Bot инициализирован")
     except Exception as e:
         LOGGER.error(f"❌ Ошибка инициализации Bot: {e}")
-        bot = None
-        dp = None
+        _bot = None
+    return _bot
 
 
 # ==================== GOOGLE SHEETS ====================
@@ -103,65 +114,9 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive.readonly",
 ]
 
-client: Optional[gspread.Client] = None
-gs: Optional[gspread.Client] = None
-
+# Авторизация в Google Sheets — лениво, в config/settings.get_google_client()
 if MOCK_MODE:
     LOGGER.info("📋 MOCK режим активирован - Google Sheets не требуется")
-else:
-    LOGGER.info("📋 Попытка подключения к Google Sheets...")
-
-    creds: Optional[Credentials] = None
-    json_config = os.getenv("GOOGLE_CREDS_JSON")
-
-    if json_config:
-        LOGGER.info("✅ Ключи найдены в переменной окружения GOOGLE_CREDS_JSON")
-        try:
-            creds_dict = json.loads(json_config)
-            creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        except Exception as e:
-            LOGGER.error(f"❌ Ошибка парсинга GOOGLE_CREDS_JSON: {e}")
-            creds = None
-
-    if not json_config:
-        # Пробуем файл
-        CREDENTIALS_FILE = os.path.join(
-            CREDENTIALS_DIR,
-            "service_account.json",
-        )
-        LOGGER.info(f"🔍 Ищем файл ключей: {CREDENTIALS_FILE}")
-
-        if os.path.exists(CREDENTIALS_FILE):
-            LOGGER.info("✅ Файл ключей найден")
-            try:
-                creds = Credentials.from_service_account_file(
-                    CREDENTIALS_FILE,
-                    scopes=SCOPES,
-                )
-            except Exception as e:
-                LOGGER.error(f"❌ Ошибка чтения файла ключей: {e}")
-                creds = None
-        else:
-            LOGGER.warning(
-                f"⚠️ Файл ключей не найден: {CREDENTIALS_FILE}\n"
-                f"📌 Для использования Google Sheets:\n"
-                f"   1. Скачайте ключи из Google Cloud Console\n"
-                f"   2. Поместите JSON файл в: {CREDENTIALS_DIR}/\n"
-                f"   3. Или установите переменную GOOGLE_CREDS_JSON\n"
-                f"💡 Пока Google Sheets недоступен"
-            )
-
-    if creds is not None:
-        try:
-            client = gspread.authorize(creds)
-            gs = client
-            LOGGER.info("✅ Google Sheets подключен")
-        except Exception as e:
-            LOGGER.error(f"❌ Ошибка подключения к Google Sheets: {e}")
-            client = None
-            gs = None
-    else:
-        LOGGER.warning("⚠️ Нет валидных Credentials, Google Sheets отключён")
 
 # ==================== ПРОЧИЕ ПУТИ / НАСТРОЙКИ ====================
 
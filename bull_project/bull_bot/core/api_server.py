@@ -1,36 +1,40 @@
 import os
-import json
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
 import uvicorn
 from urllib.parse import unquote_plus
 from typing import Optional, List, Dict, Any
 
-from fastapi import FastAPI, Query, UploadFile, File
+from fastapi import FastAPI, Query, UploadFile, File, Depends, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
-from starlette.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from pydantic import BaseModel
 
 # Импорты вашего проекта
 from bull_project.bull_bot.core.smart_search import get_packages_by_date
-from bull_project.bull_bot.core.google_sheets.allocator import get_open_rooms_for_manual_selection
+from bull_project.bull_bot.core.google_sheets.allocator import get_open_rooms_from_snapshot
 from bull_project.bull_bot.core.google_sheets.client import (
     get_google_client,
-    get_sheet_data,
+    get_sheet_snapshot,
     get_accessible_tables,
     get_sheet_names,
     get_packages_from_sheet,
 )
-from bull_project.bull_bot.core.google_sheets.writer import save_group_booking
+from bull_project.bull_bot.core.google_sheets.writer import save_group_booking, SheetDuplicate
 from bull_project.bull_bot.database.setup import init_db
+from bull_project.bull_bot.database.uow import get_db_session
+from bull_project.bull_bot.database.events import on_tables_changed
+from bull_project.bull_bot.database.models import booking_search_name
+from sqlalchemy.ext.asyncio import AsyncSession
 from bull_project.bull_bot.database.requests import (
-    add_booking_to_db,
+    add_bookings_bulk,
     update_booking_row,
+    update_booking_rows_bulk,
     add_user,
 )
-from bull_project.bull_bot.core.parsers.passport_parser import PassportParserEasyOCR as PassportParser
-from bull_project.bull_bot.core.parsers.pdf_generator import PassportPDFGenerator
 from bull_project.bull_bot.database.requests import (
     get_last_n_bookings_by_manager,
     get_booking_by_id,
@@ -40,17 +44,22 @@ from bull_project.bull_bot.database.requests import (
     search_packages_by_date,
     get_all_managers_list,
     get_all_bookings_for_period,
+    get_bookings_page_for_period,
+    stream_bookings_for_period,
     search_tourist_by_name,
     get_db_packages_list,
     get_all_bookings_in_package,
-    booking_exists,
+    find_existing_bookings,
     delete_bookings_by_ids
 )
 from bull_project.bull_bot.database.requests import (
     get_latest_passport_for_person,
+    get_latest_passports_for_people,
+    autocomplete_tourist_names,
+    load_name_index,
     update_booking_fields,
     update_booking_passport_path,
-    get_pending_requests,
+    get_pending_requests_with_bookings,
     get_approval_request,
     update_approval_status,
     create_approval_request,
@@ -63,15 +72,111 @@ from bull_project.bull_bot.core.google_sheets.writer import (
     save_group_booking
 )
 from bull_project.bull_bot.config.constants import ABS_UPLOADS_DIR
-# uploads dir is shared via volume on API service
-os.makedirs(ABS_UPLOADS_DIR, exist_ok=True)
-# Инициализация парсера паспортов
-passport_parser = PassportParser(debug=False)
+from bull_project.bull_bot.core.response_cache import cached_response, response_cache
+from bull_project.bull_bot.core.serializers import (
+    FastJSONResponse, dumps, HISTORY_BOOKING, ADMIN_BOOKING, CARE_SEARCH_BOOKING, CARE_PACKAGE_BOOKING,
+)
+from bull_project.bull_bot.core.compression import add_compression
+from bull_project.bull_bot.core.availability import availability_hub
+from bull_project.bull_bot.core.idempotency import fingerprint, idempotent_response
+from bull_project.bull_bot.core.static_assets import CachedStaticFiles, WEBAPP_SOURCES, static_dir
+from bull_project.bull_bot.core.executors import (
+    run_network, run_cpu, run_disk, shutdown_executors, start_stall_detector
+)
+from bull_project.bull_bot.core.uploads import (
+    UploadTooLarge, add_upload_limit, save_upload, convert_to_png
+)
+
+# -----------------------------------------------------------------------------
+# ЗАПУСК: тяжелое — лениво или фоновым прогревом
+# -----------------------------------------------------------------------------
+# Импорт модуля ничего не подключает и не грузит: БД и каталоги готовятся в
+# lifespan, индекс ФИО и EasyOCR (torch + модели, десятки секунд) — фоновой
+# задачей после старта. /health отвечает сразу, /ready — когда API может
+# обслуживать запросы.
+
+# Прогревать EasyOCR при старте (false — грузить модели при первом паспорте)
+OCR_WARMUP = os.getenv("OCR_WARMUP", "true").lower() == "true"
+
+startup_state = {"db": False, "name_index": False, "ocr": False}
+
+_passport_parser = None
+
+
+def get_passport_parser():
+    """Парсер паспортов процесса (модуль и модели EasyOCR — при первом вызове)"""
+    global _passport_parser
+    if _passport_parser is None:
+        from bull_project.bull_bot.core.parsers.passport_parser import PassportParserEasyOCR
+        _passport_parser = PassportParserEasyOCR(debug=False)
+    return _passport_parser
+
+
+# Результаты распознавания по sha256 файла: повторная загрузка того же скана
+# (переотправка формы, бот + веб) не гоняет OCR заново
+PARSED_PASSPORTS_MAX = 256
+_parsed_passports: "OrderedDict[str, Any]" = OrderedDict()
+
+
+async def parse_passport(path: str, digest: str):
+    """PassportData для файла (OCR в пуле потоков, с кэшем по хэшу)"""
+    cached = _parsed_passports.get(digest)
+    if cached is not None:
+        _parsed_passports.move_to_end(digest)
+        return cached
+    passport_data = await run_cpu(get_passport_parser().parse, path)
+    _parsed_passports[digest] = passport_data
+    while len(_parsed_passports) > PARSED_PASSPORTS_MAX:
+        _parsed_passports.popitem(last=False)
+    return passport_data
+
+
+def _load_ocr_models():
+    get_passport_parser().reader
+
+
+async def warm_up():
+    """Фоновый прогрев: индекс автодополнения, затем EasyOCR"""
+    try:
+        count = await load_name_index()
+        startup_state["name_index"] = True
+        print(f"✅ Индекс автодополнения ФИО: {count} броней")
+    except Exception as e:
+        print(f"⚠️ Индекс автодополнения ФИО не загружен: {e}")
+
+    if not OCR_WARMUP:
+        return
+    try:
+        await run_cpu(_load_ocr_models)
+        startup_state["ocr"] = True
+        print("✅ EasyOCR загружен")
+    except Exception as e:
+        print(f"⚠️ EasyOCR не загружен (загрузим при первом паспорте): {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # uploads dir is shared via volume on API service
+    os.makedirs(ABS_UPLOADS_DIR, exist_ok=True)
+    await init_db()
+    startup_state["db"] = True
+    stall_detector = start_stall_detector()
+    warm_up_task = asyncio.create_task(warm_up())
+    try:
+        yield
+    finally:
+        warm_up_task.cancel()
+        if stall_detector:
+            stall_detector.stop()
+        shutdown_executors()
+
+# Записи в БД из этого процесса сбрасывают кэш ответов по таблицам (tags)
+on_tables_changed(lambda tables: response_cache.invalidate(*tables))
 
 # -----------------------------------------------------------------------------
 # FASTAPI НАСТРОЙКА
 # -----------------------------------------------------------------------------
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -79,35 +184,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition", "Content-Type"],  # ← ВАЖНО для скачивания файлов!
+    expose_headers=["Content-Disposition", "Content-Type", "Idempotent-Replayed"],  # ← ВАЖНО для скачивания файлов!
 )
 
-PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-CARE_WEBAPP_DIR = os.path.join(PROJECT_ROOT, "care_webapp")
-ASSETS_DIR = os.path.join(PROJECT_ROOT, "assets")
+# brotli/gzip для больших JSON-ответов /api/ (core/compression.py)
+add_compression(app)
 
-# Инициализация БД при старте приложения
-@app.on_event("startup")
-async def startup_event():
-    await init_db()
+# 413 для слишком больших загрузок паспортов — до приема тела (core/uploads.py)
+add_upload_limit(app)
 
-if os.path.isdir(CARE_WEBAPP_DIR):
-    app.mount(
-        "/care-webapp",
-        StaticFiles(directory=CARE_WEBAPP_DIR, html=True),
-        name="care-webapp",
-    )
-if os.path.isdir(ASSETS_DIR):
-    app.mount(
-        "/assets",
-        StaticFiles(directory=ASSETS_DIR, html=False),
-        name="assets",
-    )
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CARE_WEBAPP_DIR = static_dir("care-webapp")
+ASSETS_DIR = static_dir("assets")
+
+# WebApp и статика: файлы с хэшем в имени кэшируются навсегда, HTML —
+# с ревалидацией (ETag/304), .br/.gz берутся из сборки (core/static_assets.py)
+static_apps: Dict[str, CachedStaticFiles] = {}
+for _name in WEBAPP_SOURCES:
+    _directory = static_dir(_name)
+    if os.path.isdir(_directory):
+        static_apps[_name] = CachedStaticFiles(directory=_directory, html=(_name != "assets"))
+        app.mount(f"/{_name}", static_apps[_name], name=_name)
+
+
+async def serve_static(name: str, path: str, request: Request):
+    """Файл из смонтированной статики или None, если его нет"""
+    static = static_apps.get(name)
+    if static is None or not path:
+        return None
+    try:
+        return await static.get_response(path, request.scope)
+    except StarletteHTTPException:
+        return None
 
 @app.get("/health")
 async def health():
+    """Процесс жив (liveness) — без обращений к БД и тяжелым движкам"""
     return {"ok": True}
 
+@app.get("/ready")
+async def ready():
+    """Готовность принимать трафик: БД инициализирована и индекс ФИО загружен"""
+    is_ready = startup_state["db"] and startup_state["name_index"]
+    content = {"ok": is_ready, **startup_state}
+    if not is_ready:
+        return JSONResponse(status_code=503, content=content)
+    return content
+
 # -----------------------------------------------------------------------------
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
 # -----------------------------------------------------------------------------
@@ -120,6 +243,21 @@ def normalize_sheet_and_package(raw_sheet_name: str, raw_package_name: str):
     return s_name, p_name
 
 
+async def find_group_duplicate(table_id: str, sheet_name: str, pilgrims, session) -> Optional[str]:
+    """
+    Проверка дублей группы по БД (один запрос на всю группу). Возвращает
+    текст ошибки или None. Людей, уже вписанных в лист, проверяет
+    save_group_booking(check_duplicates=True) — по данным, которые он читает
+    для записи.
+    """
+    people = [((p.last_name or "").strip(), (p.first_name or "").strip()) for p in pilgrims]
+    in_db = await find_existing_bookings(table_id, sheet_name, people, session=session)
+    for ln, fn in people:
+        if booking_search_name(ln, fn) in in_db:
+            return f"Бронь для {ln} {fn} уже существует"
+    return None
+
+
 def get_active_tables_for_care() -> Dict[str, str]:
     """
     Возвращает словарь таблиц за текущий и следующий год.
@@ -131,17 +269,72 @@ def get_active_tables_for_care() -> Dict[str, str]:
     filtered = {name: table_id for name, table_id in tables.items() if any(y in name for y in years)}
     return filtered or tables
 
-async def resolve_passport_path(booking) -> Optional[str]:
+def _remove_if_exists(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _existing_paths(paths) -> set:
+    """Пути из paths, которые есть на диске (каждый проверяется один раз)"""
+    return {path for path in set(paths) if os.path.exists(path)}
+
+
+def image_to_pdf_bytes(image_path: str) -> bytes:
     """
-    Возвращает путь к паспорту для брони, с фолбэком на последнее фото по ФИО.
+    PDF на одну страницу с изображением паспорта (A4 по длинной стороне).
+    Блокирующая (PIL + reportlab): вызывать через run_cpu.
     """
-    passport_path = booking.passport_image_path
-    if not passport_path and booking.guest_last_name and booking.guest_first_name:
-        passport_path = await get_latest_passport_for_person(
-            booking.guest_last_name,
-            booking.guest_first_name
-        )
-    return passport_path
+    import tempfile
+    from reportlab.pdfgen import canvas
+    from PIL import Image
+
+    with Image.open(image_path) as img:
+        img_width, img_height = img.size
+    aspect_ratio = img_width / img_height
+
+    if aspect_ratio > 1:
+        page_width = 842
+        page_height = 842 / aspect_ratio
+    else:
+        page_height = 842
+        page_width = 842 * aspect_ratio
+
+    # Временный PDF рядом с исходником; читаем в память и удаляем
+    temp_pdf = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False, dir=os.path.dirname(image_path))
+    temp_pdf_path = temp_pdf.name
+    temp_pdf.close()
+    try:
+        c = canvas.Canvas(temp_pdf_path, pagesize=(page_width, page_height))
+        c.drawImage(image_path, 0, 0, width=page_width, height=page_height)
+        c.save()
+        with open(temp_pdf_path, 'rb') as f:
+            pdf_content = f.read()
+    finally:
+        try:
+            os.remove(temp_pdf_path)
+        except OSError as e:
+            print(f"⚠️ Не удалось удалить временный файл: {e}")
+
+    if not pdf_content:
+        raise Exception("PDF файл пустой")
+    return pdf_content
+
+
+async def resolve_passport_paths(bookings) -> Dict[int, Optional[str]]:
+    """
+    Пути к паспортам для списка броней {booking.id: путь}, с фолбэком на
+    последнее фото по ФИО. Фолбэки для всех броней ищутся одним запросом.
+    """
+    missing = [
+        (b.guest_last_name, b.guest_first_name)
+        for b in bookings
+        if not b.passport_image_path and b.guest_last_name and b.guest_first_name
+    ]
+    fallbacks = await get_latest_passports_for_people(missing) if missing else {}
+    return {
+        b.id: b.passport_image_path or fallbacks.get((b.guest_last_name, b.guest_first_name))
+        for b in bookings
+    }
 
 def make_abs_passport_path(path: Optional[str]) -> Optional[str]:
     """
@@ -196,6 +389,8 @@ class BookingSubmitIn(BaseModel):
     placement_type: str = "separate"
     specific_row: Optional[int] = None
     manager_id: Optional[int] = None
+    # Дублирует заголовок Idempotency-Key (для клиентов без своих заголовков)
+    idempotency_key: Optional[str] = None
 
 
 class BookingUpdateIn(BaseModel):
@@ -257,6 +452,17 @@ async def api_packages(date: str):
             }
         )
 
+async def load_open_rooms(table_id: str, s_name: str, p_name: str, count: int, room_type: str, gender: str):
+    """Свободные комнаты пакета (снимок листа перекачивается только если таблица изменилась)"""
+    snapshot = await run_network(get_sheet_snapshot, table_id, s_name)
+    if snapshot is None:
+        return []
+    return await run_cpu(
+        get_open_rooms_from_snapshot,
+        snapshot, p_name, count, room_type, gender
+    )
+
+
 @app.get("/api/rooms")
 async def api_rooms(
         table_id: str,
@@ -269,25 +475,71 @@ async def api_rooms(
     """Получение списка свободных комнат."""
     s_name, p_name = normalize_sheet_and_package(sheet_name, package_name)
     try:
-        # Получаем данные таблицы
-        all_rows = await run_in_threadpool(get_sheet_data, table_id, s_name)
-
-        rooms = await run_in_threadpool(
-            get_open_rooms_for_manual_selection,
-            all_rows, p_name, count, room_type, gender
-        )
+        rooms = await load_open_rooms(table_id, s_name, p_name, count, room_type, gender)
         return {"ok": True, "found": len(rooms) > 0, "rooms": rooms}
     except Exception as e:
         return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
 
 
+# Комментарий-пинг, чтобы прокси не закрывали тихое SSE-соединение (с)
+SSE_KEEPALIVE = 15
+
+
+def sse_event(event: str, payload: Dict[str, Any]) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(payload) + b"\n\n"
+
+
+async def stream_rooms(query, compute):
+    """SSE: полный список комнат, затем дельты при изменениях пакета"""
+    try:
+        feed, queue = await availability_hub.subscribe(query, compute)
+    except Exception as e:
+        yield sse_event("error", {"ok": False, "error": str(e)})
+        return
+    try:
+        rooms = feed.snapshot()
+        yield sse_event("rooms", {"rooms": rooms, "found": bool(rooms)})
+        while True:
+            try:
+                event, payload = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield sse_event(event, payload)
+    finally:
+        availability_hub.unsubscribe(feed, queue)
+
+
+@app.get("/api/rooms/stream")
+async def api_rooms_stream(
+        table_id: str,
+        sheet_name: str,
+        package_name: str,
+        count: int = 1,
+        room_type: str = "Quad",
+        gender: str = "M",
+):
+    """
+    Свободные комнаты в реальном времени (Server-Sent Events).
+
+    - event: rooms — полный список (при подключении);
+    - event: delta — {upsert: [...], removed: [row, ...], found} после записи в пакет;
+    - event: error — подписаться не удалось.
+    """
+    s_name, p_name = normalize_sheet_and_package(sheet_name, package_name)
+    query = (table_id, s_name, p_name, count, room_type, gender)
+    return StreamingResponse(
+        stream_rooms(query, lambda: load_open_rooms(*query)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/api/passport/parse")
 async def api_passport_parse(file: UploadFile = File(...)):
     """Парсинг паспорта и извлечение данных + сохранение файла"""
     try:
         import time
-        from pdf2image import convert_from_path
-        from PIL import Image
 
         # Создаем директорию для uploads если её нет
         uploads_dir = os.path.join(PROJECT_ROOT, "tmp", "uploads")
@@ -298,45 +550,36 @@ async def api_passport_parse(file: UploadFile = File(...)):
         ext = os.path.splitext(file.filename)[1] if file.filename else ".jpg"
         temp_path = f"/tmp/passport_{timestamp}_temp{ext}"
 
-        # Сохраняем временный файл
-        with open(temp_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Сохраняем временный файл потоково (с лимитом размера и хэшем)
+        try:
+            size, digest = await save_upload(file, temp_path)
+        except UploadTooLarge as e:
+            return JSONResponse(status_code=413, content={"ok": False, "error": str(e)})
 
-        print(f"📥 Веб-форма: файл загружен {temp_path}")
+        print(f"📥 Веб-форма: файл загружен {temp_path} ({size} байт)")
 
-        # Конвертируем в PNG
+        # Конвертируем в PNG (в пуле потоков, не блокируя event loop)
         png_path = os.path.join(uploads_dir, f"web_{timestamp}.png")
 
         try:
-            if temp_path.lower().endswith('.pdf'):
-                # Конвертируем PDF в PNG
-                print(f"🔄 Конвертация PDF в PNG...")
-                poppler_path = os.getenv("POPPLER_PATH", "/opt/homebrew/bin")
-                pages = convert_from_path(temp_path, dpi=300, poppler_path=poppler_path)
-                if pages:
-                    pages[0].save(png_path, 'PNG')
-                    print(f"✅ PDF сконвертирован: {png_path}")
-            else:
-                # Конвертируем изображение в PNG
-                img = Image.open(temp_path)
-                img.save(png_path, 'PNG')
-                print(f"✅ Изображение сохранено: {png_path}")
+            print(f"🔄 Конвертация в PNG...")
+            poppler_path = os.getenv("POPPLER_PATH", "/opt/homebrew/bin")
+            await run_cpu(convert_to_png, temp_path, png_path, poppler_path)
+            print(f"✅ Изображение сохранено: {png_path}")
         except Exception as conv_err:
             print(f"⚠️ Ошибка конвертации: {conv_err}, используем оригинал")
             png_path = temp_path
 
         # Парсим паспорт
-        passport_data = await run_in_threadpool(passport_parser.parse, temp_path)
+        passport_data = await parse_passport(temp_path, digest)
 
         # Удаляем временный файл (если это не финальный файл)
-        if temp_path != png_path and os.path.exists(temp_path):
-            os.remove(temp_path)
+        if temp_path != png_path:
+            await run_disk(_remove_if_exists, temp_path)
 
         if not passport_data.is_valid:
             # Удаляем сохраненный файл если данные невалидны
-            if os.path.exists(png_path):
-                os.remove(png_path)
+            await run_disk(_remove_if_exists, png_path)
             return JSONResponse(
                 status_code=400,
                 content={"ok": False, "error": "Не удалось распознать данные паспорта"}
@@ -363,9 +606,37 @@ async def api_passport_parse(file: UploadFile = File(...)):
 
 
 @app.post("/api/bookings/submit")
-async def api_bookings_submit(payload: BookingSubmitIn):
+async def api_bookings_submit(
+    payload: BookingSubmitIn,
+    session: AsyncSession = Depends(get_db_session),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    """
+    Создание бронирования.
+
+    Idempotency-Key (заголовок или поле idempotency_key): повторная отправка
+    с тем же ключом не создает вторую бронь — она дождется первой и получит
+    ее ответ (core/idempotency.py).
+    """
+    key = idempotency_key or payload.idempotency_key
+    if not key:
+        return await submit_booking(payload, session)
+    return await idempotent_response(
+        "bookings_submit",
+        key,
+        fingerprint(payload.model_dump(exclude={"idempotency_key"})),
+        lambda: submit_booking(payload, session),
+    )
+
+
+async def submit_booking(payload: BookingSubmitIn, session: AsyncSession):
     """
     Создание бронирования.
+
+    Работа с БД — в одной сессии запроса: проверка дублей, менеджер и запись
+    группы фиксируются одной транзакцией до записи в Sheets (соединение не
+    держим во время сетевого вызова), номера строк / откат — второй.
+    Дубли в самом листе проверяются при записи, под блокировкой листа.
     """
 
     # 🔥 ДОБАВЛЕНО: Логирование входящих данных
@@ -399,18 +670,6 @@ async def api_bookings_submit(payload: BookingSubmitIn):
             content={"ok": False, "error": "Список паломников пуст"}
         )
 
-    # 1. Проверяем/создаем менеджера в БД
-    manager_id = payload.manager_id or 0
-    try:
-        await add_user(
-            manager_id,
-            payload.manager_name_text or "Manager",
-            username="-",
-            role="manager",
-            )
-    except Exception:
-        pass  # если уже есть — игнорируем
-
     # 2. Нормализация имен
     sheet_name, package_name = normalize_sheet_and_package(
         payload.sheet_name,
@@ -466,15 +725,24 @@ async def api_bookings_submit(payload: BookingSubmitIn):
             )
     print(f"✅ Все паломники имеют корректный пол")
 
-    # 4.1 Проверка на дубликаты по ФИО в этом листе (активные брони)
-    for pilgrim in payload.pilgrims:
-        ln = (pilgrim.last_name or "").strip()
-        fn = (pilgrim.first_name or "").strip()
-        if await booking_exists(payload.table_id, sheet_name, ln, fn):
-            return JSONResponse(
-                status_code=409,
-                content={"ok": False, "error": f"Бронь для {ln} {fn} уже существует"}
+    # 4.1 Проверка на дубликаты по ФИО: брони в БД на этом листе (один запрос
+    # на всю группу). Уже вписанных в блок пакета проверяет запись в лист.
+    duplicate = await find_group_duplicate(payload.table_id, sheet_name, payload.pilgrims, session)
+    if duplicate:
+        return JSONResponse(status_code=409, content={"ok": False, "error": duplicate})
+
+    # 4.2 Проверяем/создаем менеджера в БД
+    manager_id = payload.manager_id or 0
+    try:
+        await add_user(
+            manager_id,
+            payload.manager_name_text or "Manager",
+            username="-",
+            role="manager",
+            session=session,
             )
+    except Exception:
+        await session.rollback()  # если уже есть — игнорируем
 
     # 5. Формирование данных для Google Sheets
     group_data_for_sheets: List[Dict[str, Any]] = []
@@ -553,11 +821,11 @@ async def api_bookings_submit(payload: BookingSubmitIn):
     # 5. 🔥 СНАЧАЛА пишем в БД (без номеров строк)
     db_ids: List[int] = []
     try:
-        for record_db in db_records:
-            booking_id = await add_booking_to_db(record_db, manager_id)
-            db_ids.append(booking_id)
-            print(f"✅ ID записи в БД: {booking_id}")
+        # Вся группа — одной транзакцией: либо записаны все, либо никто
+        db_ids = await add_bookings_bulk(db_records, manager_id, session=session)
+        await session.commit()
     except Exception as e:
+        await session.rollback()
         print(f"❌ Ошибка записи в БД: {e}")
         return JSONResponse(
             status_code=500,
@@ -578,16 +846,19 @@ async def api_bookings_submit(payload: BookingSubmitIn):
             placement_mode=common["placement_type"],
             specific_row=payload.specific_row,
             is_share=False,
+            check_duplicates=True,
         )
 
-        print(f"✅ Записано в Google Sheets, строки: {saved_rows}")
+        if not isinstance(saved_rows, SheetDuplicate):
+            print(f"✅ Записано в Google Sheets, строки: {saved_rows}")
 
     except Exception as e:
         print(f"❌ Ошибка записи в Sheets: {e}")
         import traceback
         traceback.print_exc()
         # Откат БД, если Sheets упали
-        await delete_bookings_by_ids(db_ids)
+        await delete_bookings_by_ids(db_ids, session=session)
+        await session.commit()
         return JSONResponse(
             status_code=500,
             content={
@@ -597,10 +868,24 @@ async def api_bookings_submit(payload: BookingSubmitIn):
             },
         )
 
+    # Кто-то из группы уже вписан в пакет в таблице — откатываем БД
+    if isinstance(saved_rows, SheetDuplicate):
+        await delete_bookings_by_ids(db_ids, session=session)
+        await session.commit()
+        return JSONResponse(
+            status_code=409,
+            content={
+                "ok": False,
+                "error": f"{saved_rows.last_name} {saved_rows.first_name} уже вписан(а) в пакет {package_name} в таблице",
+                "saved_rows": [],
+            },
+        )
+
     # 🔥 Если в Sheets не записалось - откатываем БД
     if not saved_rows:
         print(f"⚠️ Место не найдено в Google Sheets - откатываем БД")
-        await delete_bookings_by_ids(db_ids)
+        await delete_bookings_by_ids(db_ids, session=session)
+        await session.commit()
         return JSONResponse(
             status_code=409,
             content={
@@ -610,10 +895,10 @@ async def api_bookings_submit(payload: BookingSubmitIn):
             },
         )
 
-    # 7. Проставляем номера строк в БД
+    # 7. Проставляем номера строк в БД (одним UPDATE на группу)
+    await update_booking_rows_bulk(dict(zip(db_ids, saved_rows)), session=session)
+    await session.commit()
     for i, booking_id in enumerate(db_ids):
-        if i < len(saved_rows):
-            await update_booking_row(booking_id, saved_rows[i])
         print(f"\n💾 Запись в БД ID {booking_id} привязана к строке {saved_rows[i] if i < len(saved_rows) else 'N/A'}")
         # Уведомления шлет bot-worker. API не отправляет, чтобы избежать bot=None.
         print(f"ℹ️ Бронь #{booking_id} создана. Уведомление отправит bot-worker.")
@@ -674,55 +959,17 @@ async def get_manager_history(manager_id: int):
             }
         
         
-        bookings_data = []
-        for b in bookings:
-            passport_path = await resolve_passport_path(b)
-            # group_members теперь автоматически десериализуется SQLAlchemy (тип JSON)
-            group_members = b.group_members if b.group_members else []
-            bookings_data.append( {
-                "id": b.id,
-                "manager_id": b.manager_id,
-                "table_id": b.table_id,
-                "sheet_name": b.sheet_name,
-                "sheet_row_number": b.sheet_row_number,
-                "package_name": b.package_name,
-                "region": b.region,
-                "departure_city": b.departure_city,
-                "source": b.source,
-                "amount_paid": b.amount_paid,
-                "exchange_rate": b.exchange_rate,
-                "discount": b.discount,
-                "contract_number": b.contract_number,
-                "visa_status": b.visa_status,
-                "avia": b.avia,
-                "avia_request": b.avia_request,
-                "room_type": b.room_type,
-                "meal_type": b.meal_type,
-                "train": b.train,
-                "price": b.price,
-                "comment": b.comment,
-                "manager_name_text": b.manager_name_text,
-                "placement_type": b.placement_type,
-                "guest_last_name": b.guest_last_name,
-                "guest_first_name": b.guest_first_name,
-                "gender": b.gender,
-                "date_of_birth": b.date_of_birth,
-                "passport_num": b.passport_num,
-                "passport_expiry": b.passport_expiry,
-                "guest_iin": b.guest_iin,
-                "client_phone": b.client_phone,
-                "passport_image_path": passport_path,
-                "group_members": group_members,
-                "status": b.status,
-                "created_at": b.created_at.isoformat() if b.created_at else None
-            })
+        passport_paths = await resolve_passport_paths(bookings)
+        bookings_data = HISTORY_BOOKING.many(
+            bookings, lambda b: {"passport_image_path": passport_paths.get(b.id)}
+        )
         
         print(f"✅ Найдено {len(bookings_data)} бронирований")
         
-        return {
+        return FastJSONResponse({
             "ok": True,
             "bookings": bookings_data
-        }
+        })
         
     except Exception as e:
         print(f"❌ Ошибка получения истории: {e}")
@@ -745,15 +992,14 @@ async def api_passport_upload(file: UploadFile = File(...)):
         safe_ext = orig_ext if len(orig_ext) <= 5 else ".png"
         target_path = os.path.join(ABS_UPLOADS_DIR, f"bot_upload_{ts}{safe_ext}")
 
-        # Сохраняем файл
-        with open(target_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Сохраняем файл потоково (с лимитом размера и хэшем)
+        try:
+            _, digest = await save_upload(file, target_path)
+        except UploadTooLarge as e:
+            return JSONResponse(status_code=413, content={"ok": False, "error": str(e)})
 
         # Парсим паспорт
-        from bull_project.bull_bot.core.parsers.passport_parser import PassportParser
-        parser = PassportParser(debug=True)
-        passport_data = parser.parse(target_path)
+        passport_data = await parse_passport(target_path, digest)
 
         print(f"📄 Паспорт распознан:")
         print(f"   Пол: {passport_data.gender}")
@@ -948,7 +1194,7 @@ async def get_passport_photo(booking_id: int):
         # Путь к файлу паспорта (учитываем абсолютный/относительный)
         file_path = make_abs_passport_path(booking.passport_image_path)
 
-        if not os.path.exists(file_path):
+        if not await run_disk(os.path.exists, file_path):
             return JSONResponse(
                 status_code=404,
                 content={"ok": False, "error": "Файл паспорта не найден на диске"}
@@ -1068,6 +1314,7 @@ async def get_admin_analytics(
 
 
 @app.get("/api/admin/managers")
+@cached_response(ttl=300, stale=3600, tags=("users",))
 async def get_all_managers():
     """
     Получение списка всех менеджеров
@@ -1116,8 +1363,9 @@ async def get_manager_stats(
 
         # Преобразуем брони в JSON формат
         bookings_data = []
+        passport_paths = await resolve_passport_paths(stats['bookings'])
         for b in stats['bookings']:
-            passport_path = await resolve_passport_path(b)
+            passport_path = passport_paths.get(b.id)
             bookings_data.append({
                 "id": b.id,
                 "guest_last_name": b.guest_last_name,
@@ -1147,6 +1395,7 @@ async def get_manager_stats(
 
 
 @app.get("/api/admin/search/packages")
+@cached_response(ttl=60, stale=600, tags=("bookings",))
 async def search_packages_endpoint(date: str = Query(..., description="Дата для поиска (ДД.ММ)")):
     """
     Поиск пакетов по дате
@@ -1174,68 +1423,90 @@ async def search_packages_endpoint(date: str = Query(..., description="Дата
         )
 
 
+# Максимальный размер страницы /api/admin/bookings
+ADMIN_BOOKINGS_MAX_LIMIT = 500
+
+
+def encode_booking_cursor(cursor) -> Optional[str]:
+    """(created_at, id) -> строка курсора для клиента"""
+    if cursor is None:
+        return None
+    created_at, booking_id = cursor
+    return f"{created_at.isoformat()}_{booking_id}"
+
+
+def decode_booking_cursor(raw: Optional[str]):
+    """Строка курсора -> (created_at, id). ValueError, если курсор битый."""
+    if not raw:
+        return None
+    created_at, _, booking_id = raw.rpartition("_")
+    return datetime.fromisoformat(created_at), int(booking_id)
+
+
+def admin_booking_to_dict(b, passport_path: Optional[str]) -> Dict[str, Any]:
+    return ADMIN_BOOKING(b, passport_image_path=passport_path)
+
+
+async def stream_admin_bookings_ndjson(d1, d2, after):
+    """NDJSON: по одной брони на строку, пачками из серверного курсора"""
+    try:
+        async for chunk in stream_bookings_for_period(d1, d2, after):
+            passport_paths = await resolve_passport_paths(chunk)
+            yield b"".join(
+                dumps(admin_booking_to_dict(b, passport_paths.get(b.id))) + b"\n"
+                for b in chunk
+            )
+    except Exception as e:
+        # Статус уже отправлен — сообщаем об ошибке последней строкой
+        print(f"❌ Ошибка стриминга броней: {e}")
+        import traceback
+        traceback.print_exc()
+        yield dumps({"ok": False, "error": str(e)}) + b"\n"
+
+
 @app.get("/api/admin/bookings")
 async def get_all_bookings(
     start_date: str = Query(..., description="Дата начала (YYYY-MM-DD)"),
-    end_date: str = Query(..., description="Дата конца (YYYY-MM-DD)")
+    end_date: str = Query(..., description="Дата конца (YYYY-MM-DD)"),
+    limit: Optional[int] = Query(None, ge=1, le=ADMIN_BOOKINGS_MAX_LIMIT, description="Размер страницы"),
+    cursor: Optional[str] = Query(None, description="next_cursor из предыдущей страницы"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json | ndjson (потоковый)"),
 ):
     """
-    Получение списка всех броней за период
+    Получение списка всех броней за период (от новых к старым).
+
+    - без limit — все брони одним JSON (как раньше);
+    - limit (+ cursor) — страница и next_cursor для следующей (keyset по created_at, id);
+    - format=ndjson — потоковый ответ, по брони на строку.
     """
     try:
-        from datetime import datetime
-
         d1 = datetime.strptime(start_date, "%Y-%m-%d").date()
         d2 = datetime.strptime(end_date, "%Y-%m-%d").date()
+        try:
+            after = decode_booking_cursor(cursor)
+        except ValueError:
+            return JSONResponse(status_code=400, content={"ok": False, "error": "Некорректный cursor"})
+
+        if format == "ndjson":
+            return StreamingResponse(
+                stream_admin_bookings_ndjson(d1, d2, after),
+                media_type="application/x-ndjson",
+            )
 
-        bookings = await get_all_bookings_for_period(d1, d2)
+        next_cursor = None
+        if limit:
+            bookings, next_cursor = await get_bookings_page_for_period(d1, d2, limit, after)
+        else:
+            bookings = await get_all_bookings_for_period(d1, d2)
 
-        bookings_data = []
-        for b in bookings:
-            passport_path = await resolve_passport_path(b)
-            group_members = []
-            if b.group_members:
-                try:
-                    group_members = json.loads(b.group_members)
-                except Exception:
-                    group_members = []
-            bookings_data.append({
-                "id": b.id,
-                "table_id": b.table_id,
-                "guest_last_name": b.guest_last_name,
-                "guest_first_name": b.guest_first_name,
-                "gender": b.gender,
-                "date_of_birth": b.date_of_birth,
-                "guest_iin": b.guest_iin,
-                "passport_num": b.passport_num,
-                "passport_expiry": b.passport_expiry,
-                "passport_image_path": passport_path,
-                "client_phone": b.client_phone,
-                "package_name": b.package_name,
-                "sheet_name": b.sheet_name,
-                "sheet_row_number": b.sheet_row_number,
-                "room_type": b.room_type,
-                "placement_type": b.placement_type,
-                "meal_type": b.meal_type,
-                "visa_status": b.visa_status,
-                "avia": b.avia,
-                "train": b.train,
-                "departure_city": b.departure_city,
-                "region": b.region,
-                "source": b.source,
-                "price": b.price,
-                "amount_paid": b.amount_paid,
-                "status": b.status,
-                "manager_name": b.manager_name_text or b.manager_name,
-                "created_at": b.created_at.isoformat() if b.created_at else None,
-                "comment": b.comment or "",
-                "group_members": group_members
-            })
+        passport_paths = await resolve_passport_paths(bookings)
+        bookings_data = [admin_booking_to_dict(b, passport_paths.get(b.id)) for b in bookings]
 
-        return {
+        return FastJSONResponse({
             "ok": True,
-            "bookings": bookings_data
-        }
+            "bookings": bookings_data,
+            "next_cursor": encode_booking_cursor(next_cursor)
+        })
 
     except Exception as e:
         print(f"❌ Ошибка получения броней: {e}")
@@ -1254,12 +1525,10 @@ async def get_all_bookings(
 @app.get("/api/admin/requests")
 async def admin_requests():
     try:
-        pending = await get_pending_requests()
+        # Заявки сразу с бронями (JOIN), без запроса на каждую заявку
+        pending = await get_pending_requests_with_bookings()
         result = []
-        for req in pending:
-            booking = await get_booking_by_id(req.booking_id)
-            if not booking:
-                continue
+        for req, booking in pending:
             # group_members теперь автоматически десериализуется SQLAlchemy (тип JSON)
             group_members = booking.group_members if booking.group_members else []
             result.append({
@@ -1443,10 +1712,11 @@ async def admin_request_reject(req_id: int):
 # -----------------------------------------------------------------------------
 
 @app.get("/api/care/tables")
+@cached_response(ttl=600, stale=3600)
 async def get_care_tables():
     """Возвращает список таблиц (Google Sheets) для отдела заботы."""
     try:
-        tables = get_active_tables_for_care()
+        tables = await run_network(get_active_tables_for_care)
         if not tables:
             return {"ok": False, "error": "Нет доступных таблиц"}
 
@@ -1462,10 +1732,11 @@ async def get_care_tables():
 
 
 @app.get("/api/care/sheets")
+@cached_response(ttl=300, stale=3600)
 async def get_care_sheets(table_id: str = Query(...)):
     """Возвращает список листов в выбранной таблице."""
     try:
-        sheets = get_sheet_names(table_id) or []
+        sheets = await run_network(get_sheet_names, table_id) or []
         return {"ok": True, "sheets": sheets}
     except Exception as e:
         print(f"❌ Ошибка получения листов: {e}")
@@ -1477,8 +1748,28 @@ async def get_care_sheets(table_id: str = Query(...)):
         )
 
 
+@app.get("/api/care/autocomplete")
+async def care_autocomplete(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=30),
+):
+    """
+    Подсказки по началу ФИО (фамилия или имя) из индекса в памяти.
+    Возвращает только id, ФИО и пакет; детали — через /api/care/search.
+    """
+    try:
+        results = await autocomplete_tourist_names(q, limit)
+        return {"ok": True, "results": results}
+    except Exception as e:
+        print(f"❌ Ошибка автодополнения: {e}")
+        return JSONResponse(status_code=500, content={"ok": False, "error": str(e)})
+
+
 @app.get("/api/care/search")
-async def care_search_tourist(query: str = Query(..., min_length=1)):
+async def care_search_tourist(
+    query: str = Query(..., min_length=1),
+    limit: int = Query(10, ge=1, le=50),
+):
     """
     Поиск паломника по имени/фамилии (без учета регистра, пробелов).
     Возвращает список найденных паломников с фото паспорта и всей информацией.
@@ -1490,7 +1781,7 @@ async def care_search_tourist(query: str = Query(..., min_length=1)):
         print(f"🔍 Care Search: ищем '{query_normalized}'")
 
         # Поиск в БД
-        results = await search_tourist_by_name(query_normalized)
+        results = await search_tourist_by_name(query_normalized, limit=limit)
 
         if not results:
             return {
@@ -1498,53 +1789,33 @@ async def care_search_tourist(query: str = Query(..., min_length=1)):
                 "results": []
             }
 
+        # Если паспорта нет, пробуем взять самый свежий по этому же ФИО
+        # (для всех результатов одним запросом, каждый файл проверяем один раз)
+        try:
+            fallbacks = await get_latest_passports_for_people(
+                (b.guest_last_name, b.guest_first_name)
+                for b in results
+                if not b.passport_image_path
+            )
+            existing = await run_disk(_existing_paths, fallbacks.values())
+        except Exception:
+            fallbacks, existing = {}, set()
+
         # Формируем ответ
         tourists_data = []
         for booking in results:
             has_passport = bool(booking.passport_image_path)
 
-            # Если паспорта нет, пробуем взять самый свежий по этому же ФИО
             fallback_passport = None
-            if not has_passport and booking.guest_last_name and booking.guest_first_name:
-                try:
-                    fallback_passport = await get_latest_passport_for_person(
-                        booking.guest_last_name,
-                        booking.guest_first_name
-                    )
-                    if fallback_passport and not os.path.exists(fallback_passport):
-                        fallback_passport = None
-                except Exception:
+            if not has_passport:
+                fallback_passport = fallbacks.get((booking.guest_last_name, booking.guest_first_name))
+                if fallback_passport not in existing:
                     fallback_passport = None
 
-            tourists_data.append({
-                "id": booking.id,
-                "last_name": booking.guest_last_name or "-",
-                "first_name": booking.guest_first_name or "-",
-                "gender": booking.gender or "-",
-                "date_of_birth": booking.date_of_birth or "-",
-                "passport_num": booking.passport_num or "-",
-                "passport_expiry": booking.passport_expiry or "-",
-                "iin": booking.guest_iin or "-",
-                "phone": booking.client_phone or "-",
-                "package_name": booking.package_name or "-",
-                "sheet_name": booking.sheet_name or "-",
-                "placement_type": booking.placement_type or "-",
-                "room_type": booking.room_type or "-",
-                "meal_type": booking.meal_type or "-",
-                "price": booking.price or "-",
-                "amount_paid": booking.amount_paid or "-",
-                "manager_name": booking.manager_name_text or "-",
-                "comment": booking.comment or "",
-                "visa_status": booking.visa_status or "-",
-                "avia": booking.avia or "-",
-                "train": booking.train or "-",
-                "region": booking.region or "-",
-                "departure_city": booking.departure_city or "-",
-                "source": booking.source or "-",
-                "passport_image_path": booking.passport_image_path or fallback_passport or None,
-                "created_at": booking.created_at.isoformat() if booking.created_at else None,
-                "status": booking.status
-            })
+            tourists_data.append(CARE_SEARCH_BOOKING(
+                booking,
+                passport_image_path=booking.passport_image_path or fallback_passport or None,
+            ))
             print(
                 f"  Паломник {booking.guest_last_name} {booking.guest_first_name}: "
                 f"паспорт={has_passport}, путь={booking.passport_image_path or fallback_passport}"
@@ -1552,10 +1823,10 @@ async def care_search_tourist(query: str = Query(..., min_length=1)):
 
         print(f"✅ Найдено {len(tourists_data)} результатов")
 
-        return {
+        return FastJSONResponse({
             "ok": True,
             "results": tourists_data
-        }
+        })
 
     except Exception as e:
         print(f"❌ Ошибка поиска: {e}")
@@ -1598,7 +1869,7 @@ async def get_passport_photo(booking_id: int):
         passport_path = make_abs_passport_path(passport_path)
 
         # Проверяем существование файла
-        if not os.path.exists(passport_path):
+        if not await run_disk(os.path.exists, passport_path):
             return JSONResponse(
                 status_code=404,
                 content={"ok": False, "error": f"Passport image file not found: {passport_path}"}
@@ -1676,7 +1947,7 @@ async def get_passport_pdf(booking_id: int):
             )
 
         # Проверяем существование файла
-        if not os.path.exists(passport_path):
+        if not await run_disk(os.path.exists, passport_path):
             return JSONResponse(
                 status_code=404,
                 content={"ok": False, "error": f"Passport image file not found: {passport_path}"}
@@ -1693,65 +1964,14 @@ async def get_passport_pdf(booking_id: int):
                 }
             )
 
-        # Если изображение - конвертируем в PDF
+        # Если изображение - конвертируем в PDF (PIL + reportlab — в CPU-пуле)
         try:
-            import tempfile
-            from reportlab.pdfgen import canvas
-            from PIL import Image
             from fastapi import Response
             import urllib.parse
 
-            # Создаем временный PDF файл
-            temp_pdf = tempfile.NamedTemporaryFile(
-                suffix='.pdf',
-                delete=False,
-                dir=os.path.dirname(passport_path)
-            )
-            temp_pdf_path = temp_pdf.name
-            temp_pdf.close()
-
-            # Создаем PDF с изображением
             print(f"🔄 Создание PDF для паспорта {booking_id}...")
-
-            img = Image.open(passport_path)
-            img_width, img_height = img.size
-            aspect_ratio = img_width / img_height
-
-            if aspect_ratio > 1:
-                page_width = 842
-                page_height = 842 / aspect_ratio
-            else:
-                page_height = 842
-                page_width = 842 * aspect_ratio
-
-            c = canvas.Canvas(temp_pdf_path, pagesize=(page_width, page_height))
-            c.drawImage(passport_path, 0, 0, width=page_width, height=page_height)
-            c.save()
-
-            result_path = temp_pdf_path
-
-            # Проверяем что файл создан и не пустой
-            if not os.path.exists(result_path):
-                raise Exception(f"PDF не создан: {result_path}")
-
-            file_size = os.path.getsize(result_path)
-            if file_size == 0:
-                raise Exception("PDF файл пустой")
-
-            print(f"✅ PDF создан: {file_size} байт, путь: {result_path}")
-
-            # Читаем файл в память для гарантированной отправки
-            with open(result_path, 'rb') as f:
-                pdf_content = f.read()
-
-            print(f"✅ PDF прочитан в память: {len(pdf_content)} байт")
-
-            # Удаляем временный файл
-            try:
-                os.remove(result_path)
-                print(f"🗑️ Временный файл удален: {result_path}")
-            except Exception as e:
-                print(f"⚠️ Не удалось удалить временный файл: {e}")
+            pdf_content = await run_cpu(image_to_pdf_bytes, passport_path)
+            print(f"✅ PDF создан: {len(pdf_content)} байт")
 
             # Кодируем имя файла по RFC 5987 для поддержки non-ASCII
             encoded_filename = urllib.parse.quote(pdf_filename)
@@ -1800,6 +2020,7 @@ async def get_passport_pdf(booking_id: int):
 
 
 @app.get("/api/care/packages-by-date")
+@cached_response(ttl=120, stale=900, tags=("bookings",))
 async def get_packages_by_date_for_care(
     table_id: str = Query(...),
     sheet_name: str = Query(...)
@@ -1811,7 +2032,7 @@ async def get_packages_by_date_for_care(
         print(f"📋 Care Packages: table_id={table_id}, sheet_name={sheet_name}")
 
         # Сначала пробуем прочитать актуальные пакеты напрямую из Google Sheet
-        packages_map = get_packages_from_sheet(table_id, sheet_name)
+        packages_map = await run_network(get_packages_from_sheet, table_id, sheet_name)
         packages = list(packages_map.values()) if packages_map else []
 
         # Если из таблицы ничего не нашли (например, проблемы с форматами),
@@ -1848,46 +2069,17 @@ async def get_bookings_in_package_for_care(
 
         bookings = await get_all_bookings_in_package(table_id, sheet_name, package_name)
 
-        bookings_data = []
-        for b in bookings:
-            passport_path = await resolve_passport_path(b)
-            bookings_data.append({
-                "id": b.id,
-                "last_name": b.guest_last_name or "-",
-                "first_name": b.guest_first_name or "-",
-                "package_name": b.package_name or "-",
-                "sheet_name": b.sheet_name or "-",
-                "table_id": b.table_id or "-",
-                "gender": b.gender or "-",
-                "date_of_birth": b.date_of_birth or "-",
-                "passport_num": b.passport_num or "-",
-                "passport_expiry": b.passport_expiry or "-",
-                "iin": b.guest_iin or "-",
-                "phone": b.client_phone or "-",
-                "room_type": b.room_type or "-",
-                "meal_type": b.meal_type or "-",
-                "price": b.price or "-",
-                "amount_paid": b.amount_paid or "-",
-                "manager_name": b.manager_name_text or "-",
-                "comment": b.comment or "",
-                "visa_status": b.visa_status or "-",
-                "avia": b.avia or "-",
-                "train": b.train or "-",
-                "region": b.region or "-",
-                "departure_city": b.departure_city or "-",
-                "source": b.source or "-",
-                "passport_image_path": passport_path or None,
-                "sheet_row_number": b.sheet_row_number,
-                "created_at": b.created_at.isoformat() if b.created_at else None,
-                "status": b.status
-            })
+        passport_paths = await resolve_passport_paths(bookings)
+        bookings_data = CARE_PACKAGE_BOOKING.many(
+            bookings, lambda b: {"passport_image_path": passport_paths.get(b.id) or None}
+        )
 
         print(f"✅ Найдено {len(bookings_data)} броней в пакете")
 
-        return {
+        return FastJSONResponse({
             "ok": True,
             "bookings": bookings_data
-        }
+        })
 
     except Exception as e:
         print(f"❌ Ошибка получения броней: {e}")
@@ -1941,37 +2133,33 @@ async def get_phones_by_package(
 
 # Корневой маршрут для WebApp
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Главная страница"""
-    index_path = os.path.join(CARE_WEBAPP_DIR, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
+    response = await serve_static("care-webapp", "index.html", request)
+    if response is not None and response.status_code != 404:
+        return response
     return {"message": "Bull API", "status": "running"}
 
 
 # Раздача всех статических файлов
 @app.get("/{full_path:path}")
-async def catch_all(full_path: str):
+async def catch_all(full_path: str, request: Request):
     """Fallback для всех файлов"""
     
     # Игнорируем API роуты
     if full_path.startswith("api/"):
         return {"error": "API endpoint not found"}
     
-    # Ищем файл в care_webapp
-    file_path = os.path.join(CARE_WEBAPP_DIR, full_path)
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        return FileResponse(file_path)
-    
-    # Ищем файл в assets
-    asset_path = os.path.join(ASSETS_DIR, full_path)
-    if os.path.exists(asset_path) and os.path.isfile(asset_path):
-        return FileResponse(asset_path)
+    # Ищем файл в care_webapp, затем в assets
+    for name in ("care-webapp", "assets"):
+        response = await serve_static(name, full_path, request)
+        if response is not None and response.status_code != 404:
+            return response
     
     # Для всех остальных запросов возвращаем index.html (SPA fallback)
-    index_path = os.path.join(CARE_WEBAPP_DIR, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
+    response = await serve_static("care-webapp", "index.html", request)
+    if response is not None and response.status_code != 404:
+        return response
     
     return {"error": "Not found"}
 
@@ -1981,8 +2169,13 @@ async def catch_all(full_path: str):
 if __name__ == "__main__":
     # Koyeb/Render/etc. прокидывают порт через env, поэтому пробуем PORT/PORT0
     port = int(os.getenv("PORT") or os.getenv("PORT0") or "8000")
+    # Несколько процессов: кэши Google общие через CACHE_BACKEND=sqlite|redis
+    workers = int(os.getenv("API_WORKERS", "1"))
+    if workers > 1 and os.getenv("CACHE_BACKEND", "memory") == "memory":
+        print("⚠️ API_WORKERS > 1 при CACHE_BACKEND=memory: каждый воркер будет ходить в Google сам")
     uvicorn.run(
-        app,
+        "bull_project.bull_bot.core.api_server:app" if workers > 1 else app,
         host=os.getenv("HOST", "0.0.0.0"),
         port=port,
+        workers=workers,
     )
@@ -0,0 +1,179 @@
+"""
+availability.py - Живая доступность мест в пакетах (pub/sub для SSE).
+
+WebApp бронирования подписывается на /api/rooms/stream и получает не
+опрос раз в N секунд, а дельты: какие комнаты появились/изменились и какие
+ушли — как только другой менеджер занял место.
+
+  * писатели листов (google_sheets/writer.py) после записи вызывают
+    notify_package_changed(table_id, sheet, package) — из любого потока;
+  * AvailabilityHub держит по одной ленте (RoomsFeed) на запрос
+    (таблица, лист, пакет, кол-во, тип комнаты, пол): на изменение пакета
+    лента один раз пересчитывает свободные комнаты и раздает дельту всем
+    своим клиентам;
+  * раз в AVAILABILITY_RECHECK секунд лента перепроверяет лист и сама —
+    так видны ручные правки в таблице и записи из бота (другой процесс).
+
+Pub/sub внутри процесса: при нескольких воркерах API каждый раздает свои
+записи сразу, а чужие — на ближайшей перепроверке.
+"""
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# Перепроверка листа без событий (с), задержка перед пересчетом (с) —
+# запись группы идет несколькими запросами, пересчитываем один раз
+AVAILABILITY_RECHECK = float(os.getenv("AVAILABILITY_RECHECK", "60"))
+AVAILABILITY_DEBOUNCE = float(os.getenv("AVAILABILITY_DEBOUNCE", "0.5"))
+# Очередь событий клиента: медленный клиент вместо дельт получит полный список
+CLIENT_QUEUE_SIZE = 16
+
+# (table_id, sheet, package, count, room_type, gender)
+RoomsQuery = Tuple[str, str, str, int, str, str]
+
+
+def _norm(value: Optional[str]) -> str:
+    return (value or "").strip().lower()
+
+
+class RoomsFeed:
+    """Свободные комнаты по одному запросу + очереди подписанных клиентов"""
+
+    def __init__(self, query: RoomsQuery, compute: Callable[[], Awaitable[List[dict]]]):
+        self.query = query
+        self.table_id, self.sheet, self.package = query[0], _norm(query[1]), _norm(query[2])
+        self.compute = compute
+        self.rooms: Dict[int, dict] = {}
+        self.clients: Set[asyncio.Queue] = set()
+        self.ready = asyncio.Event()
+        self.error: Optional[Exception] = None
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def matches(self, table_id: str, sheet: Optional[str], package: Optional[str]) -> bool:
+        return (
+            table_id == self.table_id
+            and (sheet is None or sheet == self.sheet)
+            and (package is None or package == self.package)
+        )
+
+    def snapshot(self) -> List[dict]:
+        return sorted(self.rooms.values(), key=lambda room: room["row"])
+
+    async def load(self):
+        """Первый расчет (ошибку видят все, кто ждет ready)"""
+        try:
+            self.rooms = {room["row"]: room for room in await self.compute()}
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready.set()
+        if self.error is None:
+            self._task = asyncio.create_task(self._run())
+
+    def mark_changed(self):
+        self._changed.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), AVAILABILITY_RECHECK)
+                await asyncio.sleep(AVAILABILITY_DEBOUNCE)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            await self.refresh()
+
+    async def refresh(self):
+        try:
+            rooms = {room["row"]: room for room in await self.compute()}
+        except Exception as e:
+            print(f"⚠️ Не удалось обновить доступность {self.query}: {e}")
+            return
+        upsert = [room for row, room in sorted(rooms.items()) if self.rooms.get(row) != room]
+        removed = [row for row in self.rooms if row not in rooms]
+        self.rooms = rooms
+        if upsert or removed:
+            self.broadcast("delta", {"upsert": upsert, "removed": removed, "found": bool(rooms)})
+
+    def broadcast(self, event: str, payload: dict):
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait((event, payload))
+            except asyncio.QueueFull:
+                # Клиент не успевает — выбрасываем накопленное, шлем полный список
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(("rooms", {"rooms": self.snapshot(), "found": bool(self.rooms)}))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+class AvailabilityHub:
+    """Ленты доступности процесса; publish() можно звать из любого потока"""
+
+    def __init__(self):
+        self._feeds: Dict[RoomsQuery, RoomsFeed] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        return len(self._feeds)
+
+    async def subscribe(self, query: RoomsQuery, compute) -> Tuple[RoomsFeed, asyncio.Queue]:
+        """Подписка на ленту запроса (создается при первом клиенте)"""
+        self._loop = asyncio.get_running_loop()
+        while True:
+            feed = self._feeds.get(query)
+            if feed is None:
+                feed = self._feeds[query] = RoomsFeed(query, compute)
+                try:
+                    await feed.load()
+                except BaseException:
+                    # Клиент отключился во время загрузки — недогруженную ленту убираем
+                    self._drop(feed)
+                    raise
+            else:
+                await feed.ready.wait()
+            if feed.error is not None:
+                self._drop(feed)
+                raise feed.error
+            if self._feeds.get(query) is feed:
+                break
+            # Загрузку бросили — создаем ленту заново
+        queue: asyncio.Queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        feed.clients.add(queue)
+        return feed, queue
+
+    def unsubscribe(self, feed: RoomsFeed, queue: asyncio.Queue):
+        feed.clients.discard(queue)
+        if not feed.clients:
+            self._drop(feed)
+
+    def _drop(self, feed: RoomsFeed):
+        if self._feeds.get(feed.query) is feed:
+            del self._feeds[feed.query]
+        feed.stop()
+
+    def publish(self, table_id: str, sheet_name: Optional[str] = None, package_name: Optional[str] = None):
+        """Пакет изменился (sheet/package None — весь лист/вся таблица)"""
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self._feeds:
+            return
+        sheet = None if sheet_name is None else _norm(sheet_name)
+        package = None if package_name is None else _norm(package_name)
+        loop.call_soon_threadsafe(self._dispatch, table_id, sheet, package)
+
+    def _dispatch(self, table_id: str, sheet: Optional[str], package: Optional[str]):
+        for feed in list(self._feeds.values()):
+            if feed.matches(table_id, sheet, package):
+                feed.mark_changed()
+
+
+# Синглтон процесса
+availability_hub = AvailabilityHub()
+
+
+def notify_package_changed(table_id: str, sheet_name: Optional[str] = None, package_name: Optional[str] = None):
+    availability_hub.publish(table_id, sheet_name, package_name)
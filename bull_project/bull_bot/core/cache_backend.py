@@ -0,0 +1,283 @@
+"""
+cache_backend.py - Общий кэш для нескольких процессов API.
+
+Кэши Google Sheets (список таблиц, листы, пакеты) раньше жили в глобалах
+модулей: при нескольких воркерах uvicorn каждый ходил бы в Google сам.
+Теперь они лежат в бэкенде, который выбирается переменной CACHE_BACKEND:
+
+  * memory — словарь в процессе (по умолчанию, один воркер / бот);
+  * sqlite — файл SQLite (WAL) на диске, CACHE_URL — путь к файлу:
+    общий для всех воркеров одного хоста;
+  * redis  — Redis или совместимый сервер, CACHE_URL — redis://...
+    (нужен пакет redis). Для тестов вместо сервера подходит любой
+    клиент с тем же API, например fakeredis.FakeRedis():
+    RedisCache(client=...).
+
+Значения — JSON (ключи словарей становятся строками — храните пары
+списком). API синхронный: модуль вызывают и gspread-код в потоках пула,
+и async-код (обращение к кэшу — доли миллисекунды).
+
+get_or_compute() — «один считает, остальные ждут» между процессами:
+на промахе воркер берет короткую блокировку (add), остальные несколько
+секунд ждут готового значения вместо параллельного запроса в Google.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").strip().lower()
+CACHE_URL = os.getenv("CACHE_URL", "").strip()
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "bull:")
+
+_DEFAULT_SQLITE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tmp", "shared_cache.db"
+)
+
+_MISSING = object()
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class CacheBackend:
+    """get/set/add/delete/delete_prefix; ttl — секунды (None — без срока)"""
+
+    name = "base"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Записывает, только если ключа нет (атомарно). True — записали."""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def delete_prefix(self, prefix: str):
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    name = "memory"
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], str]] = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key: str, now: float):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] is not None and item[0] <= now:
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._alive(key, time.time())
+        return default if item is None else json.loads(item[1])
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires, _dumps(value))
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        with self._lock:
+            if self._alive(key, now) is not None:
+                return False
+            self._data[key] = (now + ttl if ttl else None, _dumps(value))
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+
+class SQLiteCache(CacheBackend):
+    """Файл SQLite в режиме WAL: общий кэш воркеров одного хоста"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = _DEFAULT_SQLITE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, _dumps(value), time.time() + ttl if ttl else None),
+        )
+
+    def add(self, key, value, ttl=None):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, _dumps(value), now + ttl if ttl else None),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix):
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        self._conn().execute("DELETE FROM cache WHERE key LIKE ? ESCAPE '\\'", (escaped + "%",))
+
+
+class RedisCache(CacheBackend):
+    """Redis (или совместимый сервер/клиент): общий кэш для нескольких хостов"""
+
+    name = "redis"
+
+    def __init__(self, url: str = "", client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("CACHE_BACKEND=redis, но пакет redis не установлен") from e
+            client = redis.Redis.from_url(url or "redis://localhost:6379/0")
+        self.client = client
+
+    @staticmethod
+    def _px(ttl: Optional[float]) -> Optional[int]:
+        return max(1, int(ttl * 1000)) if ttl else None
+
+    def get(self, key, default=None):
+        raw = self.client.get(key)
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, _dumps(value), px=self._px(ttl))
+
+    def add(self, key, value, ttl=None):
+        return bool(self.client.set(key, _dumps(value), px=self._px(ttl), nx=True))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def delete_prefix(self, prefix):
+        pattern = "".join("\\" + ch if ch in "\\*?[]" else ch for ch in prefix) + "*"
+        keys = list(self.client.scan_iter(match=pattern, count=500))
+        if keys:
+            self.client.delete(*keys)
+
+
+def make_cache(backend: str = CACHE_BACKEND, url: str = CACHE_URL) -> CacheBackend:
+    if backend == "sqlite":
+        return SQLiteCache(url or _DEFAULT_SQLITE_PATH)
+    if backend == "redis":
+        return RedisCache(url)
+    if backend != "memory":
+        logger.warning(f"⚠️ Неизвестный CACHE_BACKEND={backend!r} — используем memory")
+    return MemoryCache()
+
+
+_cache: Optional[CacheBackend] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> CacheBackend:
+    """Общий кэш процесса (создается при первом обращении)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = make_cache()
+                logger.info(f"🗄 Кэш: {_cache.name}")
+    return _cache
+
+
+def set_cache(cache: CacheBackend):
+    """Подменяет бэкенд (тесты, ручная настройка)"""
+    global _cache
+    _cache = cache
+
+
+def cache_key(*parts: Any) -> str:
+    return CACHE_PREFIX + ":".join(str(p) for p in parts)
+
+
+def get_or_compute(
+    key: str,
+    ttl: float,
+    compute: Callable[[], Any],
+    lock_ttl: float = 30,
+    wait: float = 10,
+    cacheable: Callable[[Any], bool] = bool,
+) -> Any:
+    """
+    Значение из кэша или compute(). На промахе считает один процесс, другие
+    ждут до wait секунд (и считают сами, если не дождались). Результат
+    кладется в кэш, только если cacheable(result) (по умолчанию — непустой).
+    """
+    cache = get_cache()
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = key + ":lock"
+    locked = cache.add(lock_key, 1, ttl=lock_ttl)
+    if not locked:
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            time.sleep(0.1)
+            value = cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+    try:
+        value = compute()
+        if cacheable(value):
+            cache.set(key, value, ttl=ttl)
+        return value
+    finally:
+        if locked:
+            cache.delete(lock_key)
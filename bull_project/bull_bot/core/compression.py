@@ -0,0 +1,64 @@
+"""
+compression.py - Сжатие больших JSON-ответов API (brotli / gzip).
+
+Списки броней (история, админка, Отдел Заботы) весят сотни килобайт и
+хорошо сжимаются. Сжимаются только ответы /api/ больше COMPRESS_MIN_SIZE
+байт и только если клиент прислал Accept-Encoding:
+
+  * brotli — если установлен пакет brotli-asgi (с откатом на gzip для
+    клиентов без br);
+  * иначе — GZipMiddleware из Starlette.
+
+Файлы (фото и PDF паспортов) уже сжаты, а SSE-поток (/api/rooms/stream)
+буферизовать нельзя — их пути в COMPRESS_EXCLUDE_PREFIXES.
+"""
+import os
+from typing import Iterable
+
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    from brotli_asgi import BrotliMiddleware
+    HAS_BROTLI = True
+except ImportError:
+    BrotliMiddleware = None
+    HAS_BROTLI = False
+
+# Ответы меньше порога не сжимаем (байты)
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+COMPRESS_PATH_PREFIX = "/api/"
+
+COMPRESS_EXCLUDE_PREFIXES = (
+    "/api/care/passport-photo/",
+    "/api/care/passport-pdf/",
+    "/api/rooms/stream",
+)
+
+
+class SelectiveCompressionMiddleware:
+    """Пропускает через компрессор только подходящие пути, остальные — как есть"""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE,
+                 prefix: str = COMPRESS_PATH_PREFIX,
+                 exclude: Iterable[str] = COMPRESS_EXCLUDE_PREFIXES):
+        self.app = app
+        self.prefix = prefix
+        self.exclude = tuple(exclude)
+        if HAS_BROTLI:
+            self.compressed = BrotliMiddleware(app, minimum_size=minimum_size, gzip_fallback=True)
+        else:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            path = scope.get("path", "")
+            if path.startswith(self.prefix) and not path.startswith(self.exclude):
+                await self.compressed(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+def add_compression(app, **options):
+    """Подключает сжатие к приложению FastAPI"""
+    app.add_middleware(SelectiveCompressionMiddleware, **options)
@@ -0,0 +1,163 @@
+"""
+executors.py - Блокирующие вызовы из async-кода — только через пулы потоков.
+
+Один медленный вызов Google на event loop замораживает все запросы воркера,
+поэтому синхронная работа уходит в отдельные ограниченные пулы:
+
+  * network — Google Sheets (gspread) и прочие сетевые вызовы;
+  * cpu     — PIL, reportlab, OCR, разбор снапшотов листов;
+  * disk    — файловая система (stat, чтение/запись, удаление).
+
+Пулы раздельные: зависший Google не отнимает потоки у OCR и файлов, и
+наоборот. Размеры — EXECUTOR_*_WORKERS.
+
+    sheets = await run_network(get_sheet_names, table_id)
+    pdf = await run_cpu(image_to_pdf_bytes, path)
+    exists = await run_disk(os.path.exists, path)
+
+    @offloaded(NETWORK)
+    def clear_booking_in_sheets(...):   # синхронное тело,
+        ...                             # вызывается как await clear_booking_in_sheets(...)
+
+LOOP_STALL_MS > 0 включает детектор зависаний event loop (отладка): если
+цикл не отвечает дольше порога, в лог пишется стек потока цикла — видно,
+какой вызов его держит.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+NETWORK, CPU, DISK = "network", "cpu", "disk"
+
+POOL_SIZES = {
+    NETWORK: int(os.getenv("EXECUTOR_NETWORK_WORKERS", "16")),
+    CPU: int(os.getenv("EXECUTOR_CPU_WORKERS", str(min(4, os.cpu_count() or 1)))),
+    DISK: int(os.getenv("EXECUTOR_DISK_WORKERS", "8")),
+}
+
+# Порог детектора зависаний event loop (мс, 0 — выключен)
+LOOP_STALL_MS = float(os.getenv("LOOP_STALL_MS", "0"))
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def get_executor(pool: str) -> ThreadPoolExecutor:
+    executor = _pools.get(pool)
+    if executor is None:
+        with _pools_lock:
+            executor = _pools.get(pool)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=POOL_SIZES[pool], thread_name_prefix=f"bull-{pool}"
+                )
+                _pools[pool] = executor
+    return executor
+
+
+async def run_in(pool: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """Выполняет func(*args, **kwargs) в пуле pool (с contextvars вызывающего)"""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(pool), call)
+
+
+async def run_network(func: Callable[..., T], *args, **kwargs) -> T:
+    return await run_in(NETWORK, func, *args, **kwargs)
+
+
+async def run_cpu(func: Callable[..., T], *args, **kwargs) -> T:
+    return await run_in(CPU, func, *args, **kwargs)
+
+
+async def run_disk(func: Callable[..., T], *args, **kwargs) -> T:
+    return await run_in(DISK, func, *args, **kwargs)
+
+
+def offloaded(pool: str):
+    """Делает из синхронной функции корутину, которая выполняется в пуле pool"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await run_in(pool, func, *args, **kwargs)
+
+        # Синхронный вариант — для вызова из кода, который уже в потоке
+        wrapper.sync = func
+        return wrapper
+
+    return decorator
+
+
+def shutdown_executors():
+    with _pools_lock:
+        for executor in _pools.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
+
+
+# ---------- детектор зависаний event loop ----------
+
+class LoopStallDetector:
+    """
+    Корутина-пульс отмечается каждые interval секунд; поток-сторож
+    проверяет, что пульс не опаздывает больше threshold, и при зависании
+    пишет в лог стек потока event loop (один раз на зависание).
+    """
+
+    def __init__(self, threshold_ms: float, interval: Optional[float] = None):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval or min(self.threshold / 2, 0.1)
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+
+    async def _heartbeat(self):
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval):
+            beat = self._last_beat
+            lag = time.monotonic() - beat - self.interval
+            if lag < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(стек недоступен)"
+            logger.warning(f"🐢 Event loop завис на {lag * 1000:.0f} мс:\n{stack}")
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-stall-detector", daemon=True).start()
+        logger.info(f"🐢 Детектор зависаний event loop: порог {self.threshold * 1000:.0f} мс")
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+
+def start_stall_detector(threshold_ms: float = LOOP_STALL_MS) -> Optional[LoopStallDetector]:
+    """Запускает детектор на текущем event loop (None, если порог 0)"""
+    if threshold_ms <= 0:
+        return None
+    detector = LoopStallDetector(threshold_ms)
+    detector.start()
+    return detector
@@ -1,31 +1,24 @@
 import re
+from functools import lru_cache
+
 from bull_project.bull_bot.core.parsers.people_parser import _norm_room_kind
+from bull_project.bull_bot.core.parsers.header_detector import (
+    SHEET_HEADERS,
+    find_header_row,
+)
+from bull_project.bull_bot.core.google_sheets.scan_engine import grid_for, room_kind_name
+from bull_project.bull_bot.core.utils.text_utils import (
+    SHEETS_DEBUG,
+    gender_code,
+    normalize_cell,
+    normalize_text,
+    room_kind,
+    room_size,
+)
 
 def normalize(text):
-    return str(text).replace("\n", " ").replace("\r", " ").strip().lower()
-
-# === КАРТА ЗАГОЛОВКОВ ===
-HEADER_MAP = {
-    "last_name": ["last name", "lastname", "фамилия", "names"],
-    "first_name": ["first name", "firstname", "имя"],
-    "gender": ["gender", "sex", "пол"],
-    "room": ["type of room", "room", "тип номера", "комната"],
-    "meal": ["meal", "meal a day", "питание"],
-    "dob": ["date of birth", "dob", "дата рождения", "д.р."],
-    "doc_num": ["document number", "passport", "номер паспорта", "passport number", "doc num"],
-    "doc_exp": ["document expiration", "expiration", "expiry", "срок действия", "годен до", "valid until"],
-    "iin": ["iin", "ИИН", "иин"],
-    "visa": ["visa", "виза"],
-    "avia": ["avia", "авиа", "рейс", "flight"],
-    "price": ["price", "цена", "стоимость"],
-    "comment": ["comment", "комментарий", "примечание", "сomment"],
-    "manager": ["manager", "менеджер"],
-    "train": ["train", "поезд", "жд"],
-    "client_phone": ["contact", "phone", "телефон", "номер", "контакты"],
-    "source": ["source", "источник"],
-    "amount_paid": ["paid", "оплачено", "внесено"],
-    "region": ["region", "регион"],
-}
+    """Нормализация значения ячейки (с кэшем, см. text_utils.normalize_cell)"""
+    return normalize_cell(text)
 
 ROOM_FALLBACKS = {
     "quad": ["quad", "dbl"],
@@ -35,37 +28,45 @@ ROOM_FALLBACKS = {
     "quin": ["quin", "quad", "dbl"],
 }
 
+@lru_cache(maxsize=256)
+def _normalize_room_value_cached(value: str) -> str:
+    return room_kind(value) or normalize_cell(value)
+
 def normalize_room_value(value):
     """Нормализует тип комнаты, приходящий от пользователя."""
-    print(f"\n🔧 normalize_room_value вызвана с: '{value}'")
     if not value:
-        print(f"   ❌ Значение пустое, возвращаем ''")
         return ""
-    normalized = _norm_room_kind(str(value), None)
-    print(f"   📊 _norm_room_kind вернула: '{normalized}'")
-    if normalized:
-        print(f"   ✅ Возвращаем normalized: '{normalized}'")
-        return normalized
-    fallback = normalize(value)
-    print(f"   ⚠️ normalized пустой, возвращаем fallback: '{fallback}'")
-    return fallback
-
-def find_package_row(all_rows, target_pkg_name):
-    """Поиск строки с названием пакета"""
+    result = _normalize_room_value_cached(str(value))
+    if SHEETS_DEBUG:
+        print(f"🔧 normalize_room_value('{value}') -> '{result}'")
+    return result
+
+def find_package_row(all_rows, target_pkg_name, grid=None):
+    """Поиск строки с названием пакета (grid — векторный движок scan_engine)"""
     target = normalize(target_pkg_name)
     print(f"🔍 Ищем пакет: '{target}'")
 
     # 🔥 ОТЛАДКА: Показываем первые 30 строк с датами
-    print(f"📋 Первые строки таблицы (отладка):")
-    for i, row in enumerate(all_rows[:30]):
-        row_text = normalize(" ".join(row[:10]))  # Смотрим первые 10 колонок
-        # Показываем строки которые начинаются с цифр (возможные пакеты)
-        if row_text and len(row_text) > 3 and row_text[0].isdigit():
-            print(f"  Строка {i+1}: {row_text[:120]}")
+    if SHEETS_DEBUG:
+        print(f"📋 Первые строки таблицы (отладка):")
+        for i, row in enumerate(all_rows[:30]):
+            row_text = normalize_text(" ".join(row[:10]))  # Смотрим первые 10 колонок
+            # Показываем строки которые начинаются с цифр (возможные пакеты)
+            if row_text and len(row_text) > 3 and row_text[0].isdigit():
+                print(f"  Строка {i+1}: {row_text[:120]}")
+
+    if grid is not None:
+        i = grid.find_package_row(target)
+        if i is not None:
+            print(f"✅ Найден пакет в строке {i+1}: {grid.row_text(10)[i][:100]}")
+            return i
+        print(f"❌ Пакет '{target}' не найден!")
+        print(f"   Искали: '{target}'")
+        return None
 
     # 🔥 Расширили поиск с 5 до 10 колонок
     for i, row in enumerate(all_rows):
-        row_text = normalize(" ".join(row[:10]))
+        row_text = normalize_text(" ".join(row[:10]))
         if target in row_text:
             print(f"✅ Найден пакет в строке {i+1}: {row_text[:100]}")
             return i
@@ -75,7 +76,7 @@ def find_package_row(all_rows, target_pkg_name):
     if len(parts) > 1:
         keyword = parts[-1]
         for i, row in enumerate(all_rows):
-            row_text = normalize(" ".join(row[:10]))  # 🔥 Расширили поиск
+            row_text = normalize_text(" ".join(row[:10]))  # 🔥 Расширили поиск
             if keyword in row_text and any(c.isdigit() for c in row_text):
                 print(f"✅ Найден пакет (по ключевому слову) в строке {i+1}: {row_text[:80]}")
                 return i
@@ -85,53 +86,34 @@ def find_package_row(all_rows, target_pkg_name):
     return None
 
 def find_headers_extended(row):
-    """Поиск заголовков таблицы"""
-    cols = {}
-    row_clean = [normalize(c) for c in row]
-
-    # Проверяем наличие хотя бы одного из ключевых заголовков
-    has_name_col = any(kw in " ".join(row_clean) for kw in ["last name", "фамилия", "names", "name"])
-
-    if not has_name_col:
-        return None
-
-    for col_idx, val in enumerate(row_clean):
-        if not val:
-            continue
-        for key, keywords in HEADER_MAP.items():
-            if key not in cols and any(k == val or k in val for k in keywords):
-                cols[key] = col_idx
-
-    # Должна быть колонка "room" и хотя бы одна из: last_name/first_name/gender
-    if "room" in cols and (cols.get("last_name") or cols.get("first_name") or cols.get("gender")):
+    """Поиск заголовков таблицы (общий детектор, кэш по макету шапки)"""
+    cols = SHEET_HEADERS.detect(row)
+    if cols and SHEETS_DEBUG:
         print(f"✅ Заголовки найдены: {list(cols.keys())}")
-        return cols
+    return cols
 
-    return None
-
-def get_package_block(all_rows, pkg_name):
-    """Получение границ блока пакета"""
-    start_row = find_package_row(all_rows, pkg_name)
+def get_package_block(all_rows, pkg_name, grid=None):
+    """Получение границ блока пакета (grid — векторный движок scan_engine, без него — построчно)"""
+    start_row = find_package_row(all_rows, pkg_name, grid)
     if start_row is None:
         print(f"❌ Пакет '{pkg_name}' не найден в таблице")
         return None, None, None
 
-    header_row = None
-    cols = None
-
     # Ищем заголовки в пределах 15 строк после названия пакета
-    for r in range(start_row, min(start_row + 15, len(all_rows))):
-        cols = find_headers_extended(all_rows[r])
-        if cols:
-            header_row = r
-            print(f"✅ Заголовки найдены в строке {r+1}")
-            break
+    header_row, cols = find_header_row(all_rows, start_row, 15)
+    if header_row is not None:
+        print(f"✅ Заголовки найдены в строке {header_row+1}: {list(cols.keys())}")
 
     if not header_row:
         print(f"❌ Заголовки не найдены для пакета '{pkg_name}'")
         return None, None, None
 
     # Определяем конец блока
+    if grid is not None:
+        end_row = grid.block_end(header_row)
+        print(f"📦 Блок пакета: строки {header_row+1} - {end_row}")
+        return header_row, end_row, cols
+
     end_row = len(all_rows)
     empty_streak = 0
 
@@ -144,7 +126,7 @@ def get_package_block(all_rows, pkg_name):
                 break
         else:
             empty_streak = 0
-            norm_text = normalize(row_text)
+            norm_text = normalize_text(row_text)
             # Проверка на начало нового пакета
             if "days" in norm_text or ("-" in norm_text and "202" in norm_text and len(norm_text) < 50):
                 end_row = r
@@ -158,13 +140,8 @@ def check_has_train_column(all_rows, pkg_name):
     return cols and 'train' in cols
 
 def get_room_size(room_text):
-    """Определение размера комнаты"""
-    t = normalize(room_text)
-    if 'quad' in t or '4' in t: return 4
-    if 'trip' in t or 'trpl' in t or '3' in t: return 3
-    if 'doub' in t or 'dbl' in t or '2' in t: return 2
-    if 'sing' in t or 'sgl' in t or '1' in t: return 1
-    return 1
+    """Определение размера комнаты (с кэшем, см. text_utils.room_size)"""
+    return room_size(room_text if type(room_text) is str else str(room_text))
 
 def is_row_occupied(row, col_last, col_first=None):
     """Проверка занятости строки"""
@@ -192,7 +169,7 @@ def find_share_slot_for_type(all_rows, header_row, end_row, cols, room_type, tar
     if col_room is None or col_last is None:
         return None
 
-    target_gen = normalize(target_gender).upper()
+    target_gen = gender_code(target_gender)
 
     for i in range(header_row + 1, end_row):
         row = all_rows[i]
@@ -218,7 +195,7 @@ def find_share_slot_for_type(all_rows, header_row, end_row, cols, room_type, tar
             c_row = all_rows[curr_idx]
             occupied = is_row_occupied(c_row, col_last, col_first)
             gen = c_row[col_gender] if col_gender and col_gender < len(c_row) else ""
-            norm_gen = normalize(gen).upper() if gen else ""
+            norm_gen = gender_code(gen) if gen else ""
 
             if occupied:
                 has_guests = True
@@ -288,8 +265,8 @@ def find_best_slot_for_group(all_rows, target_pkg_name, group_data, target_room_
     fallback_types = ROOM_FALLBACKS.get(target_room, [target_room])
     
     # Разделяем группу по полу
-    males = [p for p in group_data if normalize(p.get('Gender', '')).upper() == 'M']
-    females = [p for p in group_data if normalize(p.get('Gender', '')).upper() == 'F']
+    males = [p for p in group_data if gender_code(p.get('Gender', '')) == 'M']
+    females = [p for p in group_data if gender_code(p.get('Gender', '')) == 'F']
 
     # Если есть паломники без пола — не размещаем, нужно спросить пользователя
     if len(males) + len(females) != len(group_data):
@@ -311,7 +288,7 @@ def find_best_slot_for_group(all_rows, target_pkg_name, group_data, target_room_
         if group_size == 1:
             print("\n🔍 Один человек - пытаемся найти свободное место")
             person_gender = group_data[0].get('Gender', 'M') if group_data else 'M'
-            gender_norm = normalize(person_gender).upper()
+            gender_norm = gender_code(person_gender)
 
             # ШАГ 1: Ищем свободное место ТОЛЬКО в точном типе комнаты (quad)
             print(f"   Шаг 1: Поиск свободного места в комнатах типа {target_room}")
@@ -407,7 +384,7 @@ def find_best_slot_for_group(all_rows, target_pkg_name, group_data, target_room_
         female_indices = []
 
         for idx, person in enumerate(group_data):
-            gender = normalize(person.get('Gender', 'M')).upper()
+            gender = gender_code(person.get('Gender', 'M'))
             if gender == 'M':
                 male_indices.append(idx)
             else:
@@ -508,7 +485,7 @@ def place_gender_group(all_rows, header_row, end_row, cols, people, gender, targ
                         # Определяем пол
                         gen = c_row[col_gender] if col_gender and col_gender < len(c_row) else ""
                         if gen:
-                            room_gender = normalize(gen).upper()
+                            room_gender = gender_code(gen)
                     else:
                         free_slots.append(curr_idx)
                 
@@ -582,7 +559,7 @@ def find_empty_room_slot(all_rows, header_row, end_row, cols, target_room, requi
                         # Определяем пол
                         gen = c_row[col_gender] if col_gender and col_gender < len(c_row) else ""
                         if gen:
-                            room_genders.add(normalize(gen).upper())
+                            room_genders.add(gender_code(gen))
                     else:
                         has_free_slots = True
 
@@ -600,6 +577,51 @@ def find_empty_room_slot(all_rows, header_row, end_row, cols, target_room, requi
     return None
 
 
+# Трансформации комнат, если подселить некуда:
+# (подстроки типа комнаты, смещения следующих комнат того же типа,
+#  сколько строк подряд должны быть свободны, код результата, описание)
+ROOM_TRANSFORMS = {
+    "dbl": [
+        (("quad", "4"), (), 4, "trans_1quad_2dbl", "пустой QUAD (1 QUAD -> 2 DOUBLE)"),
+        (("trip", "trpl"), (3,), 6, "trans_2trpl_3dbl", "2 пустых TRIPLE (2 TRIPLE -> 3 DOUBLE)"),
+    ],
+    "trpl": [
+        (("quad", "4"), (4,), 8, "trans_2quad_mix", "2 пустых QUAD (2 QUAD -> 2 TRIPLE + DOUBLE)"),
+        (("dbl", "doub"), (2, 4), 6, "trans_3dbl_2trpl", "3 пустых DOUBLE (3 DOUBLE -> 2 TRIPLE)"),
+    ],
+    "quad": [
+        (("dbl", "doub"), (2,), 4, "trans_2dbl_1quad", "2 пустых DOUBLE (2 DOUBLE -> 1 QUAD)"),
+    ],
+    "sgl": [
+        (("dbl", "doub"), (), 2, "trans_1dbl_2sgl", "пустой DOUBLE (1 DOUBLE -> 2 SINGLE)"),
+        (("trip", "trpl"), (), 3, "trans_1trpl_mix", "пустой TRIPLE (1 TRIPLE -> 1 DOUBLE + 1 SINGLE)"),
+    ],
+}
+ROOM_TRANSFORM_ALIASES = {"double": "dbl", "triple": "trpl", "quadro": "quad", "sing": "sgl", "single": "sgl"}
+
+
+def find_transform_slot(all_rows, header_row, end_row, col_room, col_last, subs, offsets, count, grid=None):
+    """
+    Первая строка i блока, где стоит комната нужного типа (и такие же комнаты
+    на i+offset), а count строк подряд начиная с i свободны. None — не нашли.
+    """
+    stop = end_row - max(offsets, default=0)
+    if grid is not None:
+        return grid.first_room_run(header_row + 1, stop, end_row, col_room, col_last, subs, offsets, count)
+
+    def kind_at(idx):
+        raw = normalize(all_rows[idx][col_room]) if col_room < len(all_rows[idx]) else ""
+        return any(s in raw for s in subs)
+
+    for i in range(header_row + 1, stop):
+        if not kind_at(i):
+            continue
+        if all(i + off < end_row and kind_at(i + off) for off in offsets):
+            if check_rows_are_empty(all_rows, i, count, col_last):
+                return i
+    return None
+
+
 def find_best_slot(all_rows, target_pkg_name, target_gender, target_room_type):
     """Поиск лучшего места для размещения ОДНОГО человека (обратная совместимость)"""
     print(f"\n{'='*60}")
@@ -609,7 +631,8 @@ def find_best_slot(all_rows, target_pkg_name, target_gender, target_room_type):
     print(f"   Тип комнаты: {target_room_type}")
     print(f"{'='*60}\n")
 
-    header_row, end_row, cols = get_package_block(all_rows, target_pkg_name)
+    grid = grid_for(all_rows)
+    header_row, end_row, cols = get_package_block(all_rows, target_pkg_name, grid)
     if not header_row:
         print("❌ Не удалось найти блок пакета")
         return None, None, "error"
@@ -624,7 +647,7 @@ def find_best_slot(all_rows, target_pkg_name, target_gender, target_room_type):
         return None, None, "error"
 
     target_room = normalize_room_value(target_room_type)
-    target_gen = normalize(target_gender).upper()
+    target_gen = gender_code(target_gender)
     if target_gen not in ['M', 'F']:
         target_gen = 'M'
 
@@ -648,92 +671,12 @@ def find_best_slot(all_rows, target_pkg_name, target_gender, target_room_type):
     # 2. ПОИСК ВАРИАНТОВ ТРАНСФОРМАЦИИ (как в старой логике)
     print("🔍 ШАГ 2: Поиск возможностей для трансформации...\n")
 
-    # A. Нужен DOUBLE
-    if target_room in ['dbl', 'double']:
-        print("   Ищем трансформации для DOUBLE:")
-
-        # 1 QUAD -> 2 DOUBLE
-        for i in range(header_row + 1, end_row):
-            raw = normalize(all_rows[i][col_room]) if col_room < len(all_rows[i]) else ""
-            if 'quad' in raw or '4' in raw:
-                if check_rows_are_empty(all_rows, i, 4, col_last):
-                    print(f"   ✅ Найден пустой QUAD в строке {i+1} (1 QUAD -> 2 DOUBLE)")
-                    return i + 1, cols, "trans_1quad_2dbl"
-
-        # 2 TRIPLE -> 3 DOUBLE
-        for i in range(header_row + 1, end_row - 3):
-            raw1 = normalize(all_rows[i][col_room]) if col_room < len(all_rows[i]) else ""
-            if 'trip' in raw1 or 'trpl' in raw1:
-                if i + 3 < end_row:
-                    raw2 = normalize(all_rows[i+3][col_room]) if col_room < len(all_rows[i+3]) else ""
-                    if 'trip' in raw2 or 'trpl' in raw2:
-                        if check_rows_are_empty(all_rows, i, 6, col_last):
-                            print(f"   ✅ Найдены 2 пустых TRIPLE в строках {i+1} и {i+4} (2 TRIPLE -> 3 DOUBLE)")
-                            return i + 1, cols, "trans_2trpl_3dbl"
-
-    # B. Нужен TRIPLE
-    elif target_room in ['trpl', 'triple']:
-        print("   Ищем трансформации для TRIPLE:")
-
-        # 2 QUAD -> 2 TRIPLE + 1 DOUBLE
-        for i in range(header_row + 1, end_row - 4):
-            raw1 = normalize(all_rows[i][col_room]) if col_room < len(all_rows[i]) else ""
-            if 'quad' in raw1 or '4' in raw1:
-                if i + 4 < end_row:
-                    raw2 = normalize(all_rows[i+4][col_room]) if col_room < len(all_rows[i+4]) else ""
-                    if 'quad' in raw2 or '4' in raw2:
-                        if check_rows_are_empty(all_rows, i, 8, col_last):
-                            print(f"   ✅ Найдены 2 пустых QUAD в строках {i+1} и {i+5} (2 QUAD -> 2 TRIPLE + DOUBLE)")
-                            return i + 1, cols, "trans_2quad_mix"
-
-        # 3 DOUBLE -> 2 TRIPLE
-        for i in range(header_row + 1, end_row - 4):
-            raw1 = normalize(all_rows[i][col_room]) if col_room < len(all_rows[i]) else ""
-            if 'dbl' in raw1 or 'doub' in raw1:
-                if i + 2 < end_row:
-                    raw2 = normalize(all_rows[i+2][col_room]) if col_room < len(all_rows[i+2]) else ""
-                    if 'dbl' in raw2 or 'doub' in raw2:
-                        if i + 4 < end_row:
-                            raw3 = normalize(all_rows[i+4][col_room]) if col_room < len(all_rows[i+4]) else ""
-                            if 'dbl' in raw3 or 'doub' in raw3:
-                                if check_rows_are_empty(all_rows, i, 6, col_last):
-                                    print(f"   ✅ Найдены 3 пустых DOUBLE (3 DOUBLE -> 2 TRIPLE)")
-                                    return i + 1, cols, "trans_3dbl_2trpl"
-
-    # C. Нужен QUADRO
-    elif target_room in ['quad', 'quadro']:
-        print("   Ищем трансформации для QUADRO:")
-
-        # 2 DOUBLE -> 1 QUAD
-        for i in range(header_row + 1, end_row - 2):
-            raw1 = normalize(all_rows[i][col_room]) if col_room < len(all_rows[i]) else ""
-            if 'dbl' in raw1 or 'doub' in raw1:
-                if i + 2 < end_row:
-                    raw2 = normalize(all_rows[i+2][col_room]) if col_room < len(all_rows[i+2]) else ""
-                    if 'dbl' in raw2 or 'doub' in raw2:
-                        if check_rows_are_empty(all_rows, i, 4, col_last):
-                            print(f"   ✅ Найдены 2 пустых DOUBLE (2 DOUBLE -> 1 QUAD)")
-                            return i + 1, cols, "trans_2dbl_1quad"
-
-    # D. Нужен SINGLE
-    elif target_room in ['sing', 'single', 'sgl']:
-        print("   Ищем трансформации для SINGLE:")
-
-        # 1 DOUBLE -> 2 SINGLE
-        for i in range(header_row + 1, end_row):
-            raw = normalize(all_rows[i][col_room]) if col_room < len(all_rows[i]) else ""
-            if 'dbl' in raw or 'doub' in raw:
-                if check_rows_are_empty(all_rows, i, 2, col_last):
-                    print(f"   ✅ Найден пустой DOUBLE (1 DOUBLE -> 2 SINGLE)")
-                    return i + 1, cols, "trans_1dbl_2sgl"
-
-        # 1 TRIPLE -> 1 DOUBLE + 1 SINGLE
-        for i in range(header_row + 1, end_row):
-            raw = normalize(all_rows[i][col_room]) if col_room < len(all_rows[i]) else ""
-            if 'trip' in raw or 'trpl' in raw:
-                if check_rows_are_empty(all_rows, i, 3, col_last):
-                    print(f"   ✅ Найден пустой TRIPLE (1 TRIPLE -> 1 DOUBLE + 1 SINGLE)")
-                    return i + 1, cols, "trans_1trpl_mix"
+    transform_key = ROOM_TRANSFORM_ALIASES.get(target_room, target_room)
+    for subs, offsets, count, code, title in ROOM_TRANSFORMS.get(transform_key, []):
+        slot = find_transform_slot(all_rows, header_row, end_row, col_room, col_last, subs, offsets, count, grid)
+        if slot is not None:
+            print(f"   ✅ Найдено: {title}, строка {slot+1}")
+            return slot + 1, cols, code
 
     # 3. ПОИСК ПУСТОЙ КОМНАТЫ
     print("🔍 ШАГ 3: Поиск пустой комнаты...")
@@ -746,8 +689,9 @@ def find_best_slot(all_rows, target_pkg_name, target_gender, target_room_type):
     return None, cols, "no_space"
 
 
-def get_open_rooms_for_manual_selection(all_rows, pkg_name, needed_count=1, needed_type=None, target_gender=None):
-    """Получение списка свободных мест для ручного выбора"""
+def get_open_rooms_for_manual_selection(all_rows, pkg_name, needed_count=1, needed_type=None, target_gender=None,
+                                        grid=None):
+    """Получение списка свободных мест для ручного выбора (grid — векторный движок scan_engine)"""
     print(f"\n{'='*60}")
     print(f"🔍 GET_OPEN_ROOMS вызван:")
     print(f"   Пакет: '{pkg_name}'")
@@ -756,7 +700,7 @@ def get_open_rooms_for_manual_selection(all_rows, pkg_name, needed_count=1, need
     print(f"   Пол: '{target_gender}'")
     print(f"{'='*60}\n")
 
-    header_row, end_row, cols = get_package_block(all_rows, pkg_name)
+    header_row, end_row, cols = get_package_block(all_rows, pkg_name, grid)
     if not header_row:
         print(f"❌ Пакетный блок не найден!")
         return []
@@ -775,31 +719,47 @@ def get_open_rooms_for_manual_selection(all_rows, pkg_name, needed_count=1, need
 
     rooms_list = []
     target_type_norm = normalize_room_value(needed_type) if needed_type else None
-    target_gender_norm = normalize(target_gender).upper() if target_gender else None
+    target_gender_norm = gender_code(target_gender) if target_gender else None
     accepted_types = None
     if target_type_norm:
         accepted_types = ROOM_FALLBACKS.get(target_type_norm, [target_type_norm])
     print(f"🎯 Ищем тип: '{target_type_norm}', допускаем: {accepted_types or 'все'}, пол: '{target_gender_norm}'\n")
 
+    if grid is not None:
+        # Колонки блока уже нормализованы и разобраны векторно
+        room_col = grid.column(col_room)
+        kinds = grid.room_kinds(col_room)
+        sizes = grid.room_sizes(col_room)
+        occupied_rows = grid.occupied(col_last, col_first)
+
     i = header_row + 1
     rooms_checked = 0
 
     while i < end_row and rooms_checked < 100:
         row = all_rows[i]
-        raw_room = normalize(row[col_room]) if col_room < len(row) else ""
+        if grid is not None:
+            raw_room = str(room_col[i])
+        else:
+            raw_room = normalize(row[col_room]) if col_room < len(row) else ""
 
         if not raw_room:
             i += 1
             continue
 
-        room_type = _norm_room_kind(raw_room, None)
-        size = get_room_size(raw_room)
+        if grid is not None:
+            room_type = room_kind_name(kinds[i]) or None
+            size = int(sizes[i])
+        else:
+            room_type = _norm_room_kind(raw_room, None)
+            size = get_room_size(raw_room)
         rooms_checked += 1
 
-        print(f"📍 Строка {i+1}: тип='{room_type}', размер={size}, raw='{raw_room}'")
+        if SHEETS_DEBUG:
+            print(f"📍 Строка {i+1}: тип='{room_type}', размер={size}, raw='{raw_room}'")
 
         if accepted_types and room_type not in accepted_types:
-            print(f"   ⏭️  Пропускаем (не подходит по типу)")
+            if SHEETS_DEBUG:
+                print(f"   ⏭️  Пропускаем (не подходит по типу)")
             i += size
             continue
 
@@ -814,7 +774,10 @@ def get_open_rooms_for_manual_selection(all_rows, pkg_name, needed_count=1, need
                 break
 
             c_row = all_rows[curr_idx]
-            occupied = is_row_occupied(c_row, col_last, col_first)
+            if grid is not None:
+                occupied = bool(occupied_rows[curr_idx])
+            else:
+                occupied = is_row_occupied(c_row, col_last, col_first)
             name_val = c_row[col_last] if col_last < len(c_row) else ""
             gen = c_row[col_gender] if col_gender and col_gender < len(c_row) else ""
 
@@ -822,7 +785,7 @@ def get_open_rooms_for_manual_selection(all_rows, pkg_name, needed_count=1, need
                 guest_name = name_val.split()[0] if name_val else "Турист"
                 guests.append(guest_name)
                 if gen:
-                    genders.add(normalize(gen).upper())
+                    genders.add(gender_code(gen))
             else:
                 free_count += 1
                 if first_free_offset == -1:
@@ -830,7 +793,8 @@ def get_open_rooms_for_manual_selection(all_rows, pkg_name, needed_count=1, need
 
         is_partially_occupied = len(guests) > 0
         is_completely_empty = (len(guests) == 0 and free_count > 0)
-        print(f"   Результат: guests={len(guests)}, free={free_count}, partially_occupied={is_partially_occupied}, completely_empty={is_completely_empty}")
+        if SHEETS_DEBUG:
+            print(f"   Результат: guests={len(guests)}, free={free_count}, partially_occupied={is_partially_occupied}, completely_empty={is_completely_empty}")
 
         # Добавляем комнату если есть достаточно свободных мест
         # Для полностью пустой комнаты first_free_offset будет 0 (первая строка комнаты)
@@ -849,7 +813,8 @@ def get_open_rooms_for_manual_selection(all_rows, pkg_name, needed_count=1, need
                     gender_ok = False
 
             if not gender_ok:
-                print("   ⏭️  Пропускаем (не подходит по полу)")
+                if SHEETS_DEBUG:
+                    print("   ⏭️  Пропускаем (не подходит по полу)")
                 i += size
                 continue
 
@@ -870,10 +835,52 @@ def get_open_rooms_for_manual_selection(all_rows, pkg_name, needed_count=1, need
                 'last_guest': last_guest,
                 'label': room_label,
             }
-            print(f"   ✅ ДОБАВЛЯЕМ комнату: {room_info}")
+            if SHEETS_DEBUG:
+                print(f"   ✅ ДОБАВЛЯЕМ комнату: {room_info}")
             rooms_list.append(room_info)
 
         i += size
 
     print(f"\n   ИТОГО найдено комнат: {len(rooms_list)}")
     return rooms_list
+
+
+def get_open_rooms_from_snapshot(snapshot, pkg_name, needed_count=1, needed_type=None, target_gender=None):
+    """
+    То же, что get_open_rooms_for_manual_selection, но результат кэшируется в
+    снимке листа (sheet_cache.SheetSnapshot) и переносится в следующий снимок,
+    если строки до конца блока пакета не изменились.
+    """
+    rows = snapshot.values  # только чтение, копия не нужна
+
+    def compute():
+        # Grid листа строится один раз на снимок и общий для всех пакетов
+        grid = snapshot.memo(("scan_grid",), lambda: (grid_for(rows), None))
+        _, end_row, _ = get_package_block(rows, pkg_name, grid)
+        rooms = get_open_rooms_for_manual_selection(rows, pkg_name, needed_count, needed_type, target_gender, grid)
+        # Конец блока определяется по 3 пустым строкам после него
+        stop = min(end_row + 3, len(rows)) if end_row is not None else None
+        return rooms, stop
+
+    key = ("open_rooms", pkg_name, needed_count, needed_type, target_gender)
+    return [dict(room) for room in snapshot.memo(key, compute)]
+
+
+def get_package_names(all_rows, pkg_name):
+    """
+    ФИО [(фамилия, имя), ...], уже вписанные в блок пакета (в том числе
+    руками, без брони в БД) — для проверки дублей при записи группы.
+    """
+    header_row, end_row, cols = get_package_block(all_rows, pkg_name)
+    if not header_row or cols.get("last_name") is None:
+        return []
+    col_last, col_first = cols.get("last_name"), cols.get("first_name")
+    names = []
+    for r in range(header_row + 1, min(end_row, len(all_rows))):
+        row = all_rows[r]
+        if not is_row_occupied(row, col_last, col_first):
+            continue
+        last = str(row[col_last]).strip() if col_last < len(row) else ""
+        first = str(row[col_first]).strip() if col_first is not None and col_first < len(row) else ""
+        names.append((last, first))
+    return names
@@ -1,16 +1,31 @@
+import os
+import time
 import logging
 from gspread.exceptions import WorksheetNotFound
 from bull_project.bull_bot.config.settings import get_google_client
+from bull_project.bull_bot.core.google_sheets.sheet_cache import (
+    sheet_snapshots,
+    fetch_drive_version,
+    SNAPSHOT_TTL,
+)
+from bull_project.bull_bot.core.cache_backend import cache_key, get_cache, get_or_compute
 
 logger = logging.getLogger(__name__)
 
-# Простой кэш для списка таблиц, чтобы не ждать 3 секунды при каждом клике
-# Он сбросится при перезапуске бота
-_tables_cache = None
+# Кэши лежат в общем бэкенде (core/cache_backend.py), чтобы несколько
+# воркеров API не ходили в Google каждый сам:
+#   tables                    -> {название: id} — список таблиц (openall, 1-3 сек)
+#   packages:<id>:<лист>      -> {"version", "ts", "packages": [[строка, пакет], ...]}
+TABLES_TTL = int(os.getenv("SHEETS_TABLES_TTL", "3600"))
+# Запись пакетов живет дольше версии: актуальность проверяется по версии файла
+PACKAGES_TTL = 24 * 3600
 
-def get_accessible_tables(use_cache=True) -> dict:
 
-    global _tables_cache
+def _packages_key(spreadsheet_id: str, sheet_name: str) -> str:
+    return cache_key("sheets", "packages", spreadsheet_id, (sheet_name or "").strip().lower())
+
+
+def get_accessible_tables(use_cache=True) -> dict:
 
     # Импортируем константы
     from bull_project.bull_bot.config.constants import (
@@ -23,19 +38,18 @@ def get_accessible_tables(use_cache=True) -> dict:
             logger.error("❌ USE_TEST_TABLE=true, но TEST_SPREADSHEET_ID пуст!")
             return {}
 
-        # Кэшируем тестовую таблицу
-        if use_cache and _tables_cache:
-            return _tables_cache
-
         result = {TEST_SPREADSHEET_NAME: TEST_SPREADSHEET_ID}
-        _tables_cache = result
-        logger.info(f"🧪 Используется тестовая таблица: {TEST_SPREADSHEET_NAME}")
+        logger.debug(f"🧪 Используется тестовая таблица: {TEST_SPREADSHEET_NAME}")
         return result
 
     # 📊 PRODUCTION РЕЖИМ: возвращаем все таблицы
-    if use_cache and _tables_cache:
-        return _tables_cache
+    key = cache_key("sheets", "tables")
+    if not use_cache:
+        get_cache().delete(key)
+    return get_or_compute(key, TABLES_TTL, _load_accessible_tables)
+
 
+def _load_accessible_tables() -> dict:
     client = get_google_client()
     if not client:
         return {}
@@ -50,8 +64,6 @@ def get_accessible_tables(use_cache=True) -> dict:
             # if "2025" in ss.title:
             result[ss.title] = ss.id
 
-        # Сохраняем в память
-        _tables_cache = result
         logger.info(f"📊 Загружено {len(result)} production таблиц")
         return result
     except Exception as e:
@@ -78,25 +90,66 @@ def get_packages_from_sheet(spreadsheet_id: str, sheet_name: str) -> dict:
     """
     Скачивает содержимое (пакеты) ТОЛЬКО когда пользователь выбрал лист.
     Оптимизация: скачиваем только колонки A и B (диапазон A1:B200).
+    Результат кэшируется и ревалидируется по версии файла в Drive.
     """
     client = get_google_client()
     if not client: return {}
 
+    key = _packages_key(spreadsheet_id, sheet_name)
+    version = sheet_snapshots.file_version(spreadsheet_id, lambda fid: fetch_drive_version(client, fid))
+    cached = get_cache().get(key)
+    if cached:
+        if (version is not None and cached["version"] == version) or \
+                (version is None and time.time() - cached["ts"] < SNAPSHOT_TTL):
+            return {int(row): name for row, name in cached["packages"]}
+
     try:
         ss = client.open_by_key(spreadsheet_id)
         ws = _get_worksheet_by_title(ss, sheet_name)
 
         # ОПТИМИЗАЦИЯ: Расширили до D чтобы видеть "Type of room"
         data = ws.get('A1:D200')
+        packages = _parse_packages(data)
+        get_cache().set(
+            key,
+            {"version": version, "ts": time.time(), "packages": list(packages.items())},
+            ttl=PACKAGES_TTL,
+        )
+        return dict(packages)
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка поиска пакетов: {e}")
+        return {}
+
+def _parse_packages(data) -> dict:
+    """Находит названия пакетов в диапазоне A1:D200 листа"""
+    packages = {}
+
+    # СПОСОБ 1 (ПРИОРИТЕТ): Старая логика - поиск по ключевым словам
+    package_keywords = [
+        "niyet", "hikma", "izi", "4u", "premium", "econom",
+        "стандарт", "эконом", "comfort",
+        "ramadan", "рамадан", "ramazan", "ramad"
+    ]
+
+    for idx, row in enumerate(data, start=1):
+        if not row:
+            continue
+
+        text_full = " ".join([str(x) for x in row]).lower()
 
-        packages = {}
+        if any(k in text_full for k in package_keywords):
+            raw_name = row[0] if row and row[0] else (row[1] if len(row) > 1 else "Unknown")
+            clean_name = str(raw_name).strip().replace("\n", " ")
+            if len(clean_name) > 3:
+                packages[idx] = clean_name
 
-        # СПОСОБ 1 (ПРИОРИТЕТ): Старая логика - поиск по ключевым словам
-        package_keywords = [
-            "niyet", "hikma", "izi", "4u", "premium", "econom",
-            "стандарт", "эконом", "comfort",
-            "ramadan", "рамадан", "ramazan", "ramad"
-        ]
+    # СПОСОБ 2 (ФОЛЛБЭК): Если ничего не нашли - ищем по заголовкам
+    if not packages:
+        import re
+        header_keywords = ["№", "avia", "visa", "type of room", "тип комнаты"]
+        # Паттерн даты: dd.mm или d.mm или dd.m
+        date_pattern = re.compile(r'^\d{1,2}\.\d{1,2}')
 
         for idx, row in enumerate(data, start=1):
             if not row:
@@ -104,60 +157,64 @@ def get_packages_from_sheet(spreadsheet_id: str, sheet_name: str) -> dict:
 
             text_full = " ".join([str(x) for x in row]).lower()
 
-            if any(k in text_full for k in package_keywords):
-                raw_name = row[0] if row and row[0] else (row[1] if len(row) > 1 else "Unknown")
-                clean_name = str(raw_name).strip().replace("\n", " ")
-                if len(clean_name) > 3:
-                    packages[idx] = clean_name
-
-        # СПОСОБ 2 (ФОЛЛБЭК): Если ничего не нашли - ищем по заголовкам
-        if not packages:
-            import re
-            header_keywords = ["№", "avia", "visa", "type of room", "тип комнаты"]
-            # Паттерн даты: dd.mm или d.mm или dd.m
-            date_pattern = re.compile(r'^\d{1,2}\.\d{1,2}')
-
-            for idx, row in enumerate(data, start=1):
-                if not row:
-                    continue
-
-                text_full = " ".join([str(x) for x in row]).lower()
-
-                # Если нашли строку с заголовками
-                if any(k in text_full for k in header_keywords):
-                    # Ищем название пакета выше (1-3 строки)
-                    for offset in range(1, 4):
-                        if idx - offset < 1:
+            # Если нашли строку с заголовками
+            if any(k in text_full for k in header_keywords):
+                # Ищем название пакета выше (1-3 строки)
+                for offset in range(1, 4):
+                    if idx - offset < 1:
+                        break
+                    prev_row = data[idx - offset - 1]
+                    if prev_row and prev_row[0]:
+                        raw_name = str(prev_row[0]).strip()
+                        # Проверяем что название начинается с даты
+                        if date_pattern.match(raw_name):
+                            clean_name = raw_name.replace("\n", " ")
+                            packages[idx] = clean_name
                             break
-                        prev_row = data[idx - offset - 1]
-                        if prev_row and prev_row[0]:
-                            raw_name = str(prev_row[0]).strip()
-                            # Проверяем что название начинается с даты
-                            if date_pattern.match(raw_name):
-                                clean_name = raw_name.replace("\n", " ")
-                                packages[idx] = clean_name
-                                break
 
-        return packages
+    return packages
 
-    except Exception as e:
-        logger.error(f"❌ Ошибка поиска пакетов: {e}")
-        return {}
-
-def get_sheet_data(sheet_id: str, sheet_name: str):
+def get_sheet_snapshot(sheet_id: str, sheet_name: str, force: bool = False):
     """
-    Полное скачивание (используется только при записи/Тетрисе).
-    Здесь уже придется подождать, но это происходит в фоне.
+    Снимок листа (SheetSnapshot) с ревалидацией по версии файла.
+    Полное скачивание происходит только если лист изменился с прошлого раза.
     """
     client = get_google_client()
-    if not client: return []
+    if not client: return None
+
+    version = sheet_snapshots.file_version(
+        sheet_id, lambda fid: fetch_drive_version(client, fid), force=force
+    )
+    if not force:
+        snap = sheet_snapshots.get(sheet_id, sheet_name, version)
+        if snap is not None:
+            return snap
+
     try:
         ss = client.open_by_key(sheet_id)
         ws = _get_worksheet_by_title(ss, sheet_name)
-        return ws.get_all_values()
+        values = ws.get_all_values()
+        logger.info(f"⬇️ Лист '{sheet_name}' скачан заново ({len(values)} строк, версия {version})")
+        return sheet_snapshots.put(sheet_id, sheet_name, values, version)
     except Exception as e:
         logger.error(f"❌ Ошибка скачивания данных: {e}")
-        return []
+        return None
+
+def get_sheet_data(sheet_id: str, sheet_name: str):
+    """
+    Полное содержимое листа (используется при записи/Тетрисе).
+    Берётся из снимка, если лист не менялся; возвращается изменяемая копия.
+    """
+    snap = get_sheet_snapshot(sheet_id, sheet_name)
+    return snap.rows() if snap else []
+
+def invalidate_sheet_cache(sheet_id: str, sheet_name: str = None):
+    """Сбрасывает кэши листа после записи в него."""
+    sheet_snapshots.invalidate(sheet_id, sheet_name)
+    if sheet_name is None:
+        get_cache().delete_prefix(cache_key("sheets", "packages", sheet_id) + ":")
+    else:
+        get_cache().delete(_packages_key(sheet_id, sheet_name))
 
 def _get_worksheet_by_title(spreadsheet, sheet_name: str):
     """
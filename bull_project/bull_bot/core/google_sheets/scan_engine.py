@@ -0,0 +1,258 @@
+"""
+scan_engine.py - Векторизованный просмотр листа (NumPy) для больших таблиц.
+
+Сводные листы сезона содержат тысячи строк, и построчные циклы allocator
+(normalize() на каждую ячейку, проверка занятости строка за строкой) заметно
+грузят CPU API. Здесь лист один раз загружается в дополненный (padded)
+массив NumPy, а нужные колонки нормализуются целиком:
+
+  * маски пустоты/занятости строк;
+  * коды типов комнат (как _norm_room_kind) и коды пола;
+  * «N пустых строк подряд, начиная с границы комнаты» — через cumsum.
+
+NumPy — необязательная зависимость: если его нет (или лист маленький),
+grid_for() возвращает None и allocator работает по-старому.
+"""
+import os
+from typing import Dict, Optional, Sequence, Tuple
+
+from bull_project.bull_bot.core.utils.text_utils import ROOM_KIND_RULES, ROOM_SIZE_RULES
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy не установлен
+    np = None
+
+# auto — NumPy для листов от SHEET_SCAN_MIN_ROWS строк; numpy — всегда; python — никогда
+SCAN_ENGINE = os.getenv("SHEET_SCAN_ENGINE", "auto").strip().lower()
+SCAN_MIN_ROWS = int(os.getenv("SHEET_SCAN_MIN_ROWS", "500"))
+
+# Коды типов комнат: индекс в ROOM_KINDS (правила общие с text_utils.room_kind)
+ROOM_KINDS = ("",) + tuple(kind for kind, _ in ROOM_KIND_RULES)
+
+GENDER_NONE, GENDER_M, GENDER_F, GENDER_OTHER = 0, 1, 2, 3
+
+
+def numpy_available() -> bool:
+    return np is not None
+
+
+def grid_for(all_rows: Sequence[Sequence[str]], force: bool = False) -> Optional["SheetGrid"]:
+    """SheetGrid для листа или None, если векторный движок выключен/не нужен."""
+    if np is None or SCAN_ENGINE == "python":
+        return None
+    if not force and SCAN_ENGINE != "numpy" and len(all_rows) < SCAN_MIN_ROWS:
+        return None
+    return SheetGrid(all_rows)
+
+
+def _normalize(arr):
+    """Векторный аналог allocator.normalize: \\n/\\r -> пробел, strip, lower."""
+    arr = np.char.replace(np.char.replace(arr, "\n", " "), "\r", " ")
+    return np.char.lower(np.char.strip(arr))
+
+
+def _first(mask, offset: int = 0) -> Optional[int]:
+    hits = np.flatnonzero(mask)
+    return int(hits[0]) + offset if hits.size else None
+
+
+class SheetGrid:
+    """
+    Лист в виде массива NumPy (n строк x width колонок, object, дополнен "").
+    Нормализованные колонки и маски считаются лениво и кэшируются, поэтому
+    повторные запросы к тому же листу не трогают Python-строки.
+
+    Grid — снимок на момент построения: если allocator помечает места
+    (RESERVED) в all_rows, grid нужно построить заново.
+    """
+
+    def __init__(self, all_rows: Sequence[Sequence[str]]):
+        self.n = len(all_rows)
+        self.width = max((len(r) for r in all_rows), default=0)
+        cells = np.empty((self.n, self.width), dtype=object)
+        cells.fill("")
+        for i, row in enumerate(all_rows):
+            if row:
+                cells[i, :len(row)] = row
+        self.cells = cells
+        self._cache: Dict[Tuple, "np.ndarray"] = {}
+
+    def _cached(self, key, compute):
+        arr = self._cache.get(key)
+        if arr is None:
+            arr = self._cache[key] = compute()
+        return arr
+
+    # ---------- колонки ----------
+
+    def raw_column(self, idx: int):
+        """Колонка как unicode-массив (без нормализации)."""
+        def compute():
+            if idx is None or idx >= self.width:
+                return np.full(self.n, "", dtype=str)
+            return self.cells[:, idx].astype(str)
+        return self._cached(("raw", idx), compute)
+
+    def column(self, idx: int):
+        """Нормализованная колонка (как normalize() для каждой ячейки)."""
+        return self._cached(("norm", idx), lambda: _normalize(self.raw_column(idx)))
+
+    def contains(self, idx: int, subs: Sequence[str]):
+        """Маска: нормализованная ячейка содержит любую из подстрок."""
+        def compute():
+            col = self.column(idx)
+            mask = np.zeros(self.n, dtype=bool)
+            for s in subs:
+                mask |= np.char.find(col, s) >= 0
+            return mask
+        return self._cached(("contains", idx, tuple(subs)), compute)
+
+    # ---------- маски строк ----------
+
+    def filled(self, idx: int):
+        """Маска непустых ячеек колонки."""
+        return self._cached(("filled", idx), lambda: np.char.str_len(self.column(idx)) > 0)
+
+    def occupied(self, col_last: int, col_first: Optional[int] = None):
+        """Как is_row_occupied: заполнена фамилия (или имя)."""
+        def compute():
+            mask = self.filled(col_last).copy()
+            if col_first:
+                mask |= self.filled(col_first)
+            return mask
+        return self._cached(("occupied", col_last, col_first or None), compute)
+
+    def empty_runs(self, col_last: int, count: int):
+        """
+        Маска starts: starts[i] == True, если строки i..i+count-1 существуют
+        и все свободны (как check_rows_are_empty).
+        """
+        def compute():
+            occ = self.occupied(col_last).astype(np.int32)
+            csum = np.concatenate(([0], np.cumsum(occ)))
+            starts = np.zeros(self.n, dtype=bool)
+            m = self.n - count + 1
+            if m > 0:
+                starts[:m] = (csum[count:count + m] - csum[:m]) == 0
+            return starts
+        return self._cached(("empty_runs", col_last, count), compute)
+
+    def room_kinds(self, col_room: int):
+        """Коды типов комнат (индексы в ROOM_KINDS, 0 — пусто/не распознано)."""
+        def compute():
+            codes = np.zeros(self.n, dtype=np.int8)
+            # Идём с конца, чтобы первое правило (quad) имело приоритет
+            for code in range(len(ROOM_KIND_RULES), 0, -1):
+                codes[self.contains(col_room, ROOM_KIND_RULES[code - 1][1])] = code
+            return codes
+        return self._cached(("kinds", col_room), compute)
+
+    def room_sizes(self, col_room: int):
+        """Размеры комнат (как get_room_size)."""
+        def compute():
+            sizes = np.ones(self.n, dtype=np.int8)
+            for size, subs in reversed(ROOM_SIZE_RULES):
+                sizes[self.contains(col_room, subs)] = size
+            return sizes
+        return self._cached(("sizes", col_room), compute)
+
+    def genders(self, col_gender: Optional[int]):
+        """Коды пола: GENDER_M / GENDER_F / GENDER_OTHER / GENDER_NONE."""
+        def compute():
+            codes = np.zeros(self.n, dtype=np.int8)
+            if col_gender is None:
+                return codes
+            col = np.char.upper(self.column(col_gender))
+            codes[np.char.str_len(col) > 0] = GENDER_OTHER
+            codes[col == "M"] = GENDER_M
+            codes[col == "F"] = GENDER_F
+            return codes
+        return self._cached(("genders", col_gender), compute)
+
+    # ---------- запросы ----------
+
+    def first_room_run(self, start: int, stop: int, end_row: int, col_room: int, col_last: int,
+                       subs: Sequence[str], offsets: Sequence[int], count: int) -> Optional[int]:
+        """
+        Первая строка i из [start, stop), где на границе комнаты i (и на
+        i+offset для каждого offset, если это внутри блока) стоит комната с
+        одной из подстрок subs, а count строк подряд с i свободны.
+        """
+        start, stop = max(start, 0), min(stop, self.n)
+        if start >= stop:
+            return None
+        kind = self.contains(col_room, subs)
+        idx = np.arange(start, stop)
+        mask = kind[start:stop] & self.empty_runs(col_last, count)[start:stop]
+        for off in offsets:
+            target = idx + off
+            inside = target < min(end_row, self.n)
+            shifted = np.zeros(stop - start, dtype=bool)
+            shifted[inside] = kind[target[inside]]
+            mask &= shifted
+        return _first(mask, start)
+
+    def row_text(self, ncols: int = 10):
+        """normalize(" ".join(row[:ncols])) для всех строк."""
+        def compute():
+            if self.width == 0:
+                return np.full(self.n, "", dtype=str)
+            text = self.raw_column(0)
+            for c in range(1, min(ncols, self.width)):
+                text = np.char.add(np.char.add(text, " "), self.raw_column(c))
+            return _normalize(text)
+        return self._cached(("row_text", ncols), compute)
+
+    def find_package_row(self, target: str) -> Optional[int]:
+        """Векторный find_package_row (target уже нормализован)."""
+        text = self.row_text(10)
+        found = _first(np.char.find(text, target) >= 0)
+        if found is not None:
+            return found
+        parts = target.split()
+        if len(parts) > 1:
+            # Проверка цифр — только для немногих строк-кандидатов
+            for i in np.flatnonzero(np.char.find(text, parts[-1]) >= 0):
+                if any(ch.isdigit() for ch in text[i]):
+                    return int(i)
+        return None
+
+    def block_end(self, header_row: int) -> int:
+        """
+        Конец блока пакета (как цикл в get_package_block): 3 «пустые» строки
+        подряд или строка, похожая на название следующего пакета.
+        """
+        def compute_short_and_title():
+            joined = np.full(self.n, "", dtype=str)
+            for c in range(self.width):
+                joined = np.char.add(joined, np.char.strip(self.raw_column(c)))
+            short = np.char.str_len(joined) < 2
+            norm = _normalize(joined)
+            title = (np.char.find(norm, "days") >= 0) | (
+                (np.char.find(norm, "-") >= 0)
+                & (np.char.find(norm, "202") >= 0)
+                & (np.char.str_len(norm) < 50)
+            )
+            return np.stack([short, title & ~short])
+
+        short, title = self._cached(("block_masks",), compute_short_and_title)
+        lo = header_row + 1
+        if lo >= self.n:
+            return self.n
+
+        title_at = _first(title[lo:], lo)
+        run_at = None
+        if self.n - lo >= 3:
+            runs = short[lo:-2] & short[lo + 1:-1] & short[lo + 2:]
+            run_at = _first(runs, lo)
+
+        # Побеждает то, что встретилось раньше при построчном проходе
+        if run_at is not None and (title_at is None or run_at + 2 < title_at):
+            return run_at
+        return title_at if title_at is not None else self.n
+
+
+def room_kind_name(code: int) -> str:
+    return ROOM_KINDS[int(code)]
+
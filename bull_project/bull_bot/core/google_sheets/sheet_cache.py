@@ -0,0 +1,179 @@
+"""
+sheet_cache.py - Снимки листов Google Sheets с проверкой изменений.
+
+Вместо полного скачивания листа на каждый запрос храним снимок (значения +
+версия файла из Drive). Перед использованием снимок «ревалидируется» дешёвым
+запросом версии файла (Drive `version`/`modifiedTime`, несколько сотен байт).
+Если версия не изменилась — отдаём снимок из памяти, иначе скачиваем лист
+заново.
+
+Поверх снимка кэшируются результаты разбора (блоки пакетов, свободные
+комнаты). При новом скачивании такие результаты переносятся в новый снимок,
+если строки, от которых они зависят, не изменились (сравнение хэшей строк),
+так что пересчитываются только изменённые блоки.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Сколько живёт снимок, если версию файла узнать не удалось (Drive недоступен)
+SNAPSHOT_TTL = int(os.getenv("SHEET_SNAPSHOT_TTL", "60"))
+# Как часто (сек) спрашивать у Drive версию одного и того же файла
+REVALIDATE_INTERVAL = float(os.getenv("SHEET_REVALIDATE_INTERVAL", "3"))
+# Сколько снимков держать в памяти (самые старые вытесняются)
+MAX_SNAPSHOTS = int(os.getenv("SHEET_SNAPSHOTS_MAX", "64"))
+
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+
+
+class SheetSnapshot:
+    """Неизменяемый снимок значений листа + кэш результатов разбора."""
+
+    __slots__ = ("values", "version", "fetched_at", "row_hashes", "_memo", "_lock")
+
+    def __init__(self, values: List[List[str]], version: Optional[str]):
+        self.values: Tuple[Tuple[str, ...], ...] = tuple(tuple(r) for r in values)
+        self.version = version
+        self.fetched_at = time.time()
+        self.row_hashes = [hash(r) for r in self.values]
+        # key -> (значение, stop): значение зависит от строк [0, stop); stop=None -> от всего листа
+        self._memo: Dict[Any, Tuple[Any, Optional[int]]] = {}
+        self._lock = threading.Lock()
+
+    def rows(self) -> List[List[str]]:
+        """Изменяемая копия строк (allocator помечает места как RESERVED прямо в списке)."""
+        return [list(r) for r in self.values]
+
+    def same_rows(self, other: "SheetSnapshot", stop: Optional[int]) -> bool:
+        """Совпадают ли строки [0, stop) в двух снимках."""
+        if stop is None:
+            return self.row_hashes == other.row_hashes
+        if len(self.row_hashes) < stop or len(other.row_hashes) < stop:
+            return False
+        return self.row_hashes[:stop] == other.row_hashes[:stop]
+
+    def memo(self, key, compute: Callable[[], Tuple[Any, Optional[int]]]):
+        """
+        Кэширует результат разбора в снимке.
+        compute() возвращает (значение, stop) — номер строки, до которой
+        результат зависит от данных листа (None — от всего листа).
+        """
+        with self._lock:
+            hit = self._memo.get(key)
+        if hit is not None:
+            return hit[0]
+        value, stop = compute()
+        with self._lock:
+            self._memo[key] = (value, stop)
+        return value
+
+    def inherit(self, old: "SheetSnapshot"):
+        """Переносит из старого снимка результаты, чьи строки не изменились."""
+        kept = 0
+        with old._lock:
+            items = list(old._memo.items())
+        for key, (value, stop) in items:
+            if self.same_rows(old, stop):
+                self._memo[key] = (value, stop)
+                kept += 1
+        if items:
+            logger.info(f"♻️ Снимок листа: переиспользовано {kept}/{len(items)} разобранных блоков")
+
+
+class SheetSnapshotStore:
+    """Хранилище снимков {(table_id, sheet_name): SheetSnapshot} с ревалидацией."""
+
+    def __init__(self, ttl: int = SNAPSHOT_TTL, revalidate_interval: float = REVALIDATE_INTERVAL,
+                 max_snapshots: int = MAX_SNAPSHOTS):
+        self.ttl = ttl
+        self.revalidate_interval = revalidate_interval
+        self.max_snapshots = max_snapshots
+        self._snapshots: Dict[Tuple[str, str], SheetSnapshot] = {}
+        self._versions: Dict[str, Tuple[float, Optional[str]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(table_id: str, sheet_name: str) -> Tuple[str, str]:
+        return (table_id or "").strip(), (sheet_name or "").strip().lower()
+
+    def file_version(self, table_id: str, fetch_version: Callable[[str], Optional[str]],
+                     force: bool = False) -> Optional[str]:
+        """Версия файла (не чаще раза в revalidate_interval секунд на таблицу).
+
+        None («версию узнать не удалось») кэшируется так же — иначе без
+        доступа к Drive запрос версии уходил бы на каждом чтении листа.
+        """
+        now = time.time()
+        with self._lock:
+            cached = self._versions.get(table_id)
+        if not force and cached is not None and now - cached[0] < self.revalidate_interval:
+            return cached[1]
+        version = fetch_version(table_id)
+        with self._lock:
+            self._versions[table_id] = (now, version)
+        return version
+
+    def get(self, table_id: str, sheet_name: str, version: Optional[str]) -> Optional[SheetSnapshot]:
+        """Снимок, если он актуален для указанной версии файла."""
+        with self._lock:
+            snap = self._snapshots.get(self._key(table_id, sheet_name))
+        if snap is None:
+            return None
+        if version is not None and snap.version is not None:
+            return snap if snap.version == version else None
+        # Версию узнать не удалось — живём по TTL
+        return snap if time.time() - snap.fetched_at < self.ttl else None
+
+    def peek(self, table_id: str, sheet_name: str) -> Optional[SheetSnapshot]:
+        with self._lock:
+            return self._snapshots.get(self._key(table_id, sheet_name))
+
+    def put(self, table_id: str, sheet_name: str, values: List[List[str]],
+            version: Optional[str]) -> SheetSnapshot:
+        snap = SheetSnapshot(values, version)
+        key = self._key(table_id, sheet_name)
+        with self._lock:
+            old = self._snapshots.pop(key, None)
+            self._snapshots[key] = snap
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.pop(next(iter(self._snapshots)))
+        if old is not None:
+            snap.inherit(old)
+        return snap
+
+    def invalidate(self, table_id: str, sheet_name: Optional[str] = None):
+        """Сбрасывает версию таблицы (и снимок листа) после нашей записи."""
+        with self._lock:
+            self._versions.pop(table_id, None)
+            if sheet_name is not None:
+                snap = self._snapshots.get(self._key(table_id, sheet_name))
+                if snap is not None:
+                    # Снимок оставляем для inherit(), но делаем его заведомо устаревшим
+                    snap.version = None
+                    snap.fetched_at = 0.0
+
+
+def fetch_drive_version(client, file_id: str) -> Optional[str]:
+    """
+    Дешёвый запрос метаданных файла в Drive: version растёт при каждом изменении.
+    Возвращает None, если Drive недоступен (тогда работаем по TTL).
+    """
+    try:
+        resp = client.http_client.request(
+            "get",
+            f"{DRIVE_FILES_URL}/{file_id}",
+            params={"fields": "version,modifiedTime", "supportsAllDrives": True},
+        )
+        data = resp.json()
+        return str(data.get("version") or data.get("modifiedTime") or "") or None
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось получить версию файла {file_id}: {e}")
+        return None
+
+
+# Синглтон хранилища снимков
+sheet_snapshots = SheetSnapshotStore()
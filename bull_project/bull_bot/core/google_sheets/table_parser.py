@@ -1,16 +1,21 @@
 """
 table_parser.py - Парсинг структуры таблиц бронирования
 """
-from typing import List, Dict, Tuple, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Tuple, Optional, Sequence
+from dataclasses import dataclass, field
 import re
 import logging
 
+from bull_project.bull_bot.core.parsers.header_detector import SHEET_HEADERS
+
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class TableRow:
-    """Строка таблицы"""
+    """
+    Строка таблицы (компактная: __slots__, без копии исходной строки —
+    исходные данные доступны через sheet_data[row_index])
+    """
     row_index: int  # Индекс строки (0-based в данных Google Sheets)
     type_of_room: Optional[str]  # QUADRO/TRIPLE/DOUBLE/SINGLE/INF/CHILD
     last_name: str
@@ -18,9 +23,8 @@ class TableRow:
     gender: str  # M/F/пусто
     is_occupied: bool
     room_capacity: int = 0  # Вместимость комнаты
-    raw_data: List[str] = None  # Оригинальные данные строки
 
-@dataclass
+@dataclass(slots=True)
 class PackageStructure:
     """Структура пакета в таблице"""
     package_name: str
@@ -29,6 +33,12 @@ class PackageStructure:
     rows: List[TableRow]
     available_by_gender: Dict[str, List[int]]  # Свободные места по полу {M: [row1, row2], F: [...]}
     available_by_room: Dict[str, List[int]]  # Свободные места по типу комнаты
+    columns: Dict[str, int] = None  # Индексы колонок из шапки пакета (None -> COLUMN_INDICES)
+    rows_by_index: Dict[int, TableRow] = field(default_factory=dict)  # row_index -> строка
+
+    def row_at(self, row_index: int) -> Optional[TableRow]:
+        """Строка пакета по индексу в листе (O(1))"""
+        return self.rows_by_index.get(row_index)
 
 class TableParser:
     """Парсер для работы с таблицами бронирования Google Sheets"""
@@ -52,6 +62,13 @@ class TableParser:
         "train": 14,        # Train
     }
 
+    # Ключи общего детектора шапки (header_detector) -> ключи COLUMN_INDICES
+    HEADER_KEYS = {
+        "room": "room_type",
+        "doc_num": "doc_number",
+        "doc_exp": "doc_expiry",
+    }
+
     # Вместимость комнат
     ROOM_CAPACITY = {
         "QUADRO": 4,
@@ -72,7 +89,7 @@ class TableParser:
         "CHILD": ["child", "chd", "ребенок", "детский"],
     }
 
-    def parse_sheet_data(self, sheet_data: List[List[str]]) -> List[PackageStructure]:
+    def parse_sheet_data(self, sheet_data: Sequence[Sequence[str]]) -> List[PackageStructure]:
         """
         Парсит весь лист на пакеты
 
@@ -122,7 +139,13 @@ class TableParser:
 
             # Если есть активный пакет, парсим строку таблицы
             if current_package:
-                table_row = self._parse_table_row(row, row_idx, current_room_type)
+                # Строка шапки: запоминаем реальные индексы колонок пакета
+                columns = self._columns_from_header(row)
+                if columns:
+                    current_package.columns = columns
+                    continue
+
+                table_row = self._parse_table_row(row, row_idx, current_room_type, current_package.columns)
                 if table_row:
                     current_package.rows.append(table_row)
                     # Обновляем текущий тип комнаты для наследования
@@ -171,20 +194,33 @@ class TableParser:
                 return cell_str
         return ""
 
+    def _columns_from_header(self, row: List[str]) -> Optional[Dict[str, int]]:
+        """Если строка - шапка таблицы, возвращает индексы колонок (общий кэшируемый детектор)"""
+        cols = SHEET_HEADERS.detect(row)
+        if not cols:
+            return None
+        columns = dict(self.COLUMN_INDICES)
+        for key, idx in cols.items():
+            columns[self.HEADER_KEYS.get(key, key)] = idx
+        return columns
+
     def _parse_table_row(
             self,
-            row: List[str],
+            row: Sequence[str],
             row_idx: int,
-            current_room_type: Optional[str]
+            current_room_type: Optional[str],
+            columns: Optional[Dict[str, int]] = None
     ) -> Optional[TableRow]:
         """Парсит строку таблицы"""
+        columns = columns or self.COLUMN_INDICES
+
         # Минимальная проверка - должна быть хотя бы колонка Last Name
-        if len(row) <= self.COLUMN_INDICES["last_name"]:
+        if len(row) <= columns["last_name"]:
             return None
 
         # Определяем тип комнаты
         room_type = None
-        room_type_idx = self.COLUMN_INDICES["room_type"]
+        room_type_idx = columns["room_type"]
 
         if len(row) > room_type_idx:
             room_type_cell = row[room_type_idx]
@@ -196,9 +232,9 @@ class TableParser:
             room_type = current_room_type
 
         # Получаем данные паломника
-        last_name_idx = self.COLUMN_INDICES["last_name"]
-        first_name_idx = self.COLUMN_INDICES["first_name"]
-        gender_idx = self.COLUMN_INDICES["gender"]
+        last_name_idx = columns["last_name"]
+        first_name_idx = columns["first_name"]
+        gender_idx = columns["gender"]
 
         last_name = ""
         if len(row) > last_name_idx:
@@ -230,7 +266,6 @@ class TableParser:
             gender=gender,
             is_occupied=is_occupied,
             room_capacity=capacity,
-            raw_data=row.copy()
         )
 
         return table_row
@@ -278,6 +313,7 @@ class TableParser:
         # Сбрасываем списки
         package.available_by_gender = {"M": [], "F": []}
         package.available_by_room = {}
+        package.rows_by_index = {row.row_index: row for row in package.rows}
 
         for row in package.rows:
             if not row.is_occupied:
@@ -341,6 +377,8 @@ class SpotFinder:
             logger.error(f"Пакет '{package_name}' не найден")
             return None
 
+        columns = target_package.columns or self.parser.COLUMN_INDICES
+
         # Стратегия 1: Ищем в указанном типе комнаты
         if preferred_room_type:
             normalized_preferred = self.parser._normalize_room_type(preferred_room_type)
@@ -352,7 +390,7 @@ class SpotFinder:
                         row = sheet_data[row_idx]
 
                         # Проверяем гендер в строке
-                        gender_idx = self.parser.COLUMN_INDICES["gender"]
+                        gender_idx = columns["gender"]
                         row_gender = ""
                         if len(row) > gender_idx:
                             row_gender = self.parser._normalize_gender(str(row[gender_idx]))
@@ -360,7 +398,7 @@ class SpotFinder:
                         # Место подходит если гендер совпадает или не указан
                         if not row_gender or row_gender == gender:
                             # Дополнительно проверяем, что фамилия действительно пустая
-                            last_name_idx = self.parser.COLUMN_INDICES["last_name"]
+                            last_name_idx = columns["last_name"]
                             last_name = ""
                             if len(row) > last_name_idx:
                                 last_name = str(row[last_name_idx] or "").strip()
@@ -377,22 +415,19 @@ class SpotFinder:
                 row = sheet_data[row_idx]
 
                 # Проверяем, что место действительно свободно
-                last_name_idx = self.parser.COLUMN_INDICES["last_name"]
+                last_name_idx = columns["last_name"]
                 last_name = ""
                 if len(row) > last_name_idx:
                     last_name = str(row[last_name_idx] or "").strip()
 
                 if not last_name:
                     # Определяем тип комнаты для этой строки
-                    room_type = None
-                    for row_obj in target_package.rows:
-                        if row_obj.row_index == row_idx:
-                            room_type = row_obj.type_of_room
-                            break
+                    row_obj = target_package.row_at(row_idx)
+                    room_type = row_obj.type_of_room if row_obj else None
 
                     if not room_type:
                         # Пытаемся определить из данных строки
-                        room_type_idx = self.parser.COLUMN_INDICES["room_type"]
+                        room_type_idx = columns["room_type"]
                         if len(row) > room_type_idx:
                             room_type_cell = row[room_type_idx]
                             if room_type_cell:
@@ -1,14 +1,58 @@
 import random
 import colorsys
+import threading
+from typing import Dict, NamedTuple, Tuple
 from bull_project.bull_bot.core.google_sheets.client import (
     get_google_client,
     get_worksheet_by_title,
+    get_sheet_data,
+    invalidate_sheet_cache,
 )
 from bull_project.bull_bot.core.google_sheets.allocator import (
     check_has_train_column,
     find_package_row,
-    find_headers_extended
+    get_package_names,
 )
+from bull_project.bull_bot.core.parsers.header_detector import find_header_row
+from bull_project.bull_bot.core.executors import NETWORK, offloaded
+from bull_project.bull_bot.core.availability import notify_package_changed
+from bull_project.bull_bot.database.models import booking_search_name
+
+# Запись в лист = чтение -> выбор строк -> batch_update. Пока одна запись не
+# закончена, вторая в тот же лист ждет, иначе обе выберут одну и ту же строку
+# (раньше это обеспечивал event loop: функции выполнялись целиком без await).
+# Блокировка в пределах процесса.
+_sheet_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_sheet_locks_guard = threading.Lock()
+
+
+def sheet_write_lock(sheet_id: str, sheet_name: str) -> threading.Lock:
+    key = (sheet_id or "", (sheet_name or "").strip().lower())
+    with _sheet_locks_guard:
+        lock = _sheet_locks.get(key)
+        if lock is None:
+            lock = _sheet_locks[key] = threading.Lock()
+        return lock
+
+
+class SheetDuplicate(NamedTuple):
+    """Результат save_group_booking(check_duplicates=True): человек уже вписан в пакет"""
+    last_name: str
+    first_name: str
+
+
+def find_sheet_duplicate(all_values, pkg_name: str, group_data: list):
+    """Первый из группы, кто уже вписан в блок пакета (SheetDuplicate), или None"""
+    taken = {booking_search_name(last, first) for last, first in get_package_names(all_values, pkg_name)}
+    if not taken:
+        return None
+    for person in group_data:
+        last = (person.get('Last Name') or '').strip()
+        first = (person.get('First Name') or '').strip()
+        if booking_search_name(last, first) in taken:
+            return SheetDuplicate(last, first)
+    return None
+
 
 def row_col_to_a1(row, col):
     div = col
@@ -19,7 +63,16 @@ def row_col_to_a1(row, col):
         div = int((div - module) / 26)
     return string + str(row)
 
-async def save_group_booking(group_data: list, common_data: dict, placement_mode: str, specific_row=None, is_share=False):
+# gspread блокирующий — выполняется в сетевом пуле (core/executors.py)
+@offloaded(NETWORK)
+def save_group_booking(group_data: list, common_data: dict, placement_mode: str, specific_row=None, is_share=False,
+                       check_duplicates=False):
+    """
+    Записывает группу в лист, возвращает номера строк ([] — не записано).
+    check_duplicates=True: если кто-то из группы уже вписан в пакет,
+    ничего не пишет и возвращает SheetDuplicate (проверка по тем же
+    данным листа и под той же блокировкой, что и запись).
+    """
     from bull_project.bull_bot.core.google_sheets.allocator import find_best_slot_for_group
 
     client = get_google_client()
@@ -33,93 +86,98 @@ async def save_group_booking(group_data: list, common_data: dict, placement_mode
     target_room = common_data['room_type']
 
     try:
-        ss = client.open_by_key(sheet_id)
-        ws = get_worksheet_by_title(ss, sheet_name)
-        all_values = ws.get_all_values()
-
-        saved_rows = []
-        updates = []
-        cols = None
-        merge_tasks = []
-        color_tasks = []
-        price_tasks = []
-
-        # Пастельный цвет для всей группы (один цвет на всех)
-        seed_base = "".join([
-            common_data.get("package_name", ""),
-            common_data.get("room_type", ""),
-            str(len(group_data))
-        ])
-        rnd = random.Random(seed_base)
-        h = rnd.random()
-        s = 0.35
-        v = 0.95
-        r, g, b = colorsys.hsv_to_rgb(h, s, v)
-        group_color = {"red": r, "green": g, "blue": b}
-
-        # 🔥 ИСПРАВЛЕНИЕ: Используем групповое размещение если паломников больше 1 или режим не specific_row
-        if not specific_row and len(group_data) > 0:
-            # Используем функцию группового размещения
-            saved_rows = find_best_slot_for_group(
-                all_values,
-                target_pkg,
-                group_data,
-                target_room,
-                placement_mode
-            )
-
-            if not saved_rows or len(saved_rows) != len(group_data):
-                print(f"❌ Групповое размещение вернуло неполный список строк")
-                print(f"   Ожидалось: {len(group_data)}, получено: {len(saved_rows)}")
-                return []
-
-            # Получаем колонки для записи данных
-            pkg_row = find_package_row(all_values, target_pkg)
-            if pkg_row is not None:
-                for r in range(pkg_row, min(pkg_row + 15, len(all_values))):
-                    cols = find_headers_extended(all_values[r])
-                    if cols: break
-
-            if not cols:
-                print(f"❌ Не найдены заголовки для пакета {target_pkg}")
+        with sheet_write_lock(sheet_id, sheet_name):
+            ss = client.open_by_key(sheet_id)
+            ws = get_worksheet_by_title(ss, sheet_name)
+            all_values = ws.get_all_values()
+
+            if check_duplicates:
+                duplicate = find_sheet_duplicate(all_values, target_pkg, group_data)
+                if duplicate is not None:
+                    print(f"⚠️ {duplicate.last_name} {duplicate.first_name} уже вписан(а) в пакет {target_pkg}")
+                    return duplicate
+
+            saved_rows = []
+            updates = []
+            cols = None
+            merge_tasks = []
+            color_tasks = []
+            price_tasks = []
+
+            # Пастельный цвет для всей группы (один цвет на всех)
+            seed_base = "".join([
+                common_data.get("package_name", ""),
+                common_data.get("room_type", ""),
+                str(len(group_data))
+            ])
+            rnd = random.Random(seed_base)
+            h = rnd.random()
+            s = 0.35
+            v = 0.95
+            r, g, b = colorsys.hsv_to_rgb(h, s, v)
+            group_color = {"red": r, "green": g, "blue": b}
+
+            # 🔥 ИСПРАВЛЕНИЕ: Используем групповое размещение если паломников больше 1 или режим не specific_row
+            if not specific_row and len(group_data) > 0:
+                # Используем функцию группового размещения
+                saved_rows = find_best_slot_for_group(
+                    all_values,
+                    target_pkg,
+                    group_data,
+                    target_room,
+                    placement_mode
+                )
+
+                if not saved_rows or len(saved_rows) != len(group_data):
+                    print(f"❌ Групповое размещение вернуло неполный список строк")
+                    print(f"   Ожидалось: {len(group_data)}, получено: {len(saved_rows)}")
+                    return []
+
+                # Получаем колонки для записи данных
+                pkg_row = find_package_row(all_values, target_pkg)
+                if pkg_row is not None:
+                    _, cols = find_header_row(all_values, pkg_row, 15)
+
+                if not cols:
+                    print(f"❌ Не найдены заголовки для пакета {target_pkg}")
+                    return []
+
+                # Записываем данные для каждого паломника
+                for i, (person_passport, row_idx) in enumerate(zip(group_data, saved_rows)):
+                    full_data = {**common_data, **person_passport}
+                    _prepare_updates(updates, price_tasks, row_idx, cols, full_data)
+                    # Планируем окраску имени/фамилии ТОЛЬКО для группы (больше 1 человека)
+                    if len(group_data) > 1:
+                        for key in ("last_name", "first_name"):
+                            if key in cols:
+                                a1 = row_col_to_a1(row_idx, cols[key] + 1)
+                                color_tasks.append(a1)
+
+            elif specific_row:
+                # Старая логика для specific_row (ручное размещение)
+                pkg_row = find_package_row(all_values, target_pkg)
+                if pkg_row is not None:
+                    _, cols = find_header_row(all_values, pkg_row, 15)
+                if not cols: return []
+
+                for i, person_passport in enumerate(group_data):
+                    row_idx = specific_row + i
+                    saved_rows.append(row_idx)
+                    full_data = {**common_data, **person_passport}
+                    _prepare_updates(updates, price_tasks, row_idx, cols, full_data)
+                    # Планируем окраску имени/фамилии ТОЛЬКО для группы (больше 1 человека)
+                    if len(group_data) > 1:
+                        for key in ("last_name", "first_name"):
+                            if key in cols:
+                                a1 = row_col_to_a1(row_idx, cols[key] + 1)
+                                color_tasks.append(a1)
+            else:
+                print(f"❌ Пустой список паломников")
                 return []
 
-            # Записываем данные для каждого паломника
-            for i, (person_passport, row_idx) in enumerate(zip(group_data, saved_rows)):
-                full_data = {**common_data, **person_passport}
-                _prepare_updates(updates, price_tasks, row_idx, cols, full_data)
-                # Планируем окраску имени/фамилии ТОЛЬКО для группы (больше 1 человека)
-                if len(group_data) > 1:
-                    for key in ("last_name", "first_name"):
-                        if key in cols:
-                            a1 = row_col_to_a1(row_idx, cols[key] + 1)
-                            color_tasks.append(a1)
-
-        elif specific_row:
-            # Старая логика для specific_row (ручное размещение)
-            pkg_row = find_package_row(all_values, target_pkg)
-            if pkg_row is not None:
-                for r in range(pkg_row, min(pkg_row + 15, len(all_values))):
-                    cols = find_headers_extended(all_values[r])
-                    if cols: break
-            if not cols: return []
-
-            for i, person_passport in enumerate(group_data):
-                row_idx = specific_row + i
-                saved_rows.append(row_idx)
-                full_data = {**common_data, **person_passport}
-                _prepare_updates(updates, price_tasks, row_idx, cols, full_data)
-                # Планируем окраску имени/фамилии ТОЛЬКО для группы (больше 1 человека)
-                if len(group_data) > 1:
-                    for key in ("last_name", "first_name"):
-                        if key in cols:
-                            a1 = row_col_to_a1(row_idx, cols[key] + 1)
-                            color_tasks.append(a1)
-        else:
-            print(f"❌ Пустой список паломников")
-            return []
-
-        if updates: ws.batch_update(updates)
+            if updates: ws.batch_update(updates)
+            invalidate_sheet_cache(sheet_id, sheet_name)
+            notify_package_changed(sheet_id, sheet_name, target_pkg)
         # Применяем окраску имен/фамилий (один цвет на группу)
         for a1 in color_tasks:
             try:
@@ -224,31 +282,37 @@ async def save_booking_smart(booking_data):
     rows = await save_group_booking([passport_data], booking_data, 'separate')
     return rows[0] if rows else False
 
-async def check_train_exists(sheet_id, sheet_name, package_name):
+@offloaded(NETWORK)
+def check_train_exists(sheet_id, sheet_name, package_name):
     client = get_google_client()
     if not client: return False
     try:
-        ss = client.open_by_key(sheet_id); ws = get_worksheet_by_title(ss, sheet_name); all_values = ws.get_all_values()
+        # Только чтение — берём снимок листа (перекачивается лишь при изменениях)
+        all_values = get_sheet_data(sheet_id, sheet_name)
         return check_has_train_column(all_values, package_name)
     except: return False
 
-async def clear_booking_in_sheets(sheet_id, sheet_name, row_number, package_name):
+@offloaded(NETWORK)
+def clear_booking_in_sheets(sheet_id, sheet_name, row_number, package_name):
     client = get_google_client()
     if not client or not row_number: return False
     try:
-        ss = client.open_by_key(sheet_id); ws = get_worksheet_by_title(ss, sheet_name); all_values = ws.get_all_values()
-        pkg_row = find_package_row(all_values, package_name); cols = None
-        if pkg_row is not None:
-            for r in range(pkg_row, min(pkg_row + 30, len(all_values))):
-                cols = find_headers_extended(all_values[r])
-                if cols: break
-        if not cols: return False
-        fields_to_clear = ['last_name', 'first_name', 'gender', 'dob', 'doc_num', 'doc_exp', 'price', 'comment', 'manager', 'train', 'client_phone']
-        updates = []
-        for key in fields_to_clear:
-            if key in cols: updates.append({'range': f"{row_col_to_a1(row_number, cols[key] + 1)}", 'values': [['']]})
-        if updates: ws.batch_update(updates); return True
-        return False
+        with sheet_write_lock(sheet_id, sheet_name):
+            ss = client.open_by_key(sheet_id); ws = get_worksheet_by_title(ss, sheet_name); all_values = ws.get_all_values()
+            pkg_row = find_package_row(all_values, package_name); cols = None
+            if pkg_row is not None:
+                _, cols = find_header_row(all_values, pkg_row, 30)
+            if not cols: return False
+            fields_to_clear = ['last_name', 'first_name', 'gender', 'dob', 'doc_num', 'doc_exp', 'price', 'comment', 'manager', 'train', 'client_phone']
+            updates = []
+            for key in fields_to_clear:
+                if key in cols: updates.append({'range': f"{row_col_to_a1(row_number, cols[key] + 1)}", 'values': [['']]})
+            if updates:
+                ws.batch_update(updates)
+                invalidate_sheet_cache(sheet_id, sheet_name)
+                notify_package_changed(sheet_id, sheet_name, package_name)
+                return True
+            return False
     except: return False
 
 def find_last_content_row(all_values):
@@ -259,7 +323,8 @@ def find_last_content_row(all_values):
             return r + 1  # +1 потому что индексы с 0
     return len(all_values)
 
-async def write_cancelled_booking_red(sheet_id, sheet_name, package_name, guest_name):
+@offloaded(NETWORK)
+def write_cancelled_booking_red(sheet_id, sheet_name, package_name, guest_name):
     from bull_project.bull_bot.core.google_sheets.allocator import get_package_block
     client = get_google_client()
     if not client:
@@ -267,53 +332,56 @@ async def write_cancelled_booking_red(sheet_id, sheet_name, package_name, guest_
         return False
 
     try:
-        ss = client.open_by_key(sheet_id)
-        ws = get_worksheet_by_title(ss, sheet_name)
-        all_values = ws.get_all_values()
-
-        # Находим блок пакета (нужно для получения колонки)
-        _, _, cols = get_package_block(all_values, package_name)
-        if not cols:
-            print(f"❌ Не найден блок пакета {package_name}")
-            return False
-
-        # 🔥 НАХОДИМ ПОСЛЕДНЮЮ СТРОКУ НА ВСЕМ ЛИСТЕ
-        last_row = find_last_content_row(all_values)
-        # Отступаем 15 строк от конца ВСЕГО листа
-        cancelled_row = last_row + 15
+        with sheet_write_lock(sheet_id, sheet_name):
+            ss = client.open_by_key(sheet_id)
+            ws = get_worksheet_by_title(ss, sheet_name)
+            all_values = ws.get_all_values()
 
-        print(f"📝 Записываем отмену в строку {cancelled_row} (последняя строка листа: {last_row})")
-
-        # Находим колонку для записи имени
-        name_col = cols.get('last_name')
-        if not name_col:
-            print("❌ Не найдена колонка для имени")
-            return False
-
-        # Записываем имя
-        cell_range = row_col_to_a1(cancelled_row, name_col + 1)
-        ws.update(cell_range, [[f"❌ ОТМЕНЕНО: {guest_name}"]])
-
-        # Форматируем красным цветом
-        ws.format(cell_range, {
-            "backgroundColor": {
-                "red": 1.0,
-                "green": 0.8,
-                "blue": 0.8
-            },
-            "textFormat": {
-                "foregroundColor": {
-                    "red": 0.8,
-                    "green": 0.0,
-                    "blue": 0.0
+            # Находим блок пакета (нужно для получения колонки)
+            _, _, cols = get_package_block(all_values, package_name)
+            if not cols:
+                print(f"❌ Не найден блок пакета {package_name}")
+                return False
+
+            # 🔥 НАХОДИМ ПОСЛЕДНЮЮ СТРОКУ НА ВСЕМ ЛИСТЕ
+            last_row = find_last_content_row(all_values)
+            # Отступаем 15 строк от конца ВСЕГО листа
+            cancelled_row = last_row + 15
+
+            print(f"📝 Записываем отмену в строку {cancelled_row} (последняя строка листа: {last_row})")
+
+            # Находим колонку для записи имени
+            name_col = cols.get('last_name')
+            if not name_col:
+                print("❌ Не найдена колонка для имени")
+                return False
+
+            # Записываем имя
+            cell_range = row_col_to_a1(cancelled_row, name_col + 1)
+            ws.update(cell_range, [[f"❌ ОТМЕНЕНО: {guest_name}"]])
+            invalidate_sheet_cache(sheet_id, sheet_name)
+            notify_package_changed(sheet_id, sheet_name, package_name)
+
+            # Форматируем красным цветом
+            ws.format(cell_range, {
+                "backgroundColor": {
+                    "red": 1.0,
+                    "green": 0.8,
+                    "blue": 0.8
                 },
-                "fontSize": 11,
-                "bold": True
-            }
-        })
-
-        print(f"✅ Отмена записана красным в строку {cancelled_row}")
-        return True
+                "textFormat": {
+                    "foregroundColor": {
+                        "red": 0.8,
+                        "green": 0.0,
+                        "blue": 0.0
+                    },
+                    "fontSize": 11,
+                    "bold": True
+                }
+            })
+
+            print(f"✅ Отмена записана красным в строку {cancelled_row}")
+            return True
 
     except Exception as e:
         print(f"❌ Ошибка записи отмены: {e}")
@@ -321,7 +389,8 @@ async def write_cancelled_booking_red(sheet_id, sheet_name, package_name, guest_
         traceback.print_exc()
         return False
 
-async def write_rescheduled_booking_red(sheet_id, sheet_name, package_name, guest_name):
+@offloaded(NETWORK)
+def write_rescheduled_booking_red(sheet_id, sheet_name, package_name, guest_name):
     """Записывает перенос красным цветом внизу блока пакета"""
     from bull_project.bull_bot.core.google_sheets.allocator import get_package_block
     client = get_google_client()
@@ -330,53 +399,56 @@ async def write_rescheduled_booking_red(sheet_id, sheet_name, package_name, gues
         return False
 
     try:
-        ss = client.open_by_key(sheet_id)
-        ws = get_worksheet_by_title(ss, sheet_name)
-        all_values = ws.get_all_values()
-
-        # Находим блок пакета (нужно для получения колонки)
-        _, _, cols = get_package_block(all_values, package_name)
-        if not cols:
-            print(f"❌ Не найден блок пакета {package_name}")
-            return False
+        with sheet_write_lock(sheet_id, sheet_name):
+            ss = client.open_by_key(sheet_id)
+            ws = get_worksheet_by_title(ss, sheet_name)
+            all_values = ws.get_all_values()
 
-        # 🔥 НАХОДИМ ПОСЛЕДНЮЮ СТРОКУ НА ВСЕМ ЛИСТЕ
-        last_row = find_last_content_row(all_values)
-        # Отступаем 15 строк от конца ВСЕГО листа
-        rescheduled_row = last_row + 15
-
-        print(f"📝 Записываем перенос в строку {rescheduled_row} (последняя строка листа: {last_row})")
-
-        # Находим колонку для записи имени
-        name_col = cols.get('last_name')
-        if not name_col:
-            print("❌ Не найдена колонка для имени")
-            return False
-
-        # Записываем имя
-        cell_range = row_col_to_a1(rescheduled_row, name_col + 1)
-        ws.update(cell_range, [[f"♻️ ПЕРЕНОС: {guest_name}"]])
-
-        # Форматируем красным цветом (как отмена)
-        ws.format(cell_range, {
-            "backgroundColor": {
-                "red": 1.0,
-                "green": 0.8,
-                "blue": 0.8
-            },
-            "textFormat": {
-                "foregroundColor": {
-                    "red": 0.8,
-                    "green": 0.0,
-                    "blue": 0.0
+            # Находим блок пакета (нужно для получения колонки)
+            _, _, cols = get_package_block(all_values, package_name)
+            if not cols:
+                print(f"❌ Не найден блок пакета {package_name}")
+                return False
+
+            # 🔥 НАХОДИМ ПОСЛЕДНЮЮ СТРОКУ НА ВСЕМ ЛИСТЕ
+            last_row = find_last_content_row(all_values)
+            # Отступаем 15 строк от конца ВСЕГО листа
+            rescheduled_row = last_row + 15
+
+            print(f"📝 Записываем перенос в строку {rescheduled_row} (последняя строка листа: {last_row})")
+
+            # Находим колонку для записи имени
+            name_col = cols.get('last_name')
+            if not name_col:
+                print("❌ Не найдена колонка для имени")
+                return False
+
+            # Записываем имя
+            cell_range = row_col_to_a1(rescheduled_row, name_col + 1)
+            ws.update(cell_range, [[f"♻️ ПЕРЕНОС: {guest_name}"]])
+            invalidate_sheet_cache(sheet_id, sheet_name)
+            notify_package_changed(sheet_id, sheet_name, package_name)
+
+            # Форматируем красным цветом (как отмена)
+            ws.format(cell_range, {
+                "backgroundColor": {
+                    "red": 1.0,
+                    "green": 0.8,
+                    "blue": 0.8
                 },
-                "fontSize": 11,
-                "bold": True
-            }
-        })
-
-        print(f"✅ Перенос записан красным в строку {rescheduled_row}")
-        return True
+                "textFormat": {
+                    "foregroundColor": {
+                        "red": 0.8,
+                        "green": 0.0,
+                        "blue": 0.0
+                    },
+                    "fontSize": 11,
+                    "bold": True
+                }
+            })
+
+            print(f"✅ Перенос записан красным в строку {rescheduled_row}")
+            return True
 
     except Exception as e:
         print(f"❌ Ошибка записи переноса: {e}")
@@ -0,0 +1,151 @@
+"""
+idempotency.py - Ключ идемпотентности для POST-запросов API.
+
+Менеджер на медленной связи жмет «Записать» дважды или клиент повторяет
+запрос после таймаута: без ключа оба запроса проходят проверку дублей и
+оба пишут в БД и Sheets (с последующей уборкой).
+
+    return await idempotent_response("bookings_submit", key, fingerprint(data), handler)
+
+  * повтор с тем же ключом, пока первый запрос выполняется, ждет его и
+    получает тот же ответ (в процессе — общий Future, между воркерами —
+    блокировка в общем кэше core/cache_backend.py);
+  * успешный (2xx) результат хранится IDEMPOTENCY_TTL секунд и отдается
+    повторно с заголовком Idempotent-Replayed: true;
+  * ошибки не сохраняются — повтор с тем же ключом выполнится заново;
+  * тот же ключ с другим телом запроса — 422.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from bull_project.bull_bot.core.cache_backend import cache_key, get_cache
+
+# Сколько хранить результат (с) и сколько держать блокировку выполнения (с)
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_LOCK_TTL = int(os.getenv("IDEMPOTENCY_LOCK_TTL", "120"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 128
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# (статус, тело)
+Result = Tuple[int, Any]
+
+# Ключ -> (отпечаток, Future результата) для запросов, выполняющихся в процессе
+_inflight: Dict[str, Tuple[str, "asyncio.Future[Result]"]] = {}
+
+
+def fingerprint(data: Any) -> str:
+    """Отпечаток тела запроса (ключ нельзя переиспользовать с другими данными)"""
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _to_result(response: Any) -> Result:
+    if isinstance(response, JSONResponse):
+        return response.status_code, json.loads(response.body)
+    return 200, response
+
+
+def _respond(result: Result, replayed: bool) -> JSONResponse:
+    status, body = result
+    headers = {REPLAYED_HEADER: "true"} if replayed else None
+    return JSONResponse(status_code=status, content=body, headers=headers)
+
+
+def _mismatch() -> JSONResponse:
+    return JSONResponse(
+        status_code=422,
+        content={"ok": False, "error": "Idempotency-Key уже использован для другого запроса"},
+    )
+
+
+async def _wait_other_worker(result_key: str, lock_key: str) -> Optional[Dict[str, Any]]:
+    """Ждет результат запроса, который выполняет другой воркер (None — не дождались)"""
+    cache = get_cache()
+    deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_LOCK_TTL
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.25)
+        stored = cache.get(result_key)
+        if stored is not None:
+            return stored
+        if cache.get(lock_key) is None:
+            return None
+    return None
+
+
+async def idempotent_response(
+    scope: str,
+    key: str,
+    request_fingerprint: str,
+    handler: Callable[[], Awaitable[Any]],
+):
+    """Выполняет handler() один раз на ключ; повторы получают тот же ответ"""
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return JSONResponse(status_code=400, content={"ok": False, "error": "Слишком длинный Idempotency-Key"})
+
+    result_key = cache_key("idempotency", scope, key)
+    lock_key = result_key + ":lock"
+    cache = get_cache()
+
+    stored = cache.get(result_key)
+    if stored is not None:
+        if stored["fingerprint"] != request_fingerprint:
+            return _mismatch()
+        return _respond((stored["status"], stored["body"]), replayed=True)
+
+    # Этот же ключ уже выполняется в процессе — ждем его результата
+    inflight = _inflight.get(result_key)
+    if inflight is not None:
+        if inflight[0] != request_fingerprint:
+            return _mismatch()
+        return _respond(await asyncio.shield(inflight[1]), replayed=True)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[result_key] = (request_fingerprint, future)
+    locked = False
+    try:
+        locked = cache.add(lock_key, request_fingerprint, ttl=IDEMPOTENCY_LOCK_TTL)
+        if not locked:
+            # Выполняет другой воркер
+            if cache.get(lock_key) not in (None, request_fingerprint):
+                result = (422, json.loads(_mismatch().body))
+                future.set_result(result)
+                return _respond(result, replayed=False)
+            stored = await _wait_other_worker(result_key, lock_key)
+            if stored is not None:
+                result = (stored["status"], stored["body"])
+                future.set_result(result)
+                return _respond(result, replayed=True)
+            locked = cache.add(lock_key, request_fingerprint, ttl=IDEMPOTENCY_LOCK_TTL)
+            if not locked:
+                result = (409, {"ok": False, "error": "Запрос с этим Idempotency-Key еще выполняется"})
+                future.set_result(result)
+                return _respond(result, replayed=False)
+
+        result = _to_result(await handler())
+        if 200 <= result[0] < 300:
+            cache.set(
+                result_key,
+                {"fingerprint": request_fingerprint, "status": result[0], "body": result[1]},
+                ttl=IDEMPOTENCY_TTL,
+            )
+        future.set_result(result)
+        return _respond(result, replayed=False)
+    except BaseException as e:
+        if not future.done():
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Исключение пробрасывается здесь; ожидающих может не быть
+                future.exception()
+        raise
+    finally:
+        _inflight.pop(result_key, None)
+        if locked:
+            cache.delete(lock_key)
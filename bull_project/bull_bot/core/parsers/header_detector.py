@@ -0,0 +1,185 @@
+"""
+header_detector.py - Единое определение заголовков таблиц паломников.
+
+Все парсеры (allocator, people_parser, package_parser, TableParser) ищут
+колонки через этот модуль. Алиасы компилируются в regex один раз при импорте,
+а найденные карты колонок кэшируются по «отпечатку» строки заголовков
+(нормализованный кортеж ячеек), поэтому одна и та же шапка листа
+разбирается один раз, а не на каждую бронь.
+"""
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from bull_project.bull_bot.core.utils.text_utils import normalize_header_text
+
+# === КАРТА ЗАГОЛОВКОВ (основная, используется allocator/writer) ===
+HEADER_MAP = {
+    "last_name": ["last name", "lastname", "фамилия", "names"],
+    "first_name": ["first name", "firstname", "имя"],
+    "gender": ["gender", "sex", "пол"],
+    "room": ["type of room", "room", "тип номера", "комната"],
+    "meal": ["meal", "meal a day", "питание"],
+    "dob": ["date of birth", "dob", "дата рождения", "д.р."],
+    "doc_num": ["document number", "passport", "номер паспорта", "passport number", "doc num"],
+    "doc_exp": ["document expiration", "expiration", "expiry", "срок действия", "годен до", "valid until"],
+    "iin": ["iin", "ИИН", "иин"],
+    "visa": ["visa", "виза"],
+    "avia": ["avia", "авиа", "рейс", "flight"],
+    "price": ["price", "цена", "стоимость"],
+    "comment": ["comment", "комментарий", "примечание", "сomment"],
+    "manager": ["manager", "менеджер"],
+    "train": ["train", "поезд", "жд"],
+    "client_phone": ["contact", "phone", "телефон", "номер", "контакты"],
+    "source": ["source", "источник"],
+    "amount_paid": ["paid", "оплачено", "внесено"],
+    "region": ["region", "регион"],
+}
+
+# === КАРТА ЗАГОЛОВКОВ ДЛЯ people_parser (короткие ключи) ===
+PEOPLE_HEADER_MAP = {
+    "last": ["last name", "lastname", "surname", "фамилия"],
+    "first": ["first name", "firstname", "name", "имя"],
+    "gender": ["gender", "sex", "пол"],
+    "room": ["type of room", "room", "комната", "тип"],
+    "meal": ["meal", "питание", "food"],
+    "visa": ["visa", "виза"],
+    "price": ["price", "цена", "стоимость"],
+    "dob": ["date of birth", "dob", "дата рождения", "д.р."],
+    "doc_num": ["document number", "passport", "номер паспорта", "№"],
+    "doc_exp": ["document expiration", "expiry", "срок действия", "годен до"],
+    "manager": ["manager", "менеджер"],
+    "comment": ["comment", "комментарий", "примечание"],
+    "avia": ["avia", "авиа", "рейс", "flight"],
+    "train": ["train", "поезд"],
+}
+
+# Слова, по которым package_parser понимает, что ниже начинается таблица
+TABLE_HEADER_HINTS = ["name", "names", "фио", "паломник", "pilgrim", "room", "комната"]
+
+
+def normalize_header_cell(value) -> str:
+    """Нормализует ячейку шапки: переносы/неразрывные пробелы -> пробел, lower."""
+    if value is None:
+        return ""
+    return normalize_header_text(value if type(value) is str else str(value))
+
+
+def compile_aliases(aliases: Iterable[str]) -> re.Pattern:
+    """Собирает список алиасов в один regex (поиск подстроки)."""
+    uniq = sorted({a.lower() for a in aliases if a}, key=len, reverse=True)
+    return re.compile("|".join(re.escape(a) for a in uniq))
+
+
+def layout_fingerprint(row: List[str]) -> Tuple[str, ...]:
+    """Отпечаток шапки: нормализованные ячейки без хвостовых пустых."""
+    cells = [normalize_header_cell(c) for c in row]
+    while cells and not cells[-1]:
+        cells.pop()
+    return tuple(cells)
+
+
+class HeaderSchema:
+    """
+    Скомпилированная схема заголовков.
+
+    alias_map  — {ключ колонки: [алиасы]}, порядок ключей важен (первый ключ,
+                 совпавший с ячейкой, закрепляет за собой колонку).
+    gates      — группы слов; в строке должна встретиться хотя бы одна
+                 подстрока из КАЖДОЙ группы, иначе строка — не шапка.
+    accept     — финальная проверка найденной карты колонок.
+    """
+
+    def __init__(
+            self,
+            alias_map: Dict[str, List[str]],
+            gates: Iterable[Iterable[str]] = (),
+            accept: Optional[Callable[[Dict[str, int]], bool]] = None,
+            cache_size: int = 256,
+    ):
+        self.alias_map = alias_map
+        self._patterns = [(key, compile_aliases(aliases)) for key, aliases in alias_map.items()]
+        self._gates = [compile_aliases(group) for group in gates]
+        self._accept = accept
+        self._match_cell = lru_cache(maxsize=2048)(self._match_cell_uncached)
+        self._detect_layout = lru_cache(maxsize=cache_size)(self._detect_layout_uncached)
+
+    def _match_cell_uncached(self, cell: str) -> Tuple[str, ...]:
+        return tuple(key for key, rx in self._patterns if rx.search(cell))
+
+    def _detect_layout_uncached(self, fingerprint: Tuple[str, ...]) -> Optional[Dict[str, int]]:
+        cols: Dict[str, int] = {}
+        for col_idx, val in enumerate(fingerprint):
+            if not val:
+                continue
+            for key in self._match_cell(val):
+                if key not in cols:
+                    cols[key] = col_idx
+        if self._accept and not self._accept(cols):
+            return None
+        return cols
+
+    def passes_gates(self, row: List[str]) -> bool:
+        """Быстрая проверка строки (без разбора по колонкам)."""
+        if not self._gates:
+            return True
+        text = " ".join(normalize_header_cell(c) for c in row)
+        return all(rx.search(text) for rx in self._gates)
+
+    def detect(self, row: List[str]) -> Optional[Dict[str, int]]:
+        """
+        Возвращает карту колонок {ключ: индекс} или None.
+        Результат кэшируется по отпечатку шапки, поэтому повторные вызовы
+        для того же макета листа не пересчитывают совпадения.
+        """
+        if not row or not self.passes_gates(row):
+            return None
+        cols = self._detect_layout(layout_fingerprint(row))
+        return dict(cols) if cols is not None else None
+
+    def cache_clear(self):
+        self._match_cell.cache_clear()
+        self._detect_layout.cache_clear()
+
+
+def _accept_sheet_headers(cols: Dict[str, int]) -> bool:
+    # Должна быть колонка "room" и хотя бы одна из: last_name/first_name/gender
+    return "room" in cols and bool(cols.get("last_name") or cols.get("first_name") or cols.get("gender"))
+
+
+def _accept_people_headers(cols: Dict[str, int]) -> bool:
+    return ("last" in cols or "first" in cols) and ("room" in cols or "gender" in cols)
+
+
+# Схемы (синглтоны) — создаются один раз на процесс
+SHEET_HEADERS = HeaderSchema(
+    HEADER_MAP,
+    gates=[["last name", "фамилия", "names", "name"]],
+    accept=_accept_sheet_headers,
+)
+
+PEOPLE_HEADERS = HeaderSchema(
+    PEOPLE_HEADER_MAP,
+    gates=[
+        ["name", "фио", "surname", "last name", "first name"],
+        ["room", "gender", "sex", "пол", "комната"],
+    ],
+    accept=_accept_people_headers,
+)
+
+_TABLE_HEADER_RX = compile_aliases(TABLE_HEADER_HINTS)
+
+
+def row_has_table_header(row) -> bool:
+    """Проверяет, содержит ли строка заголовок таблицы"""
+    return bool(_TABLE_HEADER_RX.search(" ".join(str(cell) for cell in row).lower()))
+
+
+def find_header_row(all_rows: List[List[str]], start: int, limit: int = 15,
+                    schema: HeaderSchema = SHEET_HEADERS) -> Tuple[Optional[int], Optional[Dict[str, int]]]:
+    """Ищет первую строку шапки в диапазоне [start, start + limit)."""
+    for r in range(start, min(start + limit, len(all_rows))):
+        cols = schema.detect(all_rows[r])
+        if cols:
+            return r, cols
+    return None, None
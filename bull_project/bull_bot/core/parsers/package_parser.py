@@ -2,6 +2,8 @@
 import re
 from datetime import datetime
 
+from bull_project.bull_bot.core.parsers.header_detector import row_has_table_header
+
 CITY_ALIASES = {
     "madinah": ["madinah", "medinah", "medina", "madina", "mdinah", "mdina", "мадина", "медина"],
     "makkah":  ["makkah", "makka", "mecca", "mekka", "makah", "макка", "мекка"],
@@ -523,12 +525,6 @@ def normtxt(s: str) -> str:
     """Нормализация текста"""
     return norm_spaces(str(s))
 
-def row_has_table_header(row) -> bool:
-    """Проверяет, содержит ли строка заголовок таблицы"""
-    header_keywords = ['name', 'names', 'фио', 'паломник', 'pilgrim', 'room', 'комната']
-    row_text = ' '.join(str(cell) for cell in row).lower()
-    return any(keyword in row_text for keyword in header_keywords)
-
 def is_4u_title(title: str) -> bool:
     t = low(str(title))
     return "4u" in t or "4 u" in t
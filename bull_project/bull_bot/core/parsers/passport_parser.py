@@ -3,7 +3,6 @@
 Работает лучше Tesseract, проще PaddleOCR
 """
 
-import easyocr
 from PIL import Image
 from pdf2image import convert_from_path
 # passporteye удален (потребляет много памяти)
@@ -18,6 +17,7 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 import os
+import threading
 
 
 @dataclass
@@ -69,6 +69,21 @@ class PassportData:
         }
 
 
+_easyocr_reader = None
+_easyocr_lock = threading.Lock()
+
+
+def load_easyocr_reader():
+    """Один EasyOCR Reader на процесс (парсер и генератор PDF делят модели)"""
+    global _easyocr_reader
+    if _easyocr_reader is None:
+        with _easyocr_lock:
+            if _easyocr_reader is None:
+                import easyocr
+                _easyocr_reader = easyocr.Reader(['en', 'ru'])
+    return _easyocr_reader
+
+
 class PassportParserEasyOCR:
     """
     Парсер на EasyOCR + PassportEye
@@ -79,9 +94,17 @@ class PassportParserEasyOCR:
         self.poppler_path = poppler_path
         self.debug = debug
 
-        # Инициализация EasyOCR (английский + русский)
-        # Первый запуск скачает модели (~100MB)
-        self.reader = easyocr.Reader(['en', 'ru'])
+        self._reader = None
+
+    @property
+    def reader(self):
+        """
+        EasyOCR (английский + русский) грузится при первом распознавании:
+        импорт easyocr тянет torch, первый запуск скачает модели (~100MB)
+        """
+        if self._reader is None:
+            self._reader = load_easyocr_reader()
+        return self._reader
 
     def validate_iin_checksum(self, iin: str) -> bool:
         """Проверка контрольной суммы ИИН"""
@@ -10,7 +10,8 @@ from PIL import Image
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.utils import ImageReader
-import easyocr
+
+from bull_project.bull_bot.core.parsers.passport_parser import load_easyocr_reader
 
 
 class PassportPDFGenerator:
@@ -21,8 +22,14 @@ class PassportPDFGenerator:
 
     def __init__(self, debug: bool = False):
         self.debug = debug
-        # Инициализация EasyOCR (используем ту же модель, что и в passport_parser)
-        self.reader = easyocr.Reader(['en', 'ru'])
+        # Та же модель EasyOCR, что и в passport_parser (грузится при первом вызове)
+        self._reader = None
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            self._reader = load_easyocr_reader()
+        return self._reader
 
     def extract_text_with_positions(self, image_path: str) -> list:
         """
@@ -1,5 +1,8 @@
 import re
 
+from bull_project.bull_bot.core.parsers.header_detector import PEOPLE_HEADERS
+from bull_project.bull_bot.core.utils.text_utils import SHEETS_DEBUG, room_kind
+
 # ==================== ЗАЩИТА ОТ ОШИБОК ИМПОРТА ====================
 # Мы определяем списки ПРЯМО ЗДЕСЬ, чтобы файл работал автономно
 
@@ -75,83 +78,22 @@ def detect_people_header(row: list[str]) -> dict | None:
     """
     Ищет заголовки колонок (Фамилия, Имя, Пол...) в строке.
     Возвращает словарь индексов: {'last': 4, 'gender': 6 ...}
+    Сами алиасы и кэш по макету шапки живут в header_detector.
     """
-    row_lower = [str(c).lower().strip() for c in row]
-    row_text = " ".join(row_lower)
-
-    # Быстрая проверка: есть ли тут вообще намек на заголовки?
-    has_name = any(x in row_text for x in ['name', 'фио', 'surname', 'last name', 'first name'])
-    has_room_or_gender = any(x in row_text for x in ['room', 'gender', 'sex', 'пол', 'комната'])
-
-    if not (has_name and has_room_or_gender):
-        return None
-
-    cols = {}
-
-    # Карта поиска ключевых слов
-    KEYWORD_MAP = {
-        "last": ["last name", "lastname", "surname", "фамилия"],
-        "first": ["first name", "firstname", "name", "имя"],
-        "gender": ["gender", "sex", "пол"],
-        "room": ["type of room", "room", "комната", "тип"],
-        "meal": ["meal", "питание", "food"],
-        "visa": ["visa", "виза"],
-        "price": ["price", "цена", "стоимость"],
-        "dob": ["date of birth", "dob", "дата рождения", "д.р."],
-        "doc_num": ["document number", "passport", "номер паспорта", "№"],
-        "doc_exp": ["document expiration", "expiry", "срок действия", "годен до"],
-        "manager": ["manager", "менеджер"],
-        "comment": ["comment", "комментарий", "примечание"],
-        "avia": ["avia", "авиа", "рейс", "flight"],
-        "train": ["train", "поезд"]
-    }
-
-    for idx, val in enumerate(row_lower):
-        if not val: continue
-        for key, keywords in KEYWORD_MAP.items():
-            # Если колонка еще не найдена и слово подходит
-            if key not in cols and any(k in val for k in keywords):
-                cols[key] = idx
-
-    # Проверка: нашли ли мы минимум для работы?
-    if ("last" in cols or "first" in cols) and ("room" in cols or "gender" in cols):
-        return cols
-
-    return None
+    return PEOPLE_HEADERS.detect(row)
 
 def _norm_room_kind(s: str, prev: str|None) -> str|None:
     """
     Нормализует тип комнаты (QUAD -> quad).
     Если ячейка пустая (объединенная), берет значение из prev (предыдущей строки).
+    Само распознавание кэшируется в text_utils.room_kind.
     """
     if not s: return prev
 
-    t = s.lower().strip()
-
-    # 🔥 ОТЛАДКА: выводим что пришло
-    print(f"🔍 _norm_room_kind вызвана с: '{s}' -> после lower: '{t}'")
-
-    if "quad" in t or "4" in t:
-        print(f"   ✅ Распознано как QUAD")
-        return "quad"
-    if "trip" in t or "trpl" in t or "3" in t:
-        print(f"   ✅ Распознано как TRIPLE")
-        return "trpl"
-    if "doub" in t or "dbl" in t or "2" in t:
-        print(f"   ✅ Распознано как DOUBLE")
-        return "dbl"
-    if "sing" in t or "sgl" in t or "1" in t:
-        print(f"   ✅ Распознано как SINGLE")
-        return "sgl"
-    if "quin" in t or "5" in t:
-        print(f"   ✅ Распознано как QUIN")
-        return "quin"
-    if "inf" in t:
-        print(f"   ✅ Распознано как INFANT")
-        return "inf"
-
-    print(f"   ❌ НЕ распознано, возвращаем prev={prev}")
-    return prev
+    kind = room_kind(s)
+    if SHEETS_DEBUG:
+        print(f"🔍 _norm_room_kind('{s}') -> {kind or f'не распознано, prev={prev}'}")
+    return kind or prev
 
 def norm_hdr(s: str) -> str:
     if s is None: return ""
@@ -0,0 +1,189 @@
+"""
+response_cache.py - Кэш ответов read-mostly эндпоинтов API.
+
+    @app.get("/api/care/sheets")
+    @cached_response(ttl=300, stale=3600)
+    async def get_care_sheets(table_id: str = Query(...)): ...
+
+  * ключ — имя эндпоинта + path- и query-параметры запроса;
+  * свежая запись (моложе ttl) отдается сразу, устаревшая в пределах
+    stale — тоже сразу, а пересчет идет фоном (stale-while-revalidate);
+    одновременные промахи по одному ключу считаются один раз;
+  * ETag по телу ответа: на If-None-Match с тем же ETag — 304 без тела;
+  * кэшируются только успешные ответы (dict с ok=True), ошибки — нет;
+  * tags — таблицы БД, от которых зависит ответ: invalidate("bookings")
+    сбрасывает все такие записи (api_server подписывает его на
+    database/events.py, т.е. на commit записи броней в этом процессе).
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from bull_project.bull_bot.core.serializers import dumps
+
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+
+
+class _Entry:
+    __slots__ = ("body", "etag", "stored_at", "tags")
+
+    def __init__(self, body: bytes, tags: Tuple[str, ...]):
+        self.body = body
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.stored_at = time.monotonic()
+        self.tags = tags
+
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+
+def _cacheable(result: Any) -> bool:
+    return isinstance(result, dict) and bool(result.get("ok"))
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._locks = {}
+        self._refreshing = {}
+        # Растет при каждой инвалидации: результат, посчитанный до нее, не кэшируем
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def invalidate(self, *tags: str):
+        """Сбрасывает записи с любым из tags (без аргументов — все)"""
+        self._generation += 1
+        if not tags:
+            self._entries.clear()
+            return
+        wanted = set(tags)
+        for key in [k for k, e in self._entries.items() if wanted.intersection(e.tags)]:
+            del self._entries[key]
+
+    def _store(self, key: str, result: Any, tags: Tuple[str, ...], generation: int) -> Optional[_Entry]:
+        if not _cacheable(result):
+            return None
+        body = dumps(jsonable_encoder(result))
+        entry = _Entry(body, tags)
+        if generation == self._generation:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[Any]], tags: Tuple[str, ...]):
+        generation = self._generation
+        result = await compute()
+        return result, self._store(key, result, tags, generation)
+
+    def _refresh_in_background(self, key: str, compute, tags: Tuple[str, ...]):
+        task = self._refreshing.get(key)
+        if task is not None and not task.done():
+            return
+
+        async def refresh():
+            try:
+                await self._compute(key, compute, tags)
+            except Exception as e:
+                print(f"⚠️ Фоновое обновление кэша {key} не удалось: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def respond(
+        self,
+        key: str,
+        request: Request,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale: float = 0,
+        tags: Iterable[str] = (),
+    ):
+        tags = tuple(tags)
+        entry = self._entries.get(key)
+        if entry is not None and entry.age() <= ttl:
+            state = "HIT"
+        elif entry is not None and entry.age() <= ttl + stale:
+            state = "STALE"
+            self._refresh_in_background(key, compute, tags)
+        else:
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            try:
+                async with lock:
+                    entry = self._entries.get(key)
+                    if entry is not None and entry.age() <= ttl:
+                        state = "HIT"
+                    else:
+                        state = "MISS"
+                        result, entry = await self._compute(key, compute, tags)
+                        if entry is None:
+                            # Ошибка / ok=False — отдаем как есть, без кэша
+                            return result
+            finally:
+                self._locks.pop(key, None)
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "X-Cache": state}
+        if _etag_matches(request, entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+# Синглтон кэша ответов API
+response_cache = ResponseCache()
+
+
+def _request_key(name: str, request: Request) -> str:
+    path_params = sorted(request.path_params.items())
+    query = sorted(request.query_params.multi_items())
+    return f"{name}|{path_params}|{query}"
+
+
+def cached_response(ttl: float, stale: float = 0, tags: Iterable[str] = ()):
+    """
+    Декоратор эндпоинта FastAPI (ставится под @app.get). Если у эндпоинта
+    нет параметра request: Request, он добавляется в сигнатуру.
+    """
+    tags = tuple(tags)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        has_request = "request" in signature.parameters
+        if not has_request:
+            params = list(signature.parameters.values())
+            params.append(inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request))
+            signature = signature.replace(parameters=params)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            request = kwargs["request"] if has_request else kwargs.pop("request")
+            key = _request_key(func.__name__, request)
+            return await response_cache.respond(
+                key, request, lambda: func(*args, **kwargs), ttl, stale, tags
+            )
+
+        wrapper.__signature__ = signature
+        return wrapper
+
+    return decorator
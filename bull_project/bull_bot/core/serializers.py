@@ -0,0 +1,187 @@
+"""
+serializers.py - Быстрая сериализация списков броней для API.
+
+Эндпоинты истории, админки и Отдела Заботы отдают сотни броней. Вместо
+ручной сборки словаря поле за полем и прохода jsonable_encoder:
+
+  * схема Booking -> dict описывается один раз (BookingSerializer): поля
+    читаются одним operator.attrgetter, преобразования («-» для пустых,
+    isoformat для дат) — заранее выбранные функции;
+  * ответ кодирует orjson (FastJSONResponse) — в разы быстрее json и без
+    jsonable_encoder; если orjson не установлен — стандартный json.
+
+Сжатие ответов — core/compression.py.
+"""
+import json
+from datetime import date, datetime
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+if HAS_ORJSON:
+    def dumps(value: Any) -> bytes:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse на orjson (содержимое должно быть уже JSON-совместимым)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# ---------- преобразования значений ----------
+
+def dash(value):
+    return value or "-"
+
+
+def blank(value):
+    return value or ""
+
+
+def iso(value):
+    return value.isoformat() if value else None
+
+
+def json_list(value):
+    """group_members: JSON-колонка (список) или старая строка с JSON"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return []
+    return value
+
+
+FieldSpec = Union[str, Tuple[str, str], Tuple[str, str, Optional[Callable[[Any], Any]]]]
+
+
+class BookingSerializer:
+    """
+    Скомпилированная схема «объект -> dict».
+
+    fields: "attr" | (ключ, attr) | (ключ, attr, преобразование).
+    Поля, которые считает эндпоинт (например путь к паспорту с фолбэком),
+    передаются в __call__ как extra и перекрывают поля схемы.
+    """
+
+    def __init__(self, fields: Sequence[FieldSpec]):
+        keys, attrs, converters = [], [], []
+        for spec in fields:
+            if isinstance(spec, str):
+                spec = (spec, spec)
+            key, attr, *rest = spec
+            keys.append(key)
+            attrs.append(attr)
+            converters.append(rest[0] if rest else None)
+        self.keys: Tuple[str, ...] = tuple(keys)
+        self._get = attrgetter(*attrs) if len(attrs) > 1 else (lambda obj, g=attrgetter(attrs[0]): (g(obj),))
+        # Индексы полей с преобразованием — остальные копируются как есть
+        self._converted = tuple((i, conv) for i, conv in enumerate(converters) if conv is not None)
+
+    def __call__(self, obj, **extra) -> Dict[str, Any]:
+        values = list(self._get(obj))
+        for i, conv in self._converted:
+            values[i] = conv(values[i])
+        row = dict(zip(self.keys, values))
+        if extra:
+            row.update(extra)
+        return row
+
+    def many(self, objs: Iterable, extra: Optional[Callable[[Any], Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        if extra is None:
+            return [self(o) for o in objs]
+        return [self(o, **extra(o)) for o in objs]
+
+
+# ---------- схемы эндпоинтов ----------
+
+# /api/history/{manager_id}
+HISTORY_BOOKING = BookingSerializer([
+    "id", "manager_id", "table_id", "sheet_name", "sheet_row_number", "package_name",
+    "region", "departure_city", "source", "amount_paid", "exchange_rate", "discount",
+    "contract_number", "visa_status", "avia", "avia_request", "room_type", "meal_type",
+    "train", "price", "comment", "manager_name_text", "placement_type",
+    "guest_last_name", "guest_first_name", "gender", "date_of_birth", "passport_num",
+    "passport_expiry", "guest_iin", "client_phone", "passport_image_path",
+    ("group_members", "group_members", json_list),
+    "status",
+    ("created_at", "created_at", iso),
+])
+
+# /api/admin/bookings (JSON и NDJSON)
+ADMIN_BOOKING = BookingSerializer([
+    "id", "table_id", "guest_last_name", "guest_first_name", "gender", "date_of_birth",
+    "guest_iin", "passport_num", "passport_expiry", "passport_image_path", "client_phone",
+    "package_name", "sheet_name", "sheet_row_number", "room_type", "placement_type",
+    "meal_type", "visa_status", "avia", "train", "departure_city", "region", "source",
+    "price", "amount_paid", "status",
+    ("manager_name", "manager_name_text"),
+    ("created_at", "created_at", iso),
+    ("comment", "comment", blank),
+    ("group_members", "group_members", json_list),
+])
+
+# Общие поля карточки паломника в Отделе Заботы («-» вместо пустых)
+_CARE_FIELDS = [
+    ("id", "id"),
+    ("last_name", "guest_last_name", dash),
+    ("first_name", "guest_first_name", dash),
+    ("gender", "gender", dash),
+    ("date_of_birth", "date_of_birth", dash),
+    ("passport_num", "passport_num", dash),
+    ("passport_expiry", "passport_expiry", dash),
+    ("iin", "guest_iin", dash),
+    ("phone", "client_phone", dash),
+    ("package_name", "package_name", dash),
+    ("sheet_name", "sheet_name", dash),
+    ("room_type", "room_type", dash),
+    ("meal_type", "meal_type", dash),
+    ("price", "price", dash),
+    ("amount_paid", "amount_paid", dash),
+    ("manager_name", "manager_name_text", dash),
+    ("comment", "comment", blank),
+    ("visa_status", "visa_status", dash),
+    ("avia", "avia", dash),
+    ("train", "train", dash),
+    ("region", "region", dash),
+    ("departure_city", "departure_city", dash),
+    ("source", "source", dash),
+    ("passport_image_path", "passport_image_path"),
+    ("created_at", "created_at", iso),
+    ("status", "status"),
+]
+
+# /api/care/search
+CARE_SEARCH_BOOKING = BookingSerializer(_CARE_FIELDS + [
+    ("placement_type", "placement_type", dash),
+])
+
+# /api/care/bookings-in-package
+CARE_PACKAGE_BOOKING = BookingSerializer(_CARE_FIELDS + [
+    ("table_id", "table_id", dash),
+    ("sheet_row_number", "sheet_row_number"),
+])
@@ -1,22 +1,22 @@
-import time
 import asyncio
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List
 
 from bull_project.bull_bot.core.google_sheets.client import (
     get_accessible_tables, get_sheet_names, get_packages_from_sheet
 )
+from bull_project.bull_bot.core.executors import run_network
+from bull_project.bull_bot.core.cache_backend import cache_key, get_cache, get_or_compute
 
 # -----------------------
-# КЭШИ (умные, точечные)
+# КЭШИ (умные, точечные) — в общем бэкенде core/cache_backend.py,
+# одни на все воркеры API
 # -----------------------
 
 # 1) Кэш листов по таблице (редко меняется)
-SHEETS_CACHE: Dict[str, Tuple[float, List[str]]] = {}
 SHEETS_TTL = 60 * 30  # 30 минут
 
 # 2) Кэш результатов по дате (почти realtime)
-DATE_CACHE: Dict[str, Tuple[float, List[dict]]] = {}
 DATE_TTL = 60  # 60 секунд (можешь поставить 30..120)
 
 def _norm_ddmm(s: str) -> str:
@@ -32,7 +32,7 @@ def _norm_ddmm(s: str) -> str:
 async def _get_target_tables_current_next_year() -> Dict[str, str]:
     now = datetime.now()
     years = [str(now.year), str(now.year + 1)]
-    all_tables = get_accessible_tables()
+    all_tables = await run_network(get_accessible_tables)
 
     target = {}
     for t_name, t_id in all_tables.items():
@@ -42,12 +42,15 @@ async def _get_target_tables_current_next_year() -> Dict[str, str]:
     return target
 
 async def _get_sheet_names_cached(table_id: str, force: bool = False) -> List[str]:
-    ts, cached = SHEETS_CACHE.get(table_id, (0, []))
-    if (not force) and cached and (time.time() - ts < SHEETS_TTL):
+    key = cache_key("sheets", "names", table_id)
+    cached = None if force else get_cache().get(key)
+    if cached:
         return cached
 
-    names = get_sheet_names(table_id)
-    SHEETS_CACHE[table_id] = (time.time(), names or [])
+    if force:
+        get_cache().delete(key)
+    # Один воркер спрашивает Google, остальные ждут его результат
+    names = await run_network(get_or_compute, key, SHEETS_TTL, lambda: get_sheet_names(table_id))
     # маленькая пауза против 429
     await asyncio.sleep(0.3)
     return names or []
@@ -60,8 +63,9 @@ async def get_packages_by_date(date_part: str, force: bool = False) -> dict:
     date_part = _norm_ddmm(date_part)
 
     # Кэш по дате (короткий)
-    ts, cached = DATE_CACHE.get(date_part, (0, []))
-    if (not force) and cached and (time.time() - ts < DATE_TTL):
+    date_key = cache_key("packages_by_date", date_part)
+    cached = None if force else get_cache().get(date_key)
+    if cached:
         return {"found": True, "data": cached}
 
     try:
@@ -117,7 +121,7 @@ async def get_packages_by_date(date_part: str, force: bool = False) -> dict:
                 # читаем пакеты только из совпавших листов
                 for sheet_name in matched:
                     await asyncio.sleep(0.1)  # микро-пауза
-                    packages_map = get_packages_from_sheet(t_id, sheet_name)
+                    packages_map = await run_network(get_packages_from_sheet, t_id, sheet_name)
 
                     if not packages_map:
                         continue
@@ -140,7 +144,7 @@ async def get_packages_by_date(date_part: str, force: bool = False) -> dict:
         if not collected:
             return {"found": False, "error": "Рейсы не найдены."}
 
-        DATE_CACHE[date_part] = (time.time(), collected)
+        get_cache().set(date_key, collected, ttl=DATE_TTL)
         return {"found": True, "data": collected}
 
     except Exception as e:
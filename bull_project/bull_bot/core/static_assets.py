@@ -0,0 +1,242 @@
+"""
+static_assets.py - Статика WebApp: хэшированные URL, immutable-кэш, .br/.gz.
+
+Telegram WebApp открывается «холодным» каждый раз, поэтому страницы и
+скрипты должны браться из кэша браузера, а не качаться заново.
+
+Сборка (при сборке образа, см. Dockerfile):
+
+    python -m bull_project.bull_bot.core.static_assets
+
+копирует каждую папку из WEBAPP_SOURCES в STATIC_BUILD_DIR/<имя>/:
+
+  * файлы (js, css, картинки) — под исходным именем и под именем с хэшем
+    содержимого: config.js -> config.3f2a9c1d0b.js;
+  * в HTML локальные src/href заменяются на хэшированные имена;
+  * текстовые файлы дополнительно сжимаются в .br (если есть brotli) и .gz.
+
+Раздача — CachedStaticFiles (StaticFiles Starlette):
+
+  * хэшированные файлы — Cache-Control: immutable на год (новое содержимое
+    = новый URL);
+  * HTML и файлы без хэша — no-cache + ETag/Last-Modified: браузер
+    переспрашивает и получает 304 без тела;
+  * если клиент принимает br/gzip и рядом лежит сжатый вариант — отдается он.
+
+Без сборки API раздает исходные папки (те же заголовки, но без хэшей и .br/.gz).
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from bull_project.bull_bot.core.executors import run_disk
+
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    brotli = None
+    HAS_BROTLI = False
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# URL-префикс (без слэша) -> исходная папка
+WEBAPP_SOURCES = {
+    "care-webapp": os.path.join(PROJECT_ROOT, "care_webapp"),
+    "admin-webapp": os.path.join(PROJECT_ROOT, "admin_webapp"),
+    "webapp": os.path.join(PROJECT_ROOT, "bull_bot", "webapp"),
+    "assets": os.path.join(PROJECT_ROOT, "assets"),
+}
+
+STATIC_BUILD_DIR = os.getenv("STATIC_BUILD_DIR", os.path.join(PROJECT_ROOT, "static_build"))
+
+HASH_LENGTH = 10
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{%d}\.[A-Za-z0-9]+$" % HASH_LENGTH)
+
+# Что имеет смысл сжимать (картинки и PDF уже сжаты)
+COMPRESSIBLE_EXTENSIONS = {".html", ".js", ".css", ".json", ".svg", ".txt", ".map"}
+PRECOMPRESS_MIN_SIZE = 256
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Сжатые варианты в порядке предпочтения: (Content-Encoding, расширение)
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# Локальные ссылки в HTML: src="config.js", href="style.css"
+_LINK_RE = re.compile(r"""(\s(?:src|href)=["'])([^"'?#]+)((?:[?#][^"']*)?["'])""")
+
+MANIFEST_NAME = "manifest.json"
+
+
+# ---------- сборка ----------
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(rel_path: str, digest: str) -> str:
+    root, ext = posixpath.splitext(rel_path)
+    return f"{root}.{digest}{ext}"
+
+
+def rewrite_html(html: str, html_rel_path: str, manifest: Dict[str, str]) -> str:
+    """Заменяет локальные src/href на хэшированные имена из manifest"""
+    base = posixpath.dirname(html_rel_path)
+
+    def replace(match):
+        prefix, link, suffix = match.groups()
+        if "://" in link or link.startswith(("/", "data:", "tel:", "mailto:", "$")):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(base, link))
+        hashed = manifest.get(target)
+        if hashed is None:
+            return match.group(0)
+        return prefix + posixpath.relpath(hashed, base or ".") + suffix
+
+    return _LINK_RE.sub(replace, html)
+
+
+def precompress(path: str, data: bytes):
+    """Пишет рядом path.gz и path.br (если brotli установлен)"""
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if HAS_BROTLI:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def _write(out_dir: str, rel_path: str, data: bytes):
+    path = os.path.join(out_dir, *rel_path.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    ext = posixpath.splitext(rel_path)[1].lower()
+    if ext in COMPRESSIBLE_EXTENSIONS and len(data) >= PRECOMPRESS_MIN_SIZE:
+        precompress(path, data)
+
+
+def build_static(src_dir: str, out_dir: str) -> Dict[str, str]:
+    """Собирает одну папку WebApp в out_dir. Возвращает manifest {файл: файл с хэшем}."""
+    files = {}
+    for root, _, names in os.walk(src_dir):
+        for name in names:
+            full = os.path.join(root, name)
+            files[os.path.relpath(full, src_dir).replace(os.sep, "/")] = full
+
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    manifest = {}
+    pages = []
+    for rel_path, full in sorted(files.items()):
+        if rel_path.endswith((".html", ".md")):
+            # HTML переписываем после манифеста, документацию не раздаем
+            if rel_path.endswith(".html"):
+                pages.append((rel_path, full))
+            continue
+        with open(full, "rb") as f:
+            data = f.read()
+        hashed = hashed_name(rel_path, content_hash(data))
+        manifest[rel_path] = hashed
+        _write(out_dir, rel_path, data)
+        _write(out_dir, hashed, data)
+
+    for rel_path, full in pages:
+        with open(full, "r", encoding="utf-8") as f:
+            html = f.read()
+        _write(out_dir, rel_path, rewrite_html(html, rel_path, manifest).encode("utf-8"))
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    return manifest
+
+
+def build_all(sources: Optional[Dict[str, str]] = None, out_root: str = STATIC_BUILD_DIR):
+    for name, src_dir in (sources or WEBAPP_SOURCES).items():
+        if not os.path.isdir(src_dir):
+            continue
+        manifest = build_static(src_dir, os.path.join(out_root, name))
+        print(f"📦 {name}: {len(manifest)} файлов -> {os.path.join(out_root, name)}")
+
+
+def static_dir(name: str) -> str:
+    """Собранная папка WebApp, если есть, иначе исходная"""
+    built = os.path.join(STATIC_BUILD_DIR, name)
+    return built if os.path.isdir(built) else WEBAPP_SOURCES[name]
+
+
+# ---------- раздача ----------
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles с immutable-кэшем для хэшированных файлов и .br/.gz вариантами"""
+
+    def __init__(self, *, directory: str, **kwargs):
+        kwargs.setdefault("check_dir", False)
+        super().__init__(directory=directory, **kwargs)
+        # Путь сжатого варианта -> stat (сборка неизменна, смотрим диск один раз)
+        self._variants: Optional[Dict[str, os.stat_result]] = None
+
+    def _scan_variants(self) -> Dict[str, os.stat_result]:
+        variants = {}
+        for directory in self.all_directories:
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    if name.endswith((".br", ".gz")):
+                        path = os.path.join(root, name)
+                        variants[path] = os.stat(path)
+        return variants
+
+    async def get_response(self, path: str, scope):
+        if self._variants is None:
+            self._variants = await run_disk(self._scan_variants)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200):
+        full_path = str(full_path)
+        request_headers = Headers(scope=scope)
+        media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+        compressible = os.path.splitext(full_path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+        response = None
+        if compressible:
+            accepted = request_headers.get("accept-encoding", "")
+            for encoding, ext in ENCODINGS:
+                variant_stat = (self._variants or {}).get(full_path + ext)
+                if variant_stat is not None and encoding in accepted:
+                    response = FileResponse(
+                        full_path + ext, status_code=status_code,
+                        stat_result=variant_stat, media_type=media_type,
+                    )
+                    response.headers["Content-Encoding"] = encoding
+                    break
+        if response is None:
+            response = FileResponse(
+                full_path, status_code=status_code, stat_result=stat_result, media_type=media_type,
+            )
+
+        if compressible:
+            response.headers["Vary"] = "Accept-Encoding"
+        if HASHED_NAME_RE.search(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    build_all()
@@ -0,0 +1,118 @@
+"""
+uploads.py - Прием файлов паспортов в API.
+
+Загрузка пишется на диск потоково, кусками по UPLOAD_CHUNK_SIZE (aiofiles),
+с лимитом размера и sha256 на лету — весь файл в память не читается, а
+event loop не блокируется записью. Хэш содержимого — ключ кэша
+распознавания (повторная загрузка того же скана не гоняет OCR заново).
+Имена файлов остаются уникальными на загрузку: cleaner.py удаляет файл
+вместе с прошедшей бронью, общий файл двух броней удалять нельзя.
+
+Лимит проверяется дважды. FastAPI принимает multipart-тело целиком
+(Starlette складывает его во временный файл) еще до вызова эндпоинта,
+поэтому UploadSizeLimitMiddleware отвечает 413 по Content-Length, не
+читая тело. save_upload ограничивает уже сам файл — это нужно для
+запросов без Content-Length (chunked), которые Starlette все равно
+примет полностью.
+
+Конвертация в PNG (PIL / pdf2image) — синхронная, вызывать через
+run_cpu (core/executors.py).
+"""
+import hashlib
+import os
+from typing import Iterable, Optional, Tuple
+
+import aiofiles
+from fastapi import UploadFile
+from fastapi.responses import JSONResponse
+
+# Максимальный размер загружаемого файла (МБ)
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "20"))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 МБ
+# Запас на границы и заголовки частей multipart поверх размера файла
+MULTIPART_OVERHEAD = 64 * 1024
+
+UPLOAD_PATHS = (
+    "/api/passport/parse",
+    "/api/passports/upload",
+)
+
+
+class UploadTooLarge(Exception):
+    """Файл больше MAX_UPLOAD_MB"""
+
+
+def _too_large_message(max_bytes: int) -> str:
+    return f"Файл больше {max_bytes / (1024 * 1024):g} МБ"
+
+
+class UploadSizeLimitMiddleware:
+    """413 по Content-Length для путей загрузки — до приема тела запроса"""
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_BYTES, paths: Iterable[str] = UPLOAD_PATHS):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope.get("path") in self.paths:
+            length = dict(scope.get("headers") or []).get(b"content-length")
+            if length is not None and length.isdigit() and int(length) > self.max_bytes + MULTIPART_OVERHEAD:
+                response = JSONResponse(status_code=413, content={"ok": False, "error": _too_large_message(self.max_bytes)})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+def add_upload_limit(app, **options):
+    """Подключает ранний отказ по размеру загрузки к приложению FastAPI"""
+    app.add_middleware(UploadSizeLimitMiddleware, **options)
+
+
+async def save_upload(
+    file: UploadFile, path: str, max_bytes: int = MAX_UPLOAD_BYTES
+) -> Tuple[int, str]:
+    """
+    Пишет загрузку в path кусками. Возвращает (размер в байтах, sha256 hex).
+    При превышении лимита удаляет недописанный файл и бросает UploadTooLarge.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(_too_large_message(max_bytes))
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return size, digest.hexdigest()
+
+
+def convert_to_png(src_path: str, png_path: str, poppler_path: Optional[str] = None) -> str:
+    """
+    Сохраняет src_path как PNG (для PDF — первая страница). Блокирующая:
+    вызывать через run_cpu.
+    """
+    from PIL import Image
+
+    if src_path.lower().endswith(".pdf"):
+        from pdf2image import convert_from_path
+
+        # Рендерим только первую страницу: многостраничный скан в 300 dpi
+        # целиком не держим в памяти
+        pages = convert_from_path(
+            src_path, dpi=300, poppler_path=poppler_path, first_page=1, last_page=1
+        )
+        if not pages:
+            raise ValueError("PDF без страниц")
+        pages[0].save(png_path, "PNG")
+    else:
+        with Image.open(src_path) as img:
+            img.save(png_path, "PNG")
+    return png_path
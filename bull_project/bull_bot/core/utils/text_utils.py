@@ -0,0 +1,85 @@
+"""
+text_utils.py - Нормализация текста ячеек таблиц (с мемоизацией).
+
+В листе всего несколько десятков разных значений типов комнат, пола и
+заголовков, а allocator нормализует их тысячи раз за одно размещение.
+Функции ниже кэшируют результат (LRU) и интернируют строки, поэтому
+повторная нормализация — это поиск в словаре, а одинаковые значения
+занимают память один раз.
+"""
+import os
+import re
+import sys
+from functools import lru_cache
+from typing import Optional
+
+_SPACES_RX = re.compile(r"\s+")
+
+# Отладочный вывод парсеров и allocator (SHEETS_DEBUG=1).
+# В горячих циклах print оборачивается в `if SHEETS_DEBUG:` — при выключенном
+# флаге f-строки даже не форматируются.
+SHEETS_DEBUG = os.getenv("SHEETS_DEBUG", "").strip().lower() in ("1", "true", "yes", "on")
+
+# Правила распознавания типа комнаты (порядок важен: первое совпадение)
+ROOM_KIND_RULES = (
+    ("quad", ("quad", "4")),
+    ("trpl", ("trip", "trpl", "3")),
+    ("dbl", ("doub", "dbl", "2")),
+    ("sgl", ("sing", "sgl", "1")),
+    ("quin", ("quin", "5")),
+    ("inf", ("inf",)),
+)
+
+# Размер комнаты по тексту (всё нераспознанное — 1 место)
+ROOM_SIZE_RULES = (
+    (4, ("quad", "4")),
+    (3, ("trip", "trpl", "3")),
+    (2, ("doub", "dbl", "2")),
+)
+
+
+def normalize_text(value) -> str:
+    """\\n/\\r -> пробел, strip, lower. Без кэша — для длинных уникальных строк."""
+    return str(value).replace("\n", " ").replace("\r", " ").strip().lower()
+
+
+@lru_cache(maxsize=8192)
+def _normalize_cell_cached(value: str) -> str:
+    return sys.intern(normalize_text(value))
+
+
+def normalize_cell(value) -> str:
+    """То же, что normalize_text, но с кэшем — для значений отдельных ячеек."""
+    return _normalize_cell_cached(value if type(value) is str else str(value))
+
+
+@lru_cache(maxsize=4096)
+def normalize_header_text(value: str) -> str:
+    """Ячейка шапки: любые пробельные символы -> один пробел, strip, lower."""
+    return sys.intern(_SPACES_RX.sub(" ", value).strip().lower())
+
+
+@lru_cache(maxsize=1024)
+def room_kind(value: str) -> Optional[str]:
+    """Код типа комнаты (quad/trpl/dbl/sgl/quin/inf) или None."""
+    t = value.lower().strip()
+    for kind, subs in ROOM_KIND_RULES:
+        if any(s in t for s in subs):
+            return kind
+    return None
+
+
+@lru_cache(maxsize=1024)
+def room_size(value: str) -> int:
+    """Количество мест в комнате по тексту ячейки."""
+    t = normalize_cell(value)
+    for size, subs in ROOM_SIZE_RULES:
+        if any(s in t for s in subs):
+            return size
+    return 1
+
+
+@lru_cache(maxsize=256)
+def gender_code(value: str) -> str:
+    """Пол из ячейки в верхнем регистре ('M', 'F', ... или '')."""
+    return sys.intern(normalize_cell(value).upper())
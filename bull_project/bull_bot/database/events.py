@@ -0,0 +1,73 @@
+"""
+events.py - Уведомления «таблица изменилась» после commit.
+
+Сессия копит имена таблиц, которые трогала запись: ORM-объекты через
+flush (session.add / delete / изменение полей) и ORM DML-выражения
+(insert(Booking) / update(Booking) через session.execute). После commit
+подписчики получают множество таблиц, например {"bookings"}; при
+rollback накопленное сбрасывается.
+
+Подписчик — обычная функция (вызывается синхронно внутри commit, поэтому
+должна быть быстрой и не ходить в БД):
+
+    on_tables_changed(lambda tables: response_cache.invalidate(*tables))
+
+Видны только записи этого процесса: бот пишет в ту же БД из другого
+процесса, поэтому подписчики не заменяют TTL.
+"""
+import logging
+from typing import Callable, List, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_CHANGED_KEY = "changed_tables"
+_listeners: List[Callable[[Set[str]], None]] = []
+
+
+def on_tables_changed(callback: Callable[[Set[str]], None]):
+    """Подписка на изменения таблиц (после успешного commit)"""
+    _listeners.append(callback)
+    return callback
+
+
+def mark_changed(session: Session, *tables: str):
+    """Явно отметить таблицы измененными (для записи в обход ORM)"""
+    session.info.setdefault(_CHANGED_KEY, set()).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session, flush_context):
+    objects = list(session.new) + list(session.dirty) + list(session.deleted)
+    tables = {getattr(obj, "__tablename__", None) for obj in objects}
+    tables.discard(None)
+    if tables:
+        mark_changed(session, *tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_dml(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None:
+        mark_changed(orm_execute_state.session, mapper.local_table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify(session):
+    tables = session.info.pop(_CHANGED_KEY, None)
+    if not tables:
+        return
+    for callback in _listeners:
+        try:
+            callback(set(tables))
+        except Exception as e:
+            logger.warning(f"⚠️ Подписчик изменений {tables} упал: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop(_CHANGED_KEY, None)
@@ -0,0 +1,134 @@
+"""
+migrations.py - Версионированные миграции схемы БД (SQLite/Postgres).
+
+Каждая миграция применяется один раз: её версия записывается в таблицу
+schema_migrations. Новые БД создаются через Base.metadata.create_all, а
+миграции доводят до актуального состояния уже существующие (добавляют
+колонки, индексы и т.д.). Сами шаги миграций идемпотентны — проверяют
+схему через inspector, поэтому на свежей БД просто отмечаются как
+применённые.
+
+Как добавить миграцию: написать функцию (conn) -> None и повесить на неё
+@migration("NNNN_описание") со следующим номером.
+"""
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import BigInteger, Column, Date, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection
+
+from .rollups import backfill_rollups
+from .search import backfill_search_names, install_search_index
+
+logger = logging.getLogger(__name__)
+
+# Отдельные метаданные: служебная таблица не входит в модели приложения
+_meta = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _meta,
+    Column("version", String, primary_key=True),
+    Column("applied_at", DateTime, default=datetime.now),
+)
+
+# Таблица свертки в том виде, в каком её создает миграция 0003 (не модель:
+# BookingDailyStats может меняться дальше, миграция — нет)
+_booking_daily_stats_0003 = Table(
+    "booking_daily_stats",
+    _meta,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("day", Date, nullable=False),
+    Column("manager_id", BigInteger, nullable=True),
+    Column("manager_name_text", String, nullable=True),
+    Column("package_name", String, nullable=True),
+    Column("room_type", String, nullable=True),
+    Column("status", String, nullable=True),
+    Column("count", Integer, nullable=False, default=0),
+)
+
+# Ключ advisory-lock в Postgres, чтобы бот и API не применяли миграции одновременно
+_PG_LOCK_KEY = 7_281_043_110
+
+MIGRATIONS: List[Tuple[str, Callable[[Connection], None]]] = []
+
+
+def migration(version: str):
+    """Регистрирует миграцию (порядок применения = порядок объявления)."""
+    def decorator(fn: Callable[[Connection], None]):
+        MIGRATIONS.append((version, fn))
+        return fn
+    return decorator
+
+
+def _columns(conn: Connection, table: str) -> set:
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+
+@migration("0001_bookings_group_members")
+def _bookings_group_members(conn: Connection):
+    if "group_members" not in _columns(conn, "bookings"):
+        conn.execute(text("ALTER TABLE bookings ADD COLUMN group_members TEXT"))
+
+
+def _create_index(conn: Connection, name: str, table: str, *columns: str):
+    """
+    CREATE INDEX IF NOT EXISTS по явному списку колонок. Миграции не берут
+    индексы из моделей: модель меняется дальше, а миграция — нет (0002 на
+    старой БД не должна строить индекс по колонке, которую добавит 0004).
+    """
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+
+
+@migration("0002_bookings_indexes")
+def _bookings_indexes(conn: Connection):
+    _create_index(conn, "ix_bookings_created_at_status", "bookings", "created_at", "status")
+    _create_index(conn, "ix_bookings_manager_created_at", "bookings", "manager_id", "created_at")
+    _create_index(conn, "ix_bookings_sheet_package", "bookings", "table_id", "sheet_name", "package_name")
+    _create_index(conn, "ix_bookings_sheet_name_package", "bookings", "sheet_name", "package_name")
+
+
+@migration("0003_booking_daily_stats")
+def _booking_daily_stats(conn: Connection):
+    _booking_daily_stats_0003.create(conn, checkfirst=True)
+    _create_index(conn, "ix_booking_daily_stats_day", "booking_daily_stats", "day", "manager_id")
+    backfill_rollups(conn)
+
+
+@migration("0004_bookings_search_name")
+def _bookings_search_name(conn: Connection):
+    if "search_name" not in _columns(conn, "bookings"):
+        conn.execute(text("ALTER TABLE bookings ADD COLUMN search_name VARCHAR"))
+    backfill_search_names(conn)
+    install_search_index(conn)
+
+
+@migration("0005_bookings_duplicate_check_index")
+def _bookings_duplicate_check_index(conn: Connection):
+    _create_index(conn, "ix_bookings_sheet_search_name", "bookings", "table_id", "sheet_name", "search_name")
+
+
+def apply_migrations(conn: Connection) -> List[str]:
+    """Применяет недостающие миграции в текущей транзакции. Возвращает их версии."""
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _PG_LOCK_KEY})
+
+    schema_migrations.create(conn, checkfirst=True)
+    done = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    applied = []
+    for version, fn in MIGRATIONS:
+        if version in done:
+            continue
+        fn(conn)
+        conn.execute(schema_migrations.insert().values(version=version, applied_at=datetime.now()))
+        applied.append(version)
+    return applied
+
+
+async def run_migrations(engine) -> List[str]:
+    async with engine.begin() as conn:
+        applied = await conn.run_sync(apply_migrations)
+    if applied:
+        print(f"✅ Применены миграции БД: {', '.join(applied)}")
+    return applied
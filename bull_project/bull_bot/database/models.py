@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, String, Column, DateTime, Integer, Text, ForeignKey, JSON
+from sqlalchemy import BigInteger, String, Column, Date, DateTime, Integer, Text, ForeignKey, JSON, Index, event
 from sqlalchemy.orm import DeclarativeBase
 from datetime import datetime
 
@@ -30,6 +30,21 @@ class Request4U(Base):
     created_sheet_name = Column(String, nullable=True) 
 
 
+def booking_search_name(last_name, first_name) -> str:
+    """
+    ФИО для поиска: «фамилияимя имяфамилия» — в нижнем регистре, без
+    пробелов внутри ФИО, в обоих порядках (см. database/search.py).
+    """
+    last = "".join((last_name or "").split()).lower()
+    first = "".join((first_name or "").split()).lower()
+    return f"{last}{first} {first}{last}"
+
+
+def _search_name_default(context) -> str:
+    params = context.get_current_parameters()
+    return booking_search_name(params.get("guest_last_name"), params.get("guest_first_name"))
+
+
 class Booking(Base):
     __tablename__ = 'bookings'
 
@@ -77,6 +92,52 @@ class Booking(Base):
     status = Column(String, default="new") # new, cancelled
     created_at = Column(DateTime, default=datetime.now)
 
+    # Нормализованное ФИО для поиска (заполняется само при записи)
+    search_name = Column(String, nullable=True, default=_search_name_default)
+
+    # Индексы под частые фильтры (для существующих БД создаются миграцией 0002)
+    __table_args__ = (
+        # Периоды аналитики/отчётов: диапазон created_at + статус
+        Index("ix_bookings_created_at_status", "created_at", "status"),
+        # История менеджера и его отчёты за период
+        Index("ix_bookings_manager_created_at", "manager_id", "created_at"),
+        # Брони конкретного пакета на листе (проверки дублей, очистка)
+        Index("ix_bookings_sheet_package", "table_id", "sheet_name", "package_name"),
+        Index("ix_bookings_sheet_name_package", "sheet_name", "package_name"),
+        # Проверка дублей группы по нормализованному ФИО (миграция 0005)
+        Index("ix_bookings_sheet_search_name", "table_id", "sheet_name", "search_name"),
+    )
+
+
+@event.listens_for(Booking, "before_update")
+def _refresh_search_name(mapper, connection, booking):
+    """Правка ФИО через ORM пересчитывает search_name"""
+    name = booking_search_name(booking.guest_last_name, booking.guest_first_name)
+    if booking.search_name != name:
+        booking.search_name = name
+
+
+class BookingDailyStats(Base):
+    """
+    Дневная свертка броней для аналитики: количество броней в разрезе
+    (день, менеджер, пакет, тип номера, статус). Обновляется в той же
+    транзакции, что и сама бронь (database/rollups.py).
+    """
+    __tablename__ = 'booking_daily_stats'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    manager_id = Column(BigInteger, nullable=True)
+    manager_name_text = Column(String, nullable=True)
+    package_name = Column(String, nullable=True)
+    room_type = Column(String, nullable=True)
+    status = Column(String, nullable=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_booking_daily_stats_day", "day", "manager_id"),
+    )
+
 
 class AdminSettings(Base):
     __tablename__ = 'admin_settings'
@@ -0,0 +1,119 @@
+"""
+name_index.py - Индекс ФИО в памяти для автодополнения (Отдел Заботы).
+
+Отсортированный массив ключей (нормализованное ФИО, id брони): поиск по
+префиксу — bisect, O(log n + k), без запросов к БД. Для каждой активной
+брони два ключа — «фамилия имя» и «имя фамилия», поэтому подсказки
+находятся по началу и фамилии, и имени.
+
+Индекс грузится при старте API (requests.load_name_index) и обновляется
+хелперами записи броней в этом процессе — после commit их транзакции.
+Брони, записанные другим процессом (бот), подтягиваются периодической
+перезагрузкой (NAME_INDEX_REFRESH секунд).
+"""
+import os
+import time
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NAME_INDEX_REFRESH = int(os.getenv("NAME_INDEX_REFRESH", "300"))
+
+
+def normalize_name(value: str) -> str:
+    """Нижний регистр, пробелы схлопнуты в один"""
+    return " ".join((value or "").lower().split())
+
+
+def _keys(last_name: str, first_name: str) -> Tuple[str, ...]:
+    last, first = normalize_name(last_name), normalize_name(first_name)
+    keys = {f"{last} {first}".strip(), f"{first} {last}".strip()}
+    return tuple(k for k in keys if k)
+
+
+class NamePrefixIndex:
+    """Брони {id: (ФИО, пакет)} + отсортированные ключи [(ключ, id)]"""
+
+    def __init__(self):
+        self._keys: List[Tuple[str, int]] = []
+        self._entries: Dict[int, Tuple[str, Optional[str], Tuple[str, ...]]] = {}
+        self._lock = threading.Lock()
+        self.loaded_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def is_stale(self, max_age: float = NAME_INDEX_REFRESH) -> bool:
+        return self.loaded_at is None or time.time() - self.loaded_at > max_age
+
+    def load(self, rows: Iterable[Tuple[int, str, str, Optional[str]]]):
+        """Полная загрузка: rows = (id, фамилия, имя, пакет)"""
+        entries = {}
+        keys = []
+        for booking_id, last_name, first_name, package_name in rows:
+            entry_keys = _keys(last_name, first_name)
+            entries[booking_id] = (self._display(last_name, first_name), package_name, entry_keys)
+            keys.extend((k, booking_id) for k in entry_keys)
+        keys.sort()
+        with self._lock:
+            self._entries, self._keys = entries, keys
+            self.loaded_at = time.time()
+
+    @staticmethod
+    def _display(last_name: str, first_name: str) -> str:
+        return f"{(last_name or '').strip()} {(first_name or '').strip()}".strip()
+
+    def _remove_locked(self, booking_id: int):
+        entry = self._entries.pop(booking_id, None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            pos = bisect_left(self._keys, (key, booking_id))
+            if pos < len(self._keys) and self._keys[pos] == (key, booking_id):
+                del self._keys[pos]
+
+    def upsert(self, booking_id: int, last_name: str, first_name: str, package_name: Optional[str]):
+        """Добавляет/обновляет бронь (no-op, пока индекс не загружен)"""
+        if not self.loaded:
+            return
+        entry_keys = _keys(last_name, first_name)
+        with self._lock:
+            self._remove_locked(booking_id)
+            self._entries[booking_id] = (self._display(last_name, first_name), package_name, entry_keys)
+            for key in entry_keys:
+                insort(self._keys, (key, booking_id))
+
+    def remove(self, booking_id: int):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._remove_locked(booking_id)
+
+    def search(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """Брони, у которых «фамилия имя» или «имя фамилия» начинается с prefix"""
+        prefix = normalize_name(prefix)
+        if not prefix:
+            return []
+        found = []
+        seen = set()
+        with self._lock:
+            pos = bisect_left(self._keys, (prefix, -1))
+            while pos < len(self._keys) and len(found) < limit:
+                key, booking_id = self._keys[pos]
+                if not key.startswith(prefix):
+                    break
+                pos += 1
+                if booking_id in seen:
+                    continue
+                seen.add(booking_id)
+                name, package_name, _ = self._entries[booking_id]
+                found.append({"id": booking_id, "name": name, "package_name": package_name})
+        return found
+
+
+# Синглтон индекса
+name_index = NamePrefixIndex()
@@ -1,22 +1,34 @@
-from sqlalchemy import select, desc, func, distinct, or_, text
+from sqlalchemy import select, desc, func, distinct, and_, text, insert, update, tuple_, event
+from sqlalchemy.orm import Session
+import asyncio
+from collections import Counter
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from .models import User, Booking, Request4U, AdminSettings, ApprovalRequest
-from .setup import async_session, engine
+from .models import User, Booking, Request4U, AdminSettings, ApprovalRequest, booking_search_name
+from .setup import async_session, read_session, engine, ensure_schema
+from .rollups import ROLLUP_FIELDS, bump_rollup, move_rollup, rollup_key, rollup_period_stmt
+from .search import search_backend, search_stmt
+from .name_index import name_index
+from .uow import in_unit_of_work
 
  
-async def ensure_group_members_column():
+def _as_day(value):
+    """date | datetime | 'YYYY-MM-DD' -> date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    return value
+
+def _created_in_period(start_date, end_date):
     """
-    Мягко добавляем колонку group_members, если ее еще нет (SQLite/Postgres).
-    Ошибки игнорируем, чтобы не падать при повторном вызове.
+    Брони, созданные в дни [start_date, end_date] включительно.
+    Полуинтервал по самому created_at (а не func.date(created_at)), чтобы
+    работали индексы по created_at.
     """
-    try:
-        async with engine.begin() as conn:
-            await conn.execute(text("ALTER TABLE bookings ADD COLUMN group_members TEXT"))
-            print("✅ Колонка group_members добавлена")
-    except Exception as e:
-        # Уже есть или нет прав — тихо игнорируем
-        print(f"ℹ️ Колонка group_members уже существует или нет прав: {type(e).__name__}")
-        pass
+    start = datetime.combine(_as_day(start_date), datetime.min.time())
+    end = datetime.combine(_as_day(end_date) + timedelta(days=1), datetime.min.time())
+    return and_(Booking.created_at >= start, Booking.created_at < end)
 
 async def check_group_members_column_exists():
     """Проверяет, существует ли колонка group_members в таблице bookings"""
@@ -36,10 +48,26 @@ async def check_group_members_column_exists():
         print(f"⚠️ Не удалось проверить колонку group_members: {type(e).__name__}")
         return False
 
+@asynccontextmanager
+async def _session_scope(session=None):
+    """Сессия хелпера: переданная (unit of work, см. database/uow.py) или своя короткая"""
+    if session is not None:
+        yield session
+        return
+    async with async_session() as own:
+        yield own
+
+async def _commit(session):
+    """В unit of work только flush — фиксирует транзакцию владелец сессии"""
+    if in_unit_of_work(session):
+        await session.flush()
+    else:
+        await session.commit()
+
 # === ПОЛЬЗОВАТЕЛИ ===
 
-async def add_user(tg_id: int, full_name: str, username: str, role: str = "manager"):
-    async with async_session() as session:
+async def add_user(tg_id: int, full_name: str, username: str, role: str = "manager", session=None):
+    async with _session_scope(session) as session:
         # Проверяем, есть ли уже такой
         user = await session.scalar(select(User).where(User.telegram_id == tg_id))
         if user:
@@ -49,16 +77,16 @@ async def add_user(tg_id: int, full_name: str, username: str, role: str = "manag
         else:
             # Если нет - создаем
             session.add(User(telegram_id=tg_id, full_name=full_name, username=username, role=role))
-        await session.commit()
+        await _commit(session)
 
 
-async def get_user_by_id(tg_id: int):
-    async with async_session() as session:
+async def get_user_by_id(tg_id: int, session=None):
+    async with _session_scope(session) as session:
         user = await session.scalar(select(User).where(User.telegram_id == tg_id))
         return user # Возвращаем весь объект (user.full_name, user.role)
 
-async def get_user_role(tg_id: int):
-    async with async_session() as session:
+async def get_user_role(tg_id: int, session=None):
+    async with _session_scope(session) as session:
         user = await session.scalar(select(User).where(User.telegram_id == tg_id))
         return user.role if user else None
 
@@ -96,8 +124,8 @@ async def set_admin_settings(admin_id: int, notify_new: bool = None, notify_canc
         await session.commit()
 
 # === APPROVAL REQUESTS ===
-async def create_approval_request(booking_id: int, request_type: str, initiator_id: int, comment: str = None) -> int:
-    async with async_session() as session:
+async def create_approval_request(booking_id: int, request_type: str, initiator_id: int, comment: str = None, session=None) -> int:
+    async with _session_scope(session) as session:
         req = ApprovalRequest(
             booking_id=booking_id,
             request_type=request_type,
@@ -106,39 +134,58 @@ async def create_approval_request(booking_id: int, request_type: str, initiator_
             comment=comment
         )
         session.add(req)
-        await session.commit()
+        await _commit(session)
         await session.refresh(req)
         return req.id
 
-async def update_approval_status(request_id: int, status: str):
-    async with async_session() as session:
+async def update_approval_status(request_id: int, status: str, session=None):
+    async with _session_scope(session) as session:
         req = await session.get(ApprovalRequest, request_id)
         if req:
             req.status = status
-            await session.commit()
+            await _commit(session)
 
 async def get_pending_requests():
-    await ensure_group_members_column()
+    await ensure_schema()
     async with async_session() as session:
         query = select(ApprovalRequest).where(ApprovalRequest.status == "pending").order_by(desc(ApprovalRequest.created_at))
         result = await session.scalars(query)
         return result.all()
 
-async def booking_exists(table_id: str, sheet_name: str, last_name: str, first_name: str):
-    """Проверяем, есть ли уже активная бронь с тем же ФИО на этом листе"""
-    async with async_session() as session:
-        stmt = select(func.count(Booking.id)).where(
+async def get_pending_requests_with_bookings(session=None):
+    """Ожидающие заявки вместе с их бронями одним JOIN: [(ApprovalRequest, Booking)]"""
+    await ensure_schema()
+    async with _session_scope(session) as session:
+        query = (
+            select(ApprovalRequest, Booking)
+            .join(Booking, Booking.id == ApprovalRequest.booking_id)
+            .where(ApprovalRequest.status == "pending")
+            .order_by(desc(ApprovalRequest.created_at))
+        )
+        result = await session.execute(query)
+        return result.all()
+
+async def find_existing_bookings(table_id: str, sheet_name: str, people, session=None) -> set:
+    """
+    Проверка дублей для всей группы одним запросом: какие из people
+    [(фамилия, имя), ...] уже имеют активную бронь на этом листе.
+    Сравнение по нормализованному ФИО (search_name, индекс
+    ix_bookings_sheet_search_name). Возвращает множество search_name.
+    """
+    names = {booking_search_name(last, first) for last, first in people}
+    if not names:
+        return set()
+    async with _session_scope(session) as session:
+        stmt = select(Booking.search_name).where(
             Booking.table_id == table_id,
             Booking.sheet_name == sheet_name,
-            func.lower(Booking.guest_last_name) == func.lower(last_name),
-            func.lower(Booking.guest_first_name) == func.lower(first_name),
+            Booking.search_name.in_(names),
             Booking.status.notin_(('cancelled', 'rescheduled'))
-        )
-        cnt = await session.scalar(stmt)
-        return (cnt or 0) > 0
+        ).distinct()
+        return set((await session.scalars(stmt)).all())
 
-async def get_approval_request(req_id: int):
-    async with async_session() as session:
+async def get_approval_request(req_id: int, session=None):
+    async with _session_scope(session) as session:
         return await session.get(ApprovalRequest, req_id)
 
 async def delete_user(tg_id: int):
@@ -150,9 +197,9 @@ async def delete_user(tg_id: int):
 
 # === БРОНИРОВАНИЯ (ЗАПИСЬ) ===
 
-async def add_booking_to_db(data: dict, manager_id: int):
+async def add_booking_to_db(data: dict, manager_id: int, session=None):
     """Принимает словарь полей и создает запись Booking"""
-    await ensure_group_members_column()
+    await ensure_schema()
 
     print(f"\n💾 add_booking_to_db вызвана:")
     print(f"   manager_id: {manager_id}")
@@ -161,12 +208,16 @@ async def add_booking_to_db(data: dict, manager_id: int):
         print(f"   group_members: {data['group_members']}")
 
     try:
-        async with async_session() as session:
+        async with _session_scope(session) as session:
             # manager_id берется отдельно, остальные поля из словаря
             booking = Booking(manager_id=manager_id, **data)
             session.add(booking)
-            await session.commit()
+            await session.flush()
+            # Дневная свертка для аналитики — в той же транзакции
+            await bump_rollup(session, rollup_key(booking), +1)
+            await _commit(session)
             await session.refresh(booking)
+            _index_booking(booking, session)
             print(f"   ✅ Запись сохранена с ID: {booking.id}")
             return booking.id
     except Exception as e:
@@ -177,66 +228,132 @@ async def add_booking_to_db(data: dict, manager_id: int):
         traceback.print_exc()
         raise  # Пробрасываем ошибку дальше
 
-async def delete_bookings_by_ids(ids: list[int]):
+async def add_bookings_bulk(records: list[dict], manager_id: int, session=None) -> list[int]:
+    """
+    Создает брони всей группы одной транзакцией (INSERT ... RETURNING).
+    Возвращает id в порядке records. Если упала хоть одна запись — не
+    сохраняется ни одна.
+    """
+    if not records:
+        return []
+    await ensure_schema()
+
+    print(f"\n💾 add_bookings_bulk: {len(records)} записей, manager_id: {manager_id}")
+
+    # Одно время создания на всю группу — и для created_at, и для свертки
+    now = datetime.now()
+    rows = [{"manager_id": manager_id, "created_at": now, **data} for data in records]
+    stmt = insert(Booking).returning(
+        Booking.id,
+        Booking.created_at,
+        *(getattr(Booking, f) for f in ROLLUP_FIELDS),
+        sort_by_parameter_order=True,
+    )
+    try:
+        async with _session_scope(session) as session:
+            result = (await session.execute(stmt, rows)).all()
+            # Дневная свертка: по одному UPDATE на группу, а не на каждую бронь
+            deltas = Counter(
+                (created_at.date(), *values) for _, created_at, *values in result if created_at
+            )
+            for key, delta in deltas.items():
+                await bump_rollup(session, key, delta)
+            await _commit(session)
+            for data, row in zip(records, result):
+                _index_entry(session, row.id, row.status, data.get("guest_last_name"),
+                             data.get("guest_first_name"), data.get("package_name"))
+    except Exception as e:
+        print(f"❌ ОШИБКА в add_bookings_bulk: {type(e).__name__}: {e}")
+        import traceback
+        traceback.print_exc()
+        raise
+
+    ids = [row[0] for row in result]
+    print(f"   ✅ Записи сохранены с ID: {ids}")
+    return ids
+
+async def delete_bookings_by_ids(ids: list[int], session=None):
     """Удаляет брони по списку id (используется для отката при ошибках)"""
     if not ids:
         return
-    async with async_session() as session:
+    async with _session_scope(session) as session:
         stmt = select(Booking).where(Booking.id.in_(ids))
         bookings = (await session.scalars(stmt)).all()
         for b in bookings:
+            await bump_rollup(session, rollup_key(b), -1)
             await session.delete(b)
-        await session.commit()
+        await _commit(session)
+        for bid in ids:
+            _index_entry(session, bid, None)
 
-async def update_booking_row(booking_id: int, row_num: int):
+async def update_booking_row(booking_id: int, row_num: int, session=None):
     """Обновляет номер строки после записи в Google"""
-    async with async_session() as session:
+    async with _session_scope(session) as session:
         b = await session.get(Booking, booking_id)
         if b:
             b.sheet_row_number = row_num
-            await session.commit()
+            await _commit(session)
+
+async def update_booking_rows_bulk(rows: dict[int, int], session=None):
+    """Проставляет номера строк {booking_id: row_num} одним executemany UPDATE"""
+    if not rows:
+        return
+    params = [{"id": bid, "sheet_row_number": row_num} for bid, row_num in rows.items()]
+    async with _session_scope(session) as session:
+        await session.execute(update(Booking), params)
+        await _commit(session)
 
-async def mark_booking_cancelled(booking_id: int):
+async def mark_booking_cancelled(booking_id: int, session=None):
     """Помечает бронь как отмененную"""
-    async with async_session() as session:
+    async with _session_scope(session) as session:
         b = await session.get(Booking, booking_id)
         if b:
+            before = rollup_key(b)
             b.status = 'cancelled'
-            await session.commit()
+            await move_rollup(session, before, rollup_key(b))
+            await _commit(session)
+            _index_booking(b, session)
 
-async def mark_booking_rescheduled(booking_id: int, comment: str = None):
+async def mark_booking_rescheduled(booking_id: int, comment: str = None, session=None):
     """Помечает бронь как перенесенную"""
-    async with async_session() as session:
+    async with _session_scope(session) as session:
         b = await session.get(Booking, booking_id)
         if b:
+            before = rollup_key(b)
             b.status = 'rescheduled'
             if comment:
                 b.comment = comment
-            await session.commit()
+            await move_rollup(session, before, rollup_key(b))
+            await _commit(session)
+            _index_booking(b, session)
 
-async def update_booking_fields(booking_id: int, fields: dict):
+async def update_booking_fields(booking_id: int, fields: dict, session=None):
     """Обновляет указанные поля брони"""
-    async with async_session() as session:
+    async with _session_scope(session) as session:
         b = await session.get(Booking, booking_id)
         if b:
+            before = rollup_key(b)
             for key, value in fields.items():
                 if hasattr(b, key):
                     setattr(b, key, value)
-            await session.commit()
+            # Смена пакета/типа номера/статуса переносит бронь в другую группу свертки
+            await move_rollup(session, before, rollup_key(b))
+            await _commit(session)
+            _index_booking(b, session)
 
-async def update_booking_passport_path(booking_id: int, passport_path: str):
+async def update_booking_passport_path(booking_id: int, passport_path: str, session=None):
     """Обновляет путь к файлу паспорта"""
-    async with async_session() as session:
+    async with _session_scope(session) as session:
         b = await session.get(Booking, booking_id)
         if b:
             b.passport_image_path = passport_path
-            await session.commit()
+            await _commit(session)
 
 # === ИСТОРИЯ И ПОИСК ===
 
 async def get_manager_packages(manager_id: int):
     """Возвращает список уникальных названий пакетов, которые продал менеджер"""
-    async with async_session() as session:
+    async with read_session() as session:
         # Select distinct package_name
         stmt = select(distinct(Booking.package_name)).where(
             Booking.manager_id == manager_id,
@@ -248,7 +365,7 @@ async def get_manager_packages(manager_id: int):
 
 async def get_bookings_in_package(manager_id: int, pkg_name: str):
     """Возвращает всех туристов менеджера в конкретном пакете"""
-    async with async_session() as session:
+    async with read_session() as session:
         query = select(Booking).where(
             Booking.manager_id == manager_id,
             Booking.package_name == pkg_name,
@@ -257,13 +374,13 @@ async def get_bookings_in_package(manager_id: int, pkg_name: str):
         result = await session.scalars(query)
         return result.all()
 
-async def get_booking_by_id(bid: int):
-    async with async_session() as session:
+async def get_booking_by_id(bid: int, session=None):
+    async with _session_scope(session) as session:
         return await session.get(Booking, bid)
 
 async def get_all_bookings_for_manager(manager_id: int):
     """Возвращает все брони менеджера, включая отмененные."""
-    async with async_session() as session:
+    async with read_session() as session:
         query = select(Booking).where(
             Booking.manager_id == manager_id
         ).order_by(desc(Booking.created_at))
@@ -272,44 +389,91 @@ async def get_all_bookings_for_manager(manager_id: int):
 
 async def get_recent_bookings(limit: int = 30):
     """Возвращает последние N броней всех менеджеров (для демо-режима)."""
-    async with async_session() as session:
+    async with read_session() as session:
         query = select(Booking).order_by(desc(Booking.created_at)).limit(limit)
         result = await session.scalars(query)
         return result.all()
 
-async def search_tourist_by_name(query_str: str):
-    """Поиск для Отдела Заботы"""
-    async with async_session() as session:
-        clean_query = " ".join((query_str or "").strip().split())
-        if not clean_query:
-            return []
+_NAME_INDEX_KEY = "name_index_updates"
 
-        flex_search = f"%{'%'.join(clean_query.split())}%"
-        compact_search = f"%{clean_query.replace(' ', '')}%"
-
-        last = func.coalesce(Booking.guest_last_name, "")
-        first = func.coalesce(Booking.guest_first_name, "")
-        full_name = func.trim(func.concat(last, " ", first))
-        full_name_rev = func.trim(func.concat(first, " ", last))
-
-        stmt = select(Booking).where(
-            Booking.status.notin_(('cancelled', 'rescheduled')),
-            or_(
-                Booking.guest_last_name.ilike(flex_search),
-                Booking.guest_first_name.ilike(flex_search),
-                full_name.ilike(flex_search),
-                full_name_rev.ilike(flex_search),
-                func.replace(full_name, " ", "").ilike(compact_search),
-                func.replace(full_name_rev, " ", "").ilike(compact_search),
-            )
-        ).order_by(desc(Booking.created_at)).limit(10)
+def _index_booking(b: Booking, session=None):
+    """Синхронизирует бронь с индексом автодополнения (отмененные убираются)"""
+    _index_entry(session, b.id, b.status, b.guest_last_name, b.guest_first_name, b.package_name)
 
+def _index_entry(session, booking_id: int, status, last_name=None, first_name=None, package_name=None):
+    """
+    Обновление индекса имен. В unit of work оно откладывается до commit
+    сессии (при rollback отбрасывается), иначе применяется сразу — своя
+    сессия хелпера к этому моменту уже зафиксирована.
+    """
+    entry = (last_name, first_name, package_name) if _is_active(status) else None
+    if session is not None and in_unit_of_work(session):
+        session.info.setdefault(_NAME_INDEX_KEY, {})[booking_id] = entry
+    else:
+        _apply_name_index({booking_id: entry})
+
+def _apply_name_index(entries: dict):
+    for booking_id, entry in entries.items():
+        if entry is None:
+            name_index.remove(booking_id)
+        else:
+            name_index.upsert(booking_id, *entry)
+
+@event.listens_for(Session, "after_commit")
+def _commit_name_index(session):
+    entries = session.info.pop(_NAME_INDEX_KEY, None)
+    if entries:
+        _apply_name_index(entries)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_name_index(session):
+    session.info.pop(_NAME_INDEX_KEY, None)
+
+async def load_name_index() -> int:
+    """(Пере)загружает индекс автодополнения из активных броней"""
+    async with read_session() as session:
+        rows = (await session.execute(
+            select(Booking.id, Booking.guest_last_name, Booking.guest_first_name, Booking.package_name)
+            .where(Booking.status.notin_(('cancelled', 'rescheduled')))
+        )).all()
+    name_index.load(rows)
+    return len(name_index)
+
+_name_index_refresh = None
+
+async def autocomplete_tourist_names(prefix: str, limit: int = 10):
+    """Подсказки [{id, name, package_name}] по началу ФИО, из индекса в памяти"""
+    global _name_index_refresh
+    if not name_index.loaded:
+        await load_name_index()
+    elif name_index.is_stale() and (_name_index_refresh is None or _name_index_refresh.done()):
+        # Брони из бота подтягиваем в фоне, подсказки отдаем из текущего индекса
+        _name_index_refresh = asyncio.create_task(load_name_index())
+    return name_index.search(prefix, limit)
+
+_search_backend = None
+
+async def _get_search_backend() -> str:
+    """Какой индекс поиска по ФИО есть в БД (определяется один раз за процесс)"""
+    global _search_backend
+    if _search_backend is None:
+        await ensure_schema()
+        async with engine.connect() as conn:
+            _search_backend = await conn.run_sync(search_backend)
+    return _search_backend
+
+async def search_tourist_by_name(query_str: str, limit: int = 10):
+    """Поиск для Отдела Заботы (по индексированному search_name, лучшие совпадения первыми)"""
+    stmt = search_stmt(await _get_search_backend(), query_str, limit)
+    if stmt is None:
+        return []
+    async with read_session() as session:
         result = await session.scalars(stmt)
         return result.all()
 
 async def get_latest_passport_for_person(last_name: str, first_name: str):
     """Возвращает самый свежий путь к паспорту для паломника по ФИО."""
-    async with async_session() as session:
+    async with read_session() as session:
         stmt = (
             select(Booking.passport_image_path)
             .where(
@@ -324,9 +488,50 @@ async def get_latest_passport_for_person(last_name: str, first_name: str):
         res = await session.scalar(stmt)
         return res
 
+# Сколько пар ФИО отправлять в одном IN (лимит параметров SQLite/asyncpg)
+_PASSPORT_BATCH = 500
+
+async def get_latest_passports_for_people(names) -> dict:
+    """
+    Пакетный get_latest_passport_for_person: {(фамилия, имя): путь} для
+    всех пар сразу. Самое свежее фото на каждое ФИО выбирается оконной
+    функцией, так что на пачку ФИО — один запрос.
+    """
+    pairs = list(dict.fromkeys((ln, fn) for ln, fn in names if ln and fn))
+    found = {}
+    if not pairs:
+        return found
+    async with read_session() as session:
+        for i in range(0, len(pairs), _PASSPORT_BATCH):
+            chunk = pairs[i:i + _PASSPORT_BATCH]
+            rank = func.row_number().over(
+                partition_by=(Booking.guest_last_name, Booking.guest_first_name),
+                order_by=desc(Booking.created_at),
+            ).label("rank")
+            ranked = (
+                select(
+                    Booking.guest_last_name,
+                    Booking.guest_first_name,
+                    Booking.passport_image_path,
+                    rank,
+                )
+                .where(
+                    tuple_(Booking.guest_last_name, Booking.guest_first_name).in_(chunk),
+                    Booking.passport_image_path.isnot(None),
+                    Booking.status.notin_(('cancelled', 'rescheduled'))
+                )
+                .subquery()
+            )
+            stmt = select(
+                ranked.c.guest_last_name, ranked.c.guest_first_name, ranked.c.passport_image_path
+            ).where(ranked.c.rank == 1)
+            for ln, fn, path in (await session.execute(stmt)).all():
+                found[(ln, fn)] = path
+    return found
+
 async def get_db_packages_list(sheet_id: str, sheet_name: str):
     """Для Отдела Заботы: список пакетов на конкретной дате"""
-    async with async_session() as session:
+    async with read_session() as session:
         # Ищем уникальные пакеты в базе, у которых совпадает table_id и sheet_name
         stmt = select(distinct(Booking.package_name)).where(
             Booking.table_id == sheet_id,
@@ -349,7 +554,7 @@ async def get_all_bookings_in_package(sheet_id: str, sheet_name: str, pkg_name:
     print(f"   sheet_name: '{sheet_name}' (длина: {len(sheet_name)})")
     print(f"   pkg_name: '{pkg_name}'")
 
-    async with async_session() as session:
+    async with read_session() as session:
         query = select(Booking).where(
             Booking.table_id == sheet_id,
             Booking.sheet_name == sheet_name,
@@ -365,12 +570,12 @@ async def get_all_bookings_in_package(sheet_id: str, sheet_name: str, pkg_name:
 # === ОТЧЕТЫ (Admin) ===
 
 async def get_manager_bookings_by_period(manager_id: int, period: str):
-    async with async_session() as session:
+    async with read_session() as session:
         query = select(Booking).where(Booking.manager_id == manager_id, Booking.status.notin_(('cancelled', 'rescheduled')))
         now = datetime.now()
 
         if period == 'today':
-            query = query.where(func.date(Booking.created_at) == now.date())
+            query = query.where(_created_in_period(now, now))
         elif period == 'week':
             query = query.where(Booking.created_at >= now - timedelta(days=7))
         elif period == 'month':
@@ -380,7 +585,7 @@ async def get_manager_bookings_by_period(manager_id: int, period: str):
         return result.all()
 
 async def get_bookings_by_package_full(sheet_name: str, pkg_name: str):
-    async with async_session() as session:
+    async with read_session() as session:
         query = select(Booking).where(
             Booking.sheet_name == sheet_name,
             Booking.package_name == pkg_name,
@@ -416,35 +621,34 @@ async def close_4u_request(rid):
 
 # === RNP ===
 async def get_rnp_by_specific_date(date_obj):
-    async with async_session() as session:
-        return await session.scalar(select(func.count(Booking.id)).where(func.date(Booking.created_at) == date_obj, Booking.status.notin_(('cancelled', 'rescheduled')))) or 0
+    async with read_session() as session:
+        return await session.scalar(select(func.count(Booking.id)).where(_created_in_period(date_obj, date_obj), Booking.status.notin_(('cancelled', 'rescheduled')))) or 0
 
 async def get_rnp_by_date_range(d1, d2):
-    async with async_session() as session:
-        return await session.scalar(select(func.count(Booking.id)).where(func.date(Booking.created_at) >= d1, func.date(Booking.created_at) <= d2, Booking.status.notin_(('cancelled', 'rescheduled')))) or 0
+    async with read_session() as session:
+        return await session.scalar(select(func.count(Booking.id)).where(_created_in_period(d1, d2), Booking.status.notin_(('cancelled', 'rescheduled')))) or 0
 
 async def get_sales_dynamics_stats(days=10):
-    async with async_session() as session:
+    async with read_session() as session:
         start = datetime.now().date() - timedelta(days=days)
-        stmt = select(func.date(Booking.created_at).label('d'), func.count(Booking.id)).where(Booking.status.notin_(('cancelled', 'rescheduled')), func.date(Booking.created_at) >= start).group_by('d').order_by('d')
+        stmt = select(func.date(Booking.created_at).label('d'), func.count(Booking.id)).where(Booking.status.notin_(('cancelled', 'rescheduled')), Booking.created_at >= datetime.combine(start, datetime.min.time())).group_by('d').order_by('d')
         res = await session.execute(stmt)
         return res.all()
 
 async def get_all_bookings_by_period(start_date, end_date):
     """Все брони всех менеджеров за период"""
-    async with async_session() as session:
+    async with read_session() as session:
         query = select(Booking).where(
             Booking.status.notin_(('cancelled', 'rescheduled')),
-            func.date(Booking.created_at) >= start_date,
-            func.date(Booking.created_at) <= end_date
+            _created_in_period(start_date, end_date)
         ).order_by(desc(Booking.created_at))
         result = await session.scalars(query)
         return result.all()
 
 async def get_last_n_bookings_by_manager(manager_id: int, limit=10, include_cancelled: bool = False):
     """Последние N броней менеджера (по умолчанию без отменённых)."""
-    await ensure_group_members_column()
-    async with async_session() as session:
+    await ensure_schema()
+    async with read_session() as session:
         query = select(Booking).where(Booking.manager_id == manager_id)
         if not include_cancelled:
             query = query.where(Booking.status.notin_(('cancelled', 'rescheduled')))
@@ -466,56 +670,19 @@ async def get_detailed_stats_by_period(start_date, end_date):
     2. Топ 10 пакетов (ИЗМЕНИЛИ ЛИМИТ)
     3. Статистика по каждому менеджеру
     """
-    async with async_session() as session:
-        # 1. Общее
-        total = await session.scalar(
-            select(func.count(Booking.id)).where(
-                Booking.status.notin_(('cancelled', 'rescheduled')),
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date
-            )
-        ) or 0
-
-        # 2. Топ 10 Пакетов (LIMIT 10)
-        top_pkg_stmt = (
-            select(Booking.package_name, func.count(Booking.id).label('cnt'))
-            .where(
-                Booking.status.notin_(('cancelled', 'rescheduled')),
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date
-            )
-            .group_by(Booking.package_name)
-            .order_by(desc('cnt'))
-            .limit(10) # <--- БЫЛО 3, СТАЛО 10
-        )
-        top_pkgs = (await session.execute(top_pkg_stmt)).all()
-
-        # 3. Менеджеры
-        man_stmt = (
-            select(Booking.manager_name_text, func.count(Booking.id).label('cnt'))
-            .where(
-                Booking.status.notin_(('cancelled', 'rescheduled')),
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date
-            )
-            .group_by(Booking.manager_name_text)
-            .order_by(desc('cnt'))
-        )
-        managers_stat = (await session.execute(man_stmt)).all()
-
-        return {
-            "total": total,
-            "top_packages": top_pkgs,
-            "managers": managers_stat
-        }
+    stats = await get_period_stats(start_date, end_date)
+    return {
+        "total": stats["total_active"],
+        "top_packages": stats["top_packages"][:10],  # <--- БЫЛО 3, СТАЛО 10
+        "managers": stats["managers_active"],
+    }
 
 async def get_bookings_by_manager_date_range(manager_id: int, start_date, end_date):
-    async with async_session() as session:
+    async with read_session() as session:
         query = select(Booking).where(
             Booking.manager_id == manager_id,
             Booking.status.notin_(('cancelled', 'rescheduled')),
-            func.date(Booking.created_at) >= start_date,
-            func.date(Booking.created_at) <= end_date
+            _created_in_period(start_date, end_date)
         ).order_by(desc(Booking.created_at))
 
         result = await session.scalars(query)
@@ -535,6 +702,56 @@ async def update_4u_status(req_id: int, status: str, sheet_name: str = None):
 
 # === РАСШИРЕННАЯ АНАЛИТИКА ДЛЯ АДМИН WEBAPP ===
 
+INACTIVE_STATUSES = ('cancelled', 'rescheduled')
+
+def _is_active(status) -> bool:
+    # Как status NOT IN (...) в SQL: NULL не считается активной бронью
+    return status is not None and status not in INACTIVE_STATUSES
+
+def fold_period_rows(rows) -> dict:
+    """
+    Сворачивает сгруппированные строки периода
+    (day, manager_name, package_name, room_type, status, count)
+    во все срезы аналитики за один проход.
+    """
+    total_active = total_cancelled = 0
+    packages, rooms, daily = Counter(), Counter(), Counter()
+    managers_total, managers_active, managers_cancelled = Counter(), Counter(), Counter()
+
+    for day, manager_name, package_name, room_type, status, cnt in rows:
+        managers_total[manager_name] += cnt
+        if status == 'cancelled':
+            total_cancelled += cnt
+            managers_cancelled[manager_name] += cnt
+        if not _is_active(status):
+            continue
+        total_active += cnt
+        packages[package_name] += cnt
+        rooms[room_type] += cnt
+        managers_active[manager_name] += cnt
+        daily[str(day)] += cnt
+
+    return {
+        "total_active": total_active,
+        "total_cancelled": total_cancelled,
+        "top_packages": packages.most_common(),
+        "popular_rooms": rooms.most_common(),
+        "managers_active": managers_active.most_common(),
+        "managers_rating": [(name, total, managers_cancelled[name]) for name, total in managers_total.most_common()],
+        "daily_dynamics": sorted(daily.items()),
+    }
+
+async def get_period_stats(start_date, end_date) -> dict:
+    """
+    Все агрегаты периода одним запросом к дневной свертке booking_daily_stats
+    (O(дней), а не O(броней)), см. fold_period_rows и database/rollups.py
+    """
+    await ensure_schema()
+    stmt = rollup_period_stmt(_as_day(start_date), _as_day(end_date))
+    async with read_session() as session:
+        rows = (await session.execute(stmt)).all()
+    return fold_period_rows(rows)
+
 async def get_full_analytics(start_date, end_date):
     """
     Полная аналитика для админ панели:
@@ -544,103 +761,28 @@ async def get_full_analytics(start_date, end_date):
     - Статистика отмен
     - Самые популярные направления
     """
-    async with async_session() as session:
-        # 1. Общая статистика
-        total_bookings = await session.scalar(
-            select(func.count(Booking.id)).where(
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date,
-                Booking.status.notin_(('cancelled', 'rescheduled'))
-            )
-        ) or 0
-
-        total_cancelled = await session.scalar(
-            select(func.count(Booking.id)).where(
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date,
-                Booking.status == 'cancelled'
-            )
-        ) or 0
-        
-        top_packages_stmt = (
-            select(Booking.package_name, func.count(Booking.id).label('cnt'))
-            .where(
-                Booking.status.notin_(('cancelled', 'rescheduled')),
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date
-            )
-            .group_by(Booking.package_name)
-            .order_by(desc('cnt'))
-        )
-        top_packages = (await session.execute(top_packages_stmt)).all()
-
-        # 3. Рейтинг менеджеров
-        from sqlalchemy import case
-        managers_stmt = (
-            select(
-                Booking.manager_name_text,
-                func.count(Booking.id).label('total'),
-                func.sum(
-                    case((Booking.status == 'cancelled', 1), else_=0)
-                ).label('cancelled_count')
-            )
-            .where(
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date
-            )
-            .group_by(Booking.manager_name_text)
-            .order_by(desc('total'))
-        )
-        managers_rating = (await session.execute(managers_stmt)).all()
-
-        # 4. Популярные типы номеров
-        rooms_stmt = (
-            select(Booking.room_type, func.count(Booking.id).label('cnt'))
-            .where(
-                Booking.status.notin_(('cancelled', 'rescheduled')),
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date
-            )
-            .group_by(Booking.room_type)
-            .order_by(desc('cnt'))
-        )
-        popular_rooms = (await session.execute(rooms_stmt)).all()
-
-        # 5. Дневная динамика
-        daily_stmt = (
-            select(
-                func.date(Booking.created_at).label('date'),
-                func.count(Booking.id).label('count')
-            )
-            .where(
-                Booking.status.notin_(('cancelled', 'rescheduled')),
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date
-            )
-            .group_by('date')
-            .order_by('date')
-        )
-        daily_dynamics = (await session.execute(daily_stmt)).all()
-
-        return {
-            "total_bookings": total_bookings,
-            "total_cancelled": total_cancelled,
-            "cancellation_rate": round((total_cancelled / (total_bookings + total_cancelled) * 100), 2) if (total_bookings + total_cancelled) > 0 else 0,
-            "top_packages": [(name, cnt) for name, cnt in top_packages],
-            "managers_rating": [(name, total, cancelled or 0) for name, total, cancelled in managers_rating],
-            "popular_rooms": [(room, cnt) for room, cnt in popular_rooms],
-            "daily_dynamics": [(str(date), cnt) for date, cnt in daily_dynamics]
-        }
+    stats = await get_period_stats(start_date, end_date)
+    total_bookings = stats["total_active"]
+    total_cancelled = stats["total_cancelled"]
+
+    return {
+        "total_bookings": total_bookings,
+        "total_cancelled": total_cancelled,
+        "cancellation_rate": round((total_cancelled / (total_bookings + total_cancelled) * 100), 2) if (total_bookings + total_cancelled) > 0 else 0,
+        "top_packages": stats["top_packages"],
+        "managers_rating": stats["managers_rating"],
+        "popular_rooms": stats["popular_rooms"],
+        "daily_dynamics": stats["daily_dynamics"]
+    }
 
 async def get_manager_detailed_stats(manager_id: int, start_date, end_date):
     """Детальная статистика по конкретному менеджеру"""
-    async with async_session() as session:
+    async with read_session() as session:
         # Все брони
         bookings = await session.scalars(
             select(Booking).where(
                 Booking.manager_id == manager_id,
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date
+                _created_in_period(start_date, end_date)
             ).order_by(desc(Booking.created_at))
         )
         all_bookings = bookings.all()
@@ -652,32 +794,21 @@ async def get_manager_detailed_stats(manager_id: int, start_date, end_date):
         # Перенесенные
         rescheduled_count = sum(1 for b in all_bookings if b.status == 'rescheduled')
 
-        # ТОП пакетов этого менеджера
-        top_packages_stmt = (
-            select(Booking.package_name, func.count(Booking.id).label('cnt'))
-            .where(
-                Booking.manager_id == manager_id,
-                Booking.status.notin_(('cancelled', 'rescheduled')),
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date
-            )
-            .group_by(Booking.package_name)
-            .order_by(desc('cnt'))
-        )
-        manager_top_packages = (await session.execute(top_packages_stmt)).all()
+        # ТОП пакетов этого менеджера (по уже загруженным броням, без второго запроса)
+        manager_top_packages = Counter(b.package_name for b in all_bookings if _is_active(b.status)).most_common()
 
         return {
             "total": len(all_bookings),
             "active": active_count,
             "cancelled": cancelled_count,
             "rescheduled": rescheduled_count,
-            "top_packages": [(name, cnt) for name, cnt in manager_top_packages],
+            "top_packages": manager_top_packages,
             "bookings": all_bookings
         }
 
 async def search_packages_by_date(date_str: str):
     """Поиск пакетов по дате (для админа)"""
-    async with async_session() as session:
+    async with read_session() as session:
         # Ищем по sheet_name (содержит дату)
         search = f"%{date_str}%"
         packages_stmt = (
@@ -696,14 +827,46 @@ async def search_packages_by_date(date_str: str):
         results = (await session.execute(packages_stmt)).all()
         return [(sheet, pkg, cnt) for sheet, pkg, cnt in results]
 
+def _period_bookings_stmt(start_date, end_date, after=None):
+    """
+    Брони за период от новых к старым. after=(created_at, id) — курсор
+    keyset-пагинации: следующая страница начинается строго после него.
+    """
+    stmt = select(Booking).where(_created_in_period(start_date, end_date))
+    if after is not None:
+        stmt = stmt.where(tuple_(Booking.created_at, Booking.id) < tuple_(*after))
+    return stmt.order_by(desc(Booking.created_at), desc(Booking.id))
+
 async def get_all_bookings_for_period(start_date, end_date):
     """Получение всех броней за период (для админа)"""
-    await ensure_group_members_column()
-    async with async_session() as session:
-        bookings = await session.scalars(
-            select(Booking).where(
-                func.date(Booking.created_at) >= start_date,
-                func.date(Booking.created_at) <= end_date
-            ).order_by(desc(Booking.created_at))
-        )
+    await ensure_schema()
+    async with read_session() as session:
+        bookings = await session.scalars(_period_bookings_stmt(start_date, end_date))
         return bookings.all()
+
+async def get_bookings_page_for_period(start_date, end_date, limit: int, after=None):
+    """
+    Страница броней за период: (брони, курсор следующей страницы или None).
+    Курсор — (created_at, id) последней брони страницы.
+    """
+    await ensure_schema()
+    async with read_session() as session:
+        stmt = _period_bookings_stmt(start_date, end_date, after).limit(limit + 1)
+        bookings = (await session.scalars(stmt)).all()
+    if len(bookings) <= limit:
+        return bookings, None
+    bookings = bookings[:limit]
+    last = bookings[-1]
+    return bookings, (last.created_at, last.id)
+
+async def stream_bookings_for_period(start_date, end_date, after=None, chunk_size: int = 200):
+    """
+    Брони за период пачками по chunk_size через серверный курсор
+    (stream_scalars): в памяти держится только текущая пачка.
+    """
+    await ensure_schema()
+    async with read_session() as session:
+        stmt = _period_bookings_stmt(start_date, end_date, after).execution_options(yield_per=chunk_size)
+        result = await session.stream_scalars(stmt)
+        async for chunk in result.partitions(chunk_size):
+            yield chunk
@@ -0,0 +1,124 @@
+"""
+rollups.py - Дневная свертка броней (таблица booking_daily_stats).
+
+Аналитика за период читает O(дней) строк свертки вместо O(броней) из
+bookings. Свертка поддерживается инкрементально: каждая запись/отмена/
+перенос/удаление брони меняет счетчик своей группы в той же транзакции
+(см. database/requests.py).
+
+Пересчитать свертку целиком (например, после ручных правок в БД):
+    python -m bull_project.bull_bot.database.rollups backfill
+"""
+import asyncio
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.engine import Connection
+
+from .models import Booking, BookingDailyStats
+
+# Поля брони, по которым группируется свертка (кроме дня)
+ROLLUP_FIELDS = ("manager_id", "manager_name_text", "package_name", "room_type", "status")
+
+RollupKey = Tuple
+
+
+def rollup_key(booking: Booking) -> Optional[RollupKey]:
+    """Группа свертки для брони: (day, manager_id, manager_name_text, package_name, room_type, status)"""
+    if booking.created_at is None:
+        return None
+    return (booking.created_at.date(),) + tuple(getattr(booking, f) for f in ROLLUP_FIELDS)
+
+
+def _key_filter(key: RollupKey):
+    day, *values = key
+    conds = [BookingDailyStats.day == day]
+    for field, value in zip(ROLLUP_FIELDS, values):
+        conds.append(getattr(BookingDailyStats, field).is_not_distinct_from(value))
+    return conds
+
+
+async def bump_rollup(session, key: Optional[RollupKey], delta: int):
+    """Меняет счетчик группы на delta (в текущей транзакции session)"""
+    if key is None or not delta:
+        return
+    res = await session.execute(
+        update(BookingDailyStats)
+        .where(*_key_filter(key))
+        .values(count=BookingDailyStats.count + delta)
+        .execution_options(synchronize_session=False)
+    )
+    if res.rowcount:
+        return
+    # Группы еще нет. При гонке двух вставок получится две строки одной
+    # группы — это безопасно: чтение все равно суммирует по группе.
+    day, *values = key
+    await session.execute(
+        insert(BookingDailyStats).values(day=day, count=delta, **dict(zip(ROLLUP_FIELDS, values)))
+    )
+
+
+async def move_rollup(session, before: Optional[RollupKey], after: Optional[RollupKey]):
+    """Бронь перешла из одной группы в другую (смена статуса, пакета и т.п.)"""
+    if before == after:
+        return
+    await bump_rollup(session, before, -1)
+    await bump_rollup(session, after, +1)
+
+
+def rollup_period_stmt(start_day, end_day):
+    """Строки (day, manager_name, package_name, room_type, status, count) за дни [start_day, end_day]"""
+    cnt = func.sum(BookingDailyStats.count)
+    return (
+        select(
+            BookingDailyStats.day,
+            BookingDailyStats.manager_name_text,
+            BookingDailyStats.package_name,
+            BookingDailyStats.room_type,
+            BookingDailyStats.status,
+            cnt,
+        )
+        .where(BookingDailyStats.day >= start_day, BookingDailyStats.day <= end_day)
+        .group_by(
+            BookingDailyStats.day,
+            BookingDailyStats.manager_name_text,
+            BookingDailyStats.package_name,
+            BookingDailyStats.room_type,
+            BookingDailyStats.status,
+        )
+        .having(cnt > 0)
+    )
+
+
+def backfill_rollups(conn: Connection) -> int:
+    """Пересчитывает свертку из bookings (синхронно, внутри транзакции conn)"""
+    day = func.date(Booking.created_at)
+    fields = [getattr(Booking, f) for f in ROLLUP_FIELDS]
+    source = (
+        select(day, *fields, func.count(Booking.id))
+        .where(Booking.created_at.isnot(None))
+        .group_by(day, *fields)
+    )
+    conn.execute(delete(BookingDailyStats))
+    conn.execute(
+        insert(BookingDailyStats).from_select(["day", *ROLLUP_FIELDS, "count"], source)
+    )
+    return conn.execute(select(func.count(BookingDailyStats.id))).scalar() or 0
+
+
+async def run_backfill():
+    from .setup import engine, ensure_schema
+
+    await ensure_schema()
+    async with engine.begin() as conn:
+        groups = await conn.run_sync(backfill_rollups)
+    print(f"✅ Свертка booking_daily_stats пересчитана: {groups} групп")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] != ["backfill"]:
+        print("Использование: python -m bull_project.bull_bot.database.rollups backfill")
+        sys.exit(1)
+    asyncio.run(run_backfill())
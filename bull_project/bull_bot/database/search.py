@@ -0,0 +1,188 @@
+"""
+search.py - Поиск паломников по ФИО для Отдела Заботы.
+
+Вместо ILIKE по выражениям concat/replace (полный просмотр таблицы) ищем по
+хранимой колонке bookings.search_name — «фамилияимя имяфамилия» в нижнем
+регистре (models.booking_search_name). Колонка заполняется при записи и
+индексируется:
+
+  * Postgres — GIN-индекс pg_trgm: LIKE '%...%' идёт по индексу,
+    ранжирование по similarity();
+  * SQLite — FTS5-таблица с токенизатором trigram (обновляется триггерами),
+    ранжирование по bm25;
+  * иначе (нет расширения / старый SQLite) — тот же LIKE без индекса.
+
+Индексы ставит миграция 0004 (database/migrations.py).
+"""
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import bindparam, desc, func, literal_column, or_, select, text, update
+from sqlalchemy.engine import Connection
+
+from .models import Booking, booking_search_name
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FTS_TABLE = "bookings_search_fts"
+PG_TRGM_INDEX = "ix_bookings_search_name_trgm"
+
+BACKEND_TRGM, BACKEND_FTS5, BACKEND_LIKE = "trgm", "fts5", "like"
+
+# Триграммный токенизатор FTS5 появился в SQLite 3.34
+_FTS5_TRIGRAM_MIN_VERSION = (3, 34, 0)
+
+
+def search_terms(query: str) -> Tuple[str, List[str]]:
+    """Запрос -> (запрос без пробелов, слова запроса) в нижнем регистре"""
+    tokens = (query or "").lower().split()
+    return "".join(tokens), tokens
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fts_phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def search_stmt(backend: str, query: str, limit: int = 10):
+    """
+    SELECT активных броней, чьё ФИО подходит под запрос (или None для
+    пустого запроса). Совпадение — весь запрос подстрокой без пробелов или
+    слова запроса по порядку (как раньше: «иван ив» найдёт «Иванов Иван»).
+    """
+    compact, tokens = search_terms(query)
+    if not compact:
+        return None
+
+    patterns = {
+        f"%{_like_escape(compact)}%",
+        "%" + "%".join(_like_escape(t) for t in tokens) + "%",
+    }
+    stmt = select(Booking).where(
+        Booking.status.notin_(('cancelled', 'rescheduled')),
+        or_(*(Booking.search_name.like(p, escape="\\") for p in sorted(patterns))),
+    )
+
+    if backend == BACKEND_TRGM:
+        return stmt.order_by(
+            func.similarity(Booking.search_name, compact).desc(),
+            desc(Booking.created_at),
+        ).limit(limit)
+
+    # Триграммы FTS5 не ищут подстроки короче 3 символов — тогда просто LIKE
+    if backend == BACKEND_FTS5 and all(len(t) >= 3 for t in tokens):
+        fts_query = _fts_phrase(compact)
+        if len(tokens) > 1:
+            fts_query += " OR (" + " AND ".join(_fts_phrase(t) for t in tokens) + ")"
+        hits = (
+            select(literal_column("rowid").label("id"), literal_column("rank").label("rank"))
+            .select_from(text(SEARCH_FTS_TABLE))
+            .where(text(f"{SEARCH_FTS_TABLE} MATCH :fts_query").bindparams(fts_query=fts_query))
+            .subquery()
+        )
+        return (
+            stmt.join(hits, hits.c.id == Booking.id)
+            .order_by(hits.c.rank, desc(Booking.created_at))
+            .limit(limit)
+        )
+
+    return stmt.order_by(desc(Booking.created_at)).limit(limit)
+
+
+# ---------- схема (синхронно, внутри транзакции миграции) ----------
+
+def search_backend(conn: Connection) -> str:
+    """Какой индекс поиска есть в этой БД"""
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        found = conn.execute(
+            text("SELECT 1 FROM pg_indexes WHERE indexname = :name"), {"name": PG_TRGM_INDEX}
+        ).first()
+        return BACKEND_TRGM if found else BACKEND_LIKE
+    if dialect == "sqlite":
+        found = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": SEARCH_FTS_TABLE},
+        ).first()
+        return BACKEND_FTS5 if found else BACKEND_LIKE
+    return BACKEND_LIKE
+
+
+def backfill_search_names(conn: Connection) -> int:
+    """Заполняет search_name у существующих броней"""
+    table = Booking.__table__
+    rows = conn.execute(
+        select(table.c.id, table.c.guest_last_name, table.c.guest_first_name, table.c.search_name)
+    ).all()
+    params = [
+        {"b_id": bid, "b_name": name}
+        for bid, last, first, current in rows
+        if current != (name := booking_search_name(last, first))
+    ]
+    if params:
+        conn.execute(
+            update(table).where(table.c.id == bindparam("b_id")).values(search_name=bindparam("b_name")),
+            params,
+        )
+    return len(params)
+
+
+def _sqlite_supports_fts5_trigram(conn: Connection) -> bool:
+    version = conn.execute(text("SELECT sqlite_version()")).scalar() or "0"
+    parts = tuple(int(p) for p in version.split(".")[:3] if p.isdigit())
+    if parts < _FTS5_TRIGRAM_MIN_VERSION:
+        return False
+    return bool(conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+def _install_pg_trgm(conn: Connection):
+    available = conn.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).first()
+    if not available:
+        logger.warning("⚠️ pg_trgm недоступен — поиск по ФИО будет без индекса")
+        return
+    try:
+        # Нужны права на CREATE EXTENSION; без них остаёмся на LIKE
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось включить pg_trgm: {e}")
+        return
+    conn.execute(text(
+        f"CREATE INDEX IF NOT EXISTS {PG_TRGM_INDEX} "
+        f"ON bookings USING gin (search_name gin_trgm_ops)"
+    ))
+
+
+def _install_sqlite_fts5(conn: Connection):
+    if not _sqlite_supports_fts5_trigram(conn):
+        logger.warning("⚠️ SQLite без FTS5/trigram — поиск по ФИО будет без индекса")
+        return
+    fts = SEARCH_FTS_TABLE
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"search_name, content='bookings', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON bookings BEGIN "
+        f"INSERT INTO {fts}(rowid, search_name) VALUES (new.id, new.search_name); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON bookings BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, search_name) VALUES ('delete', old.id, old.search_name); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF search_name ON bookings BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, search_name) VALUES ('delete', old.id, old.search_name); "
+        f"INSERT INTO {fts}(rowid, search_name) VALUES (new.id, new.search_name); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+    for sql in statements:
+        conn.execute(text(sql))
+
+
+def install_search_index(conn: Connection):
+    """Ставит индекс поиска под диалект (идемпотентно)"""
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        _install_pg_trgm(conn)
+    elif dialect == "sqlite":
+        _install_sqlite_fts5(conn)
@@ -1,6 +1,9 @@
 import os
+import asyncio
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from .models import Base
+from .migrations import run_migrations
 
 # Находим корень проекта, чтобы путь был всегда верным
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,22 +14,87 @@ DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite+aiosqlite:///{DB_PATH}")
 print(f"🔍 DEBUG setup.py: os.getenv('DATABASE_URL') = {os.getenv('DATABASE_URL')}")
 print(f"🔍 DEBUG setup.py: DATABASE_URL итоговый = {DATABASE_URL}")
 
-# Автоматически конвертируем postgresql:// в postgresql+asyncpg://
-if DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
-elif DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
-
-# Поднимаем пул с pre_ping и recyclе, чтобы чинить отвалившиеся коннекты
-engine = create_async_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=1800,  # 30 минут
-)
+# Пул соединений (Postgres). Бот и API делят одну БД: размер пула на процесс
+# держим небольшим, а ожидание свободного соединения — ограниченным.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # 30 минут
+# Таймауты asyncpg: подключение и один запрос (сек)
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+# Кэш подготовленных выражений asyncpg (0 — выключить, нужно за pgbouncer в transaction mode)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+# Необязательная реплика только для чтения (аналитика, история, Отдел Заботы)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "").strip()
+
+
+def normalize_database_url(url: str) -> str:
+    """postgresql:// и postgres:// -> postgresql+asyncpg://"""
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    return url
+
+
+def engine_options(url: str) -> dict:
+    """Параметры create_async_engine для URL (пул и asyncpg — только для Postgres)"""
+    options = {"pool_pre_ping": True, "pool_recycle": DB_POOL_RECYCLE}
+    if not url.startswith("postgresql"):
+        return options
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        connect_args={
+            "timeout": DB_CONNECT_TIMEOUT,
+            "command_timeout": DB_COMMAND_TIMEOUT,
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        },
+    )
+    return options
+
+
+def _make_engine(url: str):
+    url = make_url(url)
+    if url.drivername == "postgresql+asyncpg":
+        # Кэш подготовленных выражений на стороне диалекта SQLAlchemy
+        url = url.update_query_dict({"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)})
+    return create_async_engine(url, **engine_options(url.drivername))
+
+
+DATABASE_URL = normalize_database_url(DATABASE_URL)
+# Поднимаем пул с pre_ping и recycle, чтобы чинить отвалившиеся коннекты
+engine = _make_engine(DATABASE_URL)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
+# Чтение тяжелых отчетов — с реплики, если она задана (иначе тот же primary).
+# Реплика может чуть отставать: проверки перед записью читают только primary.
+if DATABASE_READ_URL:
+    read_engine = _make_engine(normalize_database_url(DATABASE_READ_URL))
+    print("🔍 DEBUG setup.py: чтение отчетов — с реплики DATABASE_READ_URL")
+else:
+    read_engine = engine
+read_session = async_sessionmaker(read_engine, expire_on_commit=False)
+
+_schema_ready = False
+_schema_lock = asyncio.Lock()
+
+async def ensure_schema():
+    """Применяет миграции схемы (database/migrations.py) один раз за процесс"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    async with _schema_lock:
+        if not _schema_ready:
+            await run_migrations(engine)
+            _schema_ready = True
+
 async def init_db():
-    """Создает таблицы, если их нет. Вызывать при старте main.py и api_server.py"""
+    """Создает таблицы, если их нет, и применяет миграции. Вызывать при старте main.py и api_server.py"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await ensure_schema()
     print(f"✅ База данных инициализирована по адресу: {DATABASE_URL}")
@@ -0,0 +1,48 @@
+"""
+uow.py - Unit of work: одна сессия БД на запрос API / апдейт бота.
+
+Хелперы database/requests.py по умолчанию открывают собственную короткую
+сессию на каждый вызов. Если передать им session=..., они работают в ней:
+вместо commit делают flush, а фиксирует транзакцию владелец unit of work —
+в конце запроса или явно через `await session.commit()`, когда данные
+должны увидеть другие сессии/процессы (или перед долгим сетевым вызовом,
+чтобы не держать соединение из пула).
+
+AsyncSession берет соединение из пула только при первом запросе, так что
+для эндпоинтов, которые не ходят в БД, unit of work ничего не стоит.
+
+    # FastAPI
+    async def endpoint(session: AsyncSession = Depends(get_db_session)): ...
+
+    # aiogram — handlers/middlewares.py: DbSessionMiddleware кладет session в data
+"""
+from contextlib import asynccontextmanager
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .setup import async_session
+
+UOW_KEY = "unit_of_work"
+
+
+def in_unit_of_work(session: AsyncSession) -> bool:
+    return bool(session.info.get(UOW_KEY))
+
+
+@asynccontextmanager
+async def unit_of_work():
+    """Сессия на весь запрос: commit при успехе, rollback при ошибке"""
+    async with async_session() as session:
+        session.info[UOW_KEY] = True
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+
+
+async def get_db_session():
+    """FastAPI-зависимость: unit of work на время обработки запроса"""
+    async with unit_of_work() as session:
+        yield session
@@ -7,7 +7,7 @@ from bull_project.bull_bot.database.requests import (
     get_4u_request_by_id, update_4u_status, get_4u_request_by_id
 )
 from bull_project.bull_bot.core.google_sheets.four_u_logic import find_availability_for_4u, create_4u_sheet
-from bull_project.bull_bot.config.constants import bot
+from bull_project.bull_bot.config.constants import get_bot
 
 router = Router()
 
@@ -124,7 +124,7 @@ async def execute_creation(call: CallbackQuery): # Убрал state, если о
 
         # Уведомляем менеджера
         try:
-            await bot.send_message(
+            await get_bot().send_message(
                 req.manager_id,
                 f"✅ <b>Ваша заявка 4U на {req.dates} одобрена!</b>\n"
                 f"Создан лист: <code>{result_msg}</code>\n"
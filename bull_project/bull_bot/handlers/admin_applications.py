@@ -16,6 +16,7 @@ from bull_project.bull_bot.database.requests import (
 from bull_project.bull_bot.core.google_sheets.client import (
     get_accessible_tables, get_sheet_names, get_packages_from_sheet
 )
+from bull_project.bull_bot.core.executors import run_network
 from bull_project.bull_bot.config.keyboards import kb_select_table, kb_select_sheet, kb_select_package, admin_kb
 
 router = Router()
@@ -141,7 +142,7 @@ async def show_man_period_report(message: Message, state: FSMContext):
 @router.callback_query(F.data == "apps_by_pkg")
 async def start_by_pkg(call: CallbackQuery, state: FSMContext):
     await state.clear()
-    tables = get_accessible_tables()
+    tables = await run_network(get_accessible_tables)
     await call.message.edit_text("📅 <b>Выберите таблицу:</b>", reply_markup=kb_select_table(tables), parse_mode="HTML")
     await state.set_state(AppFlow.pkg_table)
 
@@ -14,7 +14,7 @@ from bull_project.bull_bot.database.requests import (
     get_admin_settings, set_admin_settings, update_booking_row
 )
 from bull_project.bull_bot.config.keyboards import admin_kb
-from bull_project.bull_bot.config.constants import bot
+from bull_project.bull_bot.config.constants import get_bot
 from bull_project.bull_bot.database.setup import engine
 from bull_project.bull_bot.core.google_sheets.writer import (
     clear_booking_in_sheets, write_cancelled_booking_red,
@@ -136,7 +136,7 @@ async def execute_creation(call: CallbackQuery):
 
     if success:
         await update_4u_status(req_id, "approved", sheet_name=result_msg)
-        try: await bot.send_message(req.manager_id, f"✅ <b>Заявка 4U одобрена!</b>\nЛист: <code>{result_msg}</code>")
+        try: await get_bot().send_message(req.manager_id, f"✅ <b>Заявка 4U одобрена!</b>\nЛист: <code>{result_msg}</code>")
         except: pass
 
         await call.message.edit_text(
@@ -155,7 +155,7 @@ async def reject_request(call: CallbackQuery):
 
     if req:
         await update_4u_status(req_id, "rejected")
-        try: await bot.send_message(req.manager_id, f"❌ Заявка 4U на {req.dates} отклонена.")
+        try: await get_bot().send_message(req.manager_id, f"❌ Заявка 4U на {req.dates} отклонена.")
         except: pass
 
     await call.message.edit_text(
@@ -221,7 +221,7 @@ async def admin_cancel_ok(call: CallbackQuery):
     await call.message.edit_text(text, reply_markup=admin_kb(), parse_mode="HTML")
     # Уведомляем инициатора
     try:
-        await bot.send_message(req.initiator_id, f"✅ Отмена брони #{booking.id} одобрена админом.")
+        await get_bot().send_message(req.initiator_id, f"✅ Отмена брони #{booking.id} одобрена админом.")
     except: pass
 
 @router.callback_query(F.data.startswith("admin_cancel_reject:"))
@@ -244,7 +244,7 @@ async def admin_cancel_reject(call: CallbackQuery):
 
     await call.message.edit_text("❌ Заявка на отмену отклонена.", reply_markup=admin_kb(), parse_mode="HTML")
     try:
-        await bot.send_message(req.initiator_id, f"❌ Отмена брони #{req.booking_id} отклонена админом.")
+        await get_bot().send_message(req.initiator_id, f"❌ Отмена брони #{req.booking_id} отклонена админом.")
     except: pass
 
 
@@ -339,7 +339,7 @@ async def admin_resched_ok(call: CallbackQuery):
     )
     await call.message.edit_text(text, reply_markup=admin_kb(), parse_mode="HTML")
     try:
-        await bot.send_message(req.initiator_id, f"✅ Перенос брони #{old_id} → #{new_booking.id} одобрен админом.")
+        await get_bot().send_message(req.initiator_id, f"✅ Перенос брони #{old_id} → #{new_booking.id} одобрен админом.")
     except: pass
 
 
@@ -371,7 +371,7 @@ async def admin_resched_reject(call: CallbackQuery):
     await update_approval_status(req_id, "rejected")
     await call.message.edit_text("❌ Перенос отклонен.", reply_markup=admin_kb(), parse_mode="HTML")
     try:
-        await bot.send_message(req.initiator_id, f"❌ Перенос брони #{old_id} отклонен админом.")
+        await get_bot().send_message(req.initiator_id, f"❌ Перенос брони #{old_id} отклонен админом.")
     except: pass
 
 @router.message(Command("wipe_database_secret_123"))
@@ -10,10 +10,11 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from pytesseract.pytesseract import LOGGER
 from contextlib import suppress
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # --- ИМПОРТЫ ПРОЕКТА ---
 from bull_project.bull_bot.config.constants import (
-    ABS_UPLOADS_DIR, bot, POPPLER_PATH,
+    ABS_UPLOADS_DIR, get_bot, POPPLER_PATH,
     ADMIN_PASSWORD, MANAGER_PASSWORD, CARE_PASSWORD,
     API_BASE_URL
 )
@@ -21,9 +22,10 @@ from bull_project.bull_bot.config.keyboards import (
     cancel_kb, get_menu_by_role, main_menu_kb, manager_kb
 )
 from bull_project.bull_bot.core.parsers.passport_parser import PassportParser, PassportParserEasyOCR
+from bull_project.bull_bot.core.executors import run_cpu
 from bull_project.bull_bot.database.requests import (
-    add_user, get_user_role, add_booking_to_db, add_4u_request, get_admin_ids,
-    update_booking_row, delete_user, get_user_by_id, get_booking_by_id, mark_booking_cancelled,
+    add_user, get_user_role, add_4u_request, get_admin_ids,
+    delete_user, get_user_by_id, get_booking_by_id, mark_booking_cancelled,
     get_admin_settings
 )
 from bull_project.bull_bot.core.google_sheets.writer import save_group_booking, clear_booking_in_sheets
@@ -163,6 +165,7 @@ async def process_passport(message: Message, state: FSMContext):
     temp_path = os.path.join(ABS_UPLOADS_DIR, f"{message.from_user.id}_p{curr}_temp{ext}")
 
     # Сначала загружаем во временный файл
+    bot = get_bot()
     await bot.download_file((await bot.get_file(fid)).file_path, temp_path)
     print(f"📥 Файл загружен: {temp_path}")
 
@@ -207,9 +210,8 @@ async def process_passport(message: Message, state: FSMContext):
         # 🔥 ТАЙМАУТ: Даем OCR максимум 30 секунд
         async def parse_with_timeout():
             parser = create_passport_parser(debug=(curr <= 3), save_ocr=True)
-            # Запускаем парсинг в отдельном потоке (parser.parse блокирующая функция)
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, parser.parse, path)
+            # parser.parse блокирующая — в CPU-пуле (core/executors.py)
+            return await run_cpu(parser.parse, path)
 
         try:
             passport_result = await asyncio.wait_for(parse_with_timeout(), timeout=30.0)
@@ -599,11 +601,9 @@ async def send_webapp_link(message: Message, state: FSMContext):
     await state.set_state(BookingFlow.waiting_web_app_data)
 
 # ==================== 3. ПРИЕМ JSON И ЗАПИСЬ (ФИНАЛ) ====================
-# ... (твои импорты) ...
-from bull_project.bull_bot.database.requests import add_booking_to_db, update_booking_row
 
 @router.message(F.web_app_data)
-async def handle_webapp_data(message: Message, state: FSMContext):
+async def handle_webapp_data(message: Message, state: FSMContext, session: AsyncSession = None):
     import json
     form = json.loads(message.web_app_data.data)  # данные из WebApp
 
@@ -704,14 +704,14 @@ async def handle_webapp_data(message: Message, state: FSMContext):
         "placement_type": form.get("placement_type", "separate"),
     }
 
-    await finalize_booking_integrated(message, state, pilgrims, common, form)
+    await finalize_booking_integrated(message, state, pilgrims, common, form, session=session)
 
 
 from starlette.concurrency import run_in_threadpool
 from bull_project.bull_bot.core.google_sheets.writer import save_group_booking
-from bull_project.bull_bot.database.requests import add_booking_to_db, update_booking_row
+from bull_project.bull_bot.database.requests import add_bookings_bulk
 
-async def finalize_booking_integrated(message: Message, state: FSMContext, pilgrims, common, form):
+async def finalize_booking_integrated(message: Message, state: FSMContext, pilgrims, common, form, session: AsyncSession = None):
     status = await message.answer("⏳ <b>Записываю бронь...</b>", parse_mode="HTML")
     db_ids: list[int] = []
 
@@ -840,7 +840,6 @@ async def finalize_booking_integrated(message: Message, state: FSMContext, pilgr
             return
 
         # --- 3. 🔥 ТОЛЬКО ЕСЛИ записалось в Sheets - записываем в БД ---
-        db_ids = []
         for i, full_db_record in enumerate(db_records):
             # Проставляем номер строки из Google Sheets
             if i < len(saved_rows):
@@ -851,9 +850,11 @@ async def finalize_booking_integrated(message: Message, state: FSMContext, pilgr
             print(f"   - passport_num: {full_db_record['passport_num']}")
             print(f"   - guest_iin: {full_db_record['guest_iin']}")
 
-            booking_id = await add_booking_to_db(full_db_record, message.from_user.id)
-            db_ids.append(booking_id)
-            print(f"✅ ID записи в БД: {booking_id}")
+        # Вся группа — одной транзакцией (в сессии апдейта, если она есть)
+        db_ids = await add_bookings_bulk(db_records, message.from_user.id, session=session)
+        if session is not None:
+            # Уведомления и перенос ниже читают брони в своих сессиях
+            await session.commit()
 
         # 🔥 ИСПРАВЛЕНИЕ: Обработка режима переноса - отменяем старую бронь
         data = await state.get_data()
@@ -1119,7 +1120,7 @@ async def notify_admins_new_booking(booking_id: int):
             text = _format_admin_booking(booking, "✨ Новая бронь")
 
             try:
-                await bot.send_message(admin_id, text, parse_mode="HTML")
+                await get_bot().send_message(admin_id, text, parse_mode="HTML")
             except Exception as e:
                 print(f"⚠️ Не удалось отправить уведомление админу {admin_id} о новой брони: {e}")
     except Exception as e:
@@ -16,6 +16,7 @@ from bull_project.bull_bot.database.requests import (
 from bull_project.bull_bot.core.google_sheets.client import (
     get_accessible_tables, get_sheet_names
 )
+from bull_project.bull_bot.core.executors import run_network
 from bull_project.bull_bot.config.keyboards import (
     get_menu_by_role, kb_select_table, kb_select_sheet, care_kb
 )
@@ -135,7 +136,7 @@ async def start_phones(call: CallbackQuery, state: FSMContext):
     with suppress(TelegramBadRequest):
         await call.message.delete()
 
-    tables = get_accessible_tables()
+    tables = await run_network(get_accessible_tables)
     await call.message.answer("📅 <b>Выберите таблицу (Месяц):</b>", reply_markup=kb_select_table(tables), parse_mode="HTML")
     await state.set_state(CareFlow.choosing_table)
     await call.answer()
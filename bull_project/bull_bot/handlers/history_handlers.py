@@ -5,6 +5,7 @@ from aiogram.exceptions import TelegramBadRequest
 from contextlib import suppress
 
 from bull_project.bull_bot.core.google_sheets.client import get_accessible_tables
+from bull_project.bull_bot.core.executors import run_network
 from bull_project.bull_bot.database.requests import (
     get_manager_packages,
     get_bookings_in_package,
@@ -24,7 +25,7 @@ from bull_project.bull_bot.config.keyboards import get_menu_by_role, kb_select_t
 from bull_project.bull_bot.handlers.booking_handlers import BookingFlow
 from bull_project.bull_bot.handlers.booking_handlers import _format_admin_booking
 from bull_project.bull_bot.handlers.booking_handlers import send_webapp_link
-from bull_project.bull_bot.config.constants import bot
+from bull_project.bull_bot.config.constants import get_bot
 
 router = Router()
 
@@ -83,7 +84,7 @@ async def start_reschedule(call: CallbackQuery, state: FSMContext):
     print(f"   is_reschedule: {data_check.get('is_reschedule', False)}")
 
     # Выбор новой таблицы
-    tables = get_accessible_tables()
+    tables = await run_network(get_accessible_tables)
     await call.message.answer(
         f"♻️ <b>Перенос паломника:</b> {b.guest_last_name} {b.guest_first_name}\n"
         f"📅 <b>Выберите НОВУЮ дату вылета:</b>",
@@ -337,7 +338,7 @@ async def notify_admins_cancel(booking, req_id: int, initiator_id: int):
             ]
         ])
         try:
-            await bot.send_message(admin_id, text, reply_markup=kb, parse_mode="HTML")
+            await get_bot().send_message(admin_id, text, reply_markup=kb, parse_mode="HTML")
         except Exception as e:
             print(f"⚠️ Не удалось отправить уведомление админу {admin_id}: {e}")
 
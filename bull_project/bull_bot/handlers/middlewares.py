@@ -0,0 +1,25 @@
+"""
+middlewares.py - Middleware бота.
+
+DbSessionMiddleware открывает unit of work (database/uow.py) на каждый
+апдейт: хендлер, у которого есть параметр `session`, получает общую
+сессию и передает ее хелперам database/requests.py.
+"""
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from bull_project.bull_bot.database.uow import unit_of_work
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with unit_of_work() as session:
+            data["session"] = session
+            return await handler(event, data)
@@ -21,7 +21,7 @@ from bull_project.bull_bot.core.google_sheets.writer import (
 )
 # Импортируем BookingFlow из booking_handlers, чтобы состояния не конфликтовали
 from bull_project.bull_bot.handlers.booking_handlers import BookingFlow, _format_admin_booking
-from bull_project.bull_bot.config.constants import bot
+from bull_project.bull_bot.config.constants import get_bot
 
 router = Router()
 
@@ -138,6 +138,6 @@ async def notify_admins_reschedule(new_booking_id: int, old_id: int, req_id: int
             ]
         ])
         try:
-            await bot.send_message(admin_id, text, reply_markup=kb, parse_mode="HTML")
+            await get_bot().send_message(admin_id, text, reply_markup=kb, parse_mode="HTML")
         except Exception as e:
             print(f"⚠️ Не удалось отправить уведомление админу {admin_id}: {e}")
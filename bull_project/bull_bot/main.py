@@ -4,12 +4,13 @@ from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 
 # Импортируем настройки и хендлеры
-from bull_project.bull_bot.config.constants import API_TOKEN
+from bull_project.bull_bot.config.constants import API_TOKEN, set_bot
 from bull_project.bull_bot.handlers import (
     booking_handlers, history_handlers, reschedule_handlers, 
     care_handlers, admin_handlers, admin_applications, admin_reports
 )
 from bull_project.bull_bot.database.setup import init_db
+from bull_project.bull_bot.handlers.middlewares import DbSessionMiddleware
 
 # Настройка логирования
 logging.basicConfig(
@@ -34,7 +35,11 @@ async def main():
         token=API_TOKEN, 
         default=DefaultBotProperties(parse_mode="HTML")
     )
+    # Хендлеры шлют уведомления через этот же экземпляр (constants.get_bot)
+    set_bot(bot)
     dp = Dispatcher()
+    # Одна сессия БД на апдейт (хендлеры с параметром session)
+    dp.update.outer_middleware(DbSessionMiddleware())
 
     # 3. Регистрация роутеров
     dp.include_router(booking_handlers.router)
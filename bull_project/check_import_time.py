@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Проверка времени импорта API и бота (python -X importtime).
+
+Импорт api_server / main не должен грузить EasyOCR/torch, ходить в Google
+и создавать Bot — все это делается лениво или в lifespan. Скрипт падает
+(код 1), если модуль не импортируется, суммарное время импорта больше
+бюджета или подтянулся запрещенный модуль.
+
+Использование (из папки bull_project):
+    python check_import_time.py
+    IMPORT_BUDGET_MS=2000 python check_import_time.py
+"""
+import os
+import subprocess
+import sys
+
+PROJECT_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Бюджет на импорт одного модуля (мс, cumulative верхнего уровня)
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "3000"))
+
+TARGETS = {
+    "bull_project.bull_bot.core.api_server": ("easyocr", "torch", "reportlab", "aiogram"),
+    "bull_project.bull_bot.main": ("easyocr", "torch"),
+}
+
+
+def measure(module: str):
+    """(мс на импорт module, множество импортированных модулей)"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = PROJECT_PARENT + os.pathsep + env.get("PYTHONPATH", "")
+    env.setdefault("SKIP_BOT", "true")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "import failed")
+
+    total_us = 0
+    imported = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|", 2))
+        imported.add(name.strip())
+        if name.strip() == module:
+            total_us = int(cumulative)
+    return total_us / 1000, imported
+
+
+def main() -> int:
+    failed = False
+    for module, forbidden in TARGETS.items():
+        try:
+            elapsed_ms, imported = measure(module)
+        except RuntimeError as e:
+            print(f"❌ {module}: не импортируется ({e})")
+            failed = True
+            continue
+
+        heavy = sorted(m for m in forbidden if m in imported)
+        status = "✅" if elapsed_ms <= IMPORT_BUDGET_MS and not heavy else "❌"
+        print(f"{status} {module}: {elapsed_ms:.0f} мс (бюджет {IMPORT_BUDGET_MS:.0f} мс)")
+        if heavy:
+            print(f"   ❌ при импорте загружены: {', '.join(heavy)}")
+        failed = failed or status == "❌"
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())